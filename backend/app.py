@@ -1,15 +1,30 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from db import db, User, WebhookSetting, UserBoard, TrelloWebhook, TrelloWebhookSetting
 from redis import Redis
 from rq import Queue
-from tasks import process_trello_event
+from tasks import build_identity_cache, build_username_directory
+from identity import IdentityCache
+from trello_client import TrelloAuth, get_trello_client
 from dotenv import load_dotenv
 import os
 import time
 import logging
 from app_factory import create_app
-import requests
+from routing import SubscriptionIndex, WebhookRouter
+from events import EventStore
+from mentions import MentionFilter
+from inbox import WebhookInbox
+from dedupe import ActionDeduplicator
+from copy_plan import copy_stats
+from coalesce import coalesce_stats
+from fair_queue import build_fair_queues
+from job_context import invalidate_job_contexts
+from dead_letter import DeadLetterQueue
+from boards import fetch_boards_with_lists
+from board_cache import build_board_cache, board_cache_stats
+from provisioning import BoardProvisioner, ProvisioningError, default_board_name
+from pagination import PageParamsError, STREAM_FORMATS, page_params, keyset_page, stream_rows, MAX_PAGE_SIZE
 import json
 from flask_migrate import Migrate
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
@@ -25,6 +40,11 @@ migrate = Migrate(app, db)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
+# Enqueue one fan-out job per webhook action instead of one job per subscribed user
+WEBHOOK_FANOUT = os.environ.get('WEBHOOK_FANOUT', 'false').lower() in ['true', '1', 'yes']
+# 'direct' routes inside the request; 'stream' appends to the Redis inbox drained by router.py
+WEBHOOK_INGRESS_MODE = os.environ.get('WEBHOOK_INGRESS_MODE', 'direct').lower()
+
 # Database initialization function - will be called when needed
 def init_db():
     with app.app_context():
@@ -57,6 +77,74 @@ def init_db():
 # Initialize database when app starts
 init_db()
 
+# Precompiled webhook routing, shared across processes through a Redis version counter
+subscription_index = SubscriptionIndex(
+    redis_conn=q.connection if q else None,
+    check_interval=float(os.environ.get('ROUTING_VERSION_CHECK_SECONDS', '1.0'))
+)
+
+def build_subscription_index():
+    with app.app_context():
+        try:
+            subscription_index.build()
+        except Exception as e:
+            # Ingress retries the build on its next lookup
+            logger.error(f"Subscription index build failed: {e}")
+
+build_subscription_index()
+
+# Trello redelivers on timeouts; drop actions we have already routed
+action_deduper = None
+if q and os.environ.get('WEBHOOK_DEDUPE', 'true').lower() in ['true', '1', 'yes']:
+    action_deduper = ActionDeduplicator(
+        q.connection,
+        ttl=int(os.environ.get('WEBHOOK_DEDUPE_TTL', '86400')),
+        use_bloom=os.environ.get('WEBHOOK_DEDUPE_BLOOM', 'false').lower() in ['true', '1', 'yes']
+    )
+
+# Trello usernames of linked users, used to prefilter mentions at ingress
+username_directory = build_username_directory(q.connection) if q else None
+
+# Cached Trello member id/username per user, shared with the workers
+identity_cache = build_identity_cache(q.connection, username_directory) if q else None
+
+# Per-tenant sub-queues of trello-events (FAIR_QUEUE_TENANT=board|user|off)
+fair_queues = build_fair_queues(q) if q else None
+
+# Board labels and lists: per-process LRU in front of Redis, invalidated by label/list webhooks
+board_cache = build_board_cache(q.connection) if q else None
+
+# Creates users' integration boards; remembers half-made boards so a retry finishes them
+board_provisioner = BoardProvisioner(q.connection if q else None)
+
+webhook_router = WebhookRouter(
+    subscription_index,
+    q,
+    EventStore(q.connection, ttl=int(os.environ.get('WEBHOOK_EVENT_TTL', '86400'))) if q else None,
+    fanout=WEBHOOK_FANOUT,
+    deduper=action_deduper,
+    mention_filter=MentionFilter(username_directory) if username_directory else None,
+    fair_queues=fair_queues,
+    metadata_cache=board_cache
+)
+
+webhook_inbox = None
+if q and WEBHOOK_INGRESS_MODE == 'stream':
+    webhook_inbox = WebhookInbox(q.connection, maxlen=int(os.environ.get('WEBHOOK_STREAM_MAXLEN', '100000')))
+
+def trello_auth(user):
+    return TrelloAuth(user.apiKey, user.token)
+
+def get_board_labels(user, board_id, refresh=False):
+    """A board's labels through the metadata cache (`refresh` bypasses it), or None if Trello could not be asked"""
+    if board_cache is not None:
+        return board_cache.labels(get_trello_client(), trello_auth(user), board_id, refresh)
+    resp = get_trello_client().get_board_labels(trello_auth(user), board_id)
+    return resp.json() if resp is not None and resp.status_code == 200 else None
+
+def trello_error_text(resp):
+    return resp.text if resp is not None else 'Trello did not respond'
+
 # Remove UserLogin class, use User directly
 @login_manager.user_loader
 def load_user(user_id):
@@ -82,6 +170,7 @@ def login():
         user = User(email=email, apiKey='', token='')  # Empty Trello fields
         db.session.add(user)
         db.session.commit()
+        invalidate_job_contexts(q.connection if q else None, email)
     login_user(user)
     return jsonify({'message': 'Logged in', 'email': user.email}), 200
 
@@ -105,7 +194,21 @@ def link_trello():
         return jsonify({'error': 'Missing Trello API key or token'}), 400
     user.apiKey = api_key
     user.token = token
+    user.trello_member_id = None
+    user.trello_username = None
     db.session.commit()
+    if username_directory:
+        username_directory.forget(user.email)
+    # Workers cache credentials per user; make them reload
+    invalidate_job_contexts(q.connection if q else None, user.email)
+    if identity_cache:
+        # Resolve the new identity once and store it on the user row
+        identity_cache.invalidate(user.email)
+        identity, unauthorized = identity_cache.fetch_identity(user.email, api_key, token)
+        if identity:
+            IdentityCache.store_on_user(user, identity)
+            if username_directory:
+                username_directory.set(user.email, identity.username)
     return jsonify({'message': 'Trello account linked'}), 200
 
 
@@ -118,6 +221,7 @@ def upsert_trello_webhook_setting(webhook_id, event_type, enabled=True, extra_co
         tws = TrelloWebhookSetting(webhook_id=webhook_id, event_type=event_type, enabled=enabled, extra_config=extra_config)
         db.session.add(tws)
     db.session.commit()
+    subscription_index.invalidate(webhook_id)
     return tws
 
 
@@ -133,10 +237,17 @@ def add_user():
     if user:
         user.apiKey = api_key
         user.token = token
+        user.trello_member_id = None
+        user.trello_username = None
     else:
         user = User(email=email, apiKey=api_key, token=token)
         db.session.add(user)
     db.session.commit()
+    invalidate_job_contexts(q.connection if q else None, email)
+    if username_directory:
+        username_directory.forget(email)
+    if identity_cache:
+        identity_cache.invalidate(email)
     return jsonify({'message': 'User added/updated', 'user': user.to_dict()}), 201
 
 @app.route('/api/users/<path:email>', methods=['GET'])
@@ -147,10 +258,30 @@ def get_user(email):
         return jsonify({'error': 'User not found'}), 404
     return jsonify(user.to_dict()), 200
 
+def list_response(query, key_column, serialize):
+    """Rows of `query` as JSON, the way the client asked for them.
+
+    Without query parameters this is the plain array of every row. `after` and
+    `limit` return one page in key order as {'items', 'next_after'}; pass
+    `next_after` back as `after` for the next page. `stream=ndjson` or
+    `stream=json` streams the rows (after the cursor, up to `limit`) as they
+    are read instead of building the response in memory.
+    """
+    try:
+        after, limit, stream = page_params(request.args, key_column)
+    except PageParamsError as e:
+        return jsonify({'error': str(e)}), 400
+    if stream:
+        rows = stream_rows(query, key_column, serialize, after, limit, stream)
+        return Response(stream_with_context(rows), mimetype=STREAM_FORMATS[stream]), 200
+    if after is None and limit is None:
+        return jsonify([serialize(row) for row in query.order_by(key_column).all()]), 200
+    return jsonify(keyset_page(query, key_column, serialize, after, limit or MAX_PAGE_SIZE)), 200
+
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([u.to_dict() for u in users]), 200
+    """All users; supports `after`/`limit` pages and `stream` (see list_response)"""
+    return list_response(User.query, User.email, User.to_dict)
 
 @app.route('/api/webhook-settings', methods=['POST'])
 @login_required
@@ -170,13 +301,12 @@ def save_webhook_setting():
     # Validate label belongs to linked board if provided
     if label_id and current_user.linked_board_id:
         # Verify the label exists on the linked board
-        api_key = current_user.apiKey
-        token = current_user.token
-        labels_url = f"https://api.trello.com/1/boards/{current_user.linked_board_id}/labels?key={api_key}&token={token}"
         try:
-            resp = requests.get(labels_url)
-            if resp.status_code == 200:
-                board_labels = resp.json()
+            board_labels = get_board_labels(current_user, current_user.linked_board_id)
+            if board_labels is not None and not any(l.get('id') == label_id for l in board_labels):
+                # The cached labels may predate the label; ask Trello once before rejecting it
+                board_labels = get_board_labels(current_user, current_user.linked_board_id, refresh=True)
+            if board_labels is not None:
                 label_exists = any(l.get('id') == label_id for l in board_labels)
                 if not label_exists:
                     return jsonify({'error': 'Selected label does not exist on the linked board'}), 400
@@ -199,6 +329,7 @@ def save_webhook_setting():
     )
     db.session.add(setting)
     db.session.commit()
+    subscription_index.invalidate(webhook_id)
     return jsonify({'message': 'Webhook setting saved', 'setting': setting.to_dict()}), 201
 
 @app.route('/api/webhook-settings/<setting_id>', methods=['DELETE'])
@@ -215,6 +346,7 @@ def delete_webhook_setting(setting_id):
         webhook_id = setting.webhook_id
         db.session.delete(setting)
         db.session.commit()
+        subscription_index.invalidate(webhook_id)
         
         # Check if this was the last setting for this webhook
         remaining_settings = WebhookSetting.query.filter_by(webhook_id=webhook_id).count()
@@ -222,11 +354,10 @@ def delete_webhook_setting(setting_id):
             # Delete the Trello webhook if no more settings exist
             pass  # No action needed when no settings remain
         if current_user.apiKey and current_user.token:
-            trello_delete_url = f"https://api.trello.com/1/webhooks/{webhook_id}?key={current_user.apiKey}&token={current_user.token}"
             try:
-                trello_resp = requests.delete(trello_delete_url)
-                if trello_resp.status_code not in [200, 204]:
-                    logger.warning(f"Failed to delete Trello webhook: {trello_resp.text}")
+                trello_resp = get_trello_client().delete_webhook(trello_auth(current_user), webhook_id)
+                if trello_resp is None or trello_resp.status_code not in [200, 204]:
+                    logger.warning(f"Failed to delete Trello webhook: {trello_error_text(trello_resp)}")
                 else:
                     logger.info(f"Successfully deleted Trello webhook: {webhook_id}")
             except Exception as e:
@@ -245,19 +376,89 @@ def test_worker():
     logger.info(f"Test task queued with job ID: {job.id}")
     return jsonify({'message': 'Test task queued', 'job_id': job.id}), 200
 
+DEBUG_WEBHOOK_SECTIONS = {
+    'trello_webhooks': (TrelloWebhook, lambda w: {'board_id': w.board_id, 'webhook_id': w.webhook_id}),
+    'trello_webhook_settings': (TrelloWebhookSetting, lambda s: {'webhook_id': s.webhook_id, 'event_type': s.event_type, 'enabled': s.enabled}),
+    'webhook_settings': (WebhookSetting, lambda s: {'webhook_id': s.webhook_id, 'event_type': s.event_type, 'user_email': s.user_email}),
+}
+
 @app.route('/api/debug/webhooks', methods=['GET'])
 def debug_webhooks():
-    """Debug endpoint to check webhook settings in database"""
+    """Debug endpoint to check webhook settings in database.
+
+    `section` picks one of the three lists, which then supports `after`/`limit`
+    pages and `stream` like the other list endpoints.
+    """
+    section = request.args.get('section')
+    if section is not None:
+        if section not in DEBUG_WEBHOOK_SECTIONS:
+            return jsonify({'error': f"section must be one of {', '.join(DEBUG_WEBHOOK_SECTIONS)}"}), 400
+        model, serialize = DEBUG_WEBHOOK_SECTIONS[section]
+        return list_response(model.query, model.id, serialize)
     trello_webhooks = TrelloWebhook.query.all()
     trello_webhook_settings = TrelloWebhookSetting.query.all()
     webhook_settings = WebhookSetting.query.all()
     
     return jsonify({
-        'trello_webhooks': [{'board_id': w.board_id, 'webhook_id': w.webhook_id} for w in trello_webhooks],
-        'trello_webhook_settings': [{'webhook_id': s.webhook_id, 'event_type': s.event_type, 'enabled': s.enabled} for s in trello_webhook_settings],
-        'webhook_settings': [{'webhook_id': s.webhook_id, 'event_type': s.event_type, 'user_email': s.user_email} for s in webhook_settings]
+        'trello_webhooks': [DEBUG_WEBHOOK_SECTIONS['trello_webhooks'][1](w) for w in trello_webhooks],
+        'trello_webhook_settings': [DEBUG_WEBHOOK_SECTIONS['trello_webhook_settings'][1](s) for s in trello_webhook_settings],
+        'webhook_settings': [DEBUG_WEBHOOK_SECTIONS['webhook_settings'][1](s) for s in webhook_settings]
     }), 200
 
+@app.route('/api/debug/dedupe', methods=['GET'])
+def debug_dedupe():
+    """Debug endpoint to check suppressed duplicate deliveries"""
+    if action_deduper is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **action_deduper.stats()}), 200
+
+@app.route('/api/debug/queues', methods=['GET'])
+def debug_queues():
+    """Debug endpoint to check per-tenant queue depth and wait times"""
+    if fair_queues is None:
+        return jsonify({'error': 'Redis not available'}), 503
+    return jsonify({'tenant_by': fair_queues.tenant_by, 'queues': fair_queues.stats()}), 200
+
+@app.route('/api/debug/copy-stats', methods=['GET'])
+def debug_copy_stats():
+    """Debug endpoint to check how many Trello calls each copied card took"""
+    if q is None:
+        return jsonify({'error': 'Redis not available'}), 503
+    return jsonify({**copy_stats(q.connection), 'coalescing': coalesce_stats(q.connection)}), 200
+
+@app.route('/api/debug/dead-letters', methods=['GET'])
+def debug_dead_letters():
+    """Debug endpoint to list failed events awaiting replay (filters: user, board, since, until, limit)"""
+    if q is None:
+        return jsonify({'error': 'Redis not available'}), 503
+    dead_letters = DeadLetterQueue(q.connection)
+    try:
+        entries = dead_letters.entries(
+            user_email=request.args.get('user'),
+            board_id=request.args.get('board'),
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float),
+            limit=request.args.get('limit', default=100, type=int),
+        )
+    except Exception as e:
+        return jsonify({'error': f'Could not read dead-letter queue: {e}'}), 500
+    return jsonify({'count': dead_letters.count(), 'entries': entries}), 200
+
+@app.route('/api/debug/board-cache', methods=['GET'])
+def debug_board_cache():
+    """Debug endpoint to check board label/list cache hits and misses"""
+    if q is None:
+        return jsonify({'error': 'Redis not available'}), 503
+    return jsonify(board_cache_stats(q.connection)), 200
+
+@app.route('/api/debug/trello-batch', methods=['GET'])
+def debug_trello_batch():
+    """Debug endpoint to check how many Trello reads this process folded into /1/batch calls"""
+    batcher = get_trello_client().batcher
+    if batcher is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, 'window_ms': batcher.window * 1000, **batcher.stats()}), 200
+
 @app.route('/api/fix-webhook-settings', methods=['POST'])
 def fix_webhook_settings():
     """Fix missing TrelloWebhookSetting records for existing webhooks"""
@@ -288,6 +489,8 @@ def fix_webhook_settings():
                 created_count += 1
         
         db.session.commit()
+        if created_count:
+            subscription_index.invalidate()
         return jsonify({
             'message': f'Created {created_count} missing TrelloWebhookSetting records',
             'created_count': created_count
@@ -298,8 +501,9 @@ def fix_webhook_settings():
 @app.route('/api/webhook-settings', methods=['GET'])
 @login_required
 def get_webhook_settings():
-    settings = WebhookSetting.query.filter_by(user_email=current_user.email).all()
-    return jsonify([s.to_dict() for s in settings]), 200
+    """The user's webhook settings; supports `after`/`limit` pages and `stream` (see list_response)"""
+    query = WebhookSetting.query.filter_by(user_email=current_user.email)
+    return list_response(query, WebhookSetting.id, WebhookSetting.to_dict)
 
 @app.route('/api/trello-webhook', methods=['GET', 'POST'])
 def trello_webhook():
@@ -315,83 +519,21 @@ def trello_webhook():
             if not request.is_json:
                 logger.warning(f"trello_webhook :: Not JSON content type, returning 415")
                 return jsonify({'error': 'Content-Type must be application/json'}), 415
+            if webhook_inbox is not None:
+                # Fast ack: persist the raw body and let the router do the rest
+                try:
+                    entry_id = webhook_inbox.append(request.get_data())
+                    logger.debug(f"trello_webhook :: Appended to inbox as {entry_id}")
+                    return jsonify({'status': 'accepted'}), 200
+                except Exception as e:
+                    logger.warning(f"trello_webhook :: Inbox append failed, routing inline: {e}")
             payload = request.get_json(silent=True)
             logger.debug(f"trello_webhook :: Payload keys: {list(payload.keys()) if payload else 'None'}")
             if not payload:
                 logger.debug(f"trello_webhook :: No payload, returning success")
                 return jsonify({'success': True}), 200
-            if 'action' not in payload:
-                logger.warning(f"trello_webhook :: No action in payload, returning 400")
-                return jsonify({'error': 'Invalid webhook payload'}), 400
-            event_type = payload['action'].get('type')
-            logger.debug(f"trello_webhook :: event_type :: {event_type}")
-
-            # Extract board_id from payload
-            board_id = None
-            if 'data' in payload['action'] and 'board' in payload['action']['data']:
-                board_id = payload['action']['data']['board'].get('id')
-            logger.debug(f"trello_webhook :: Extracted board_id: {board_id}")
-            if not board_id:
-                logger.warning(f"trello_webhook :: Missing board_id in payload")
-                return jsonify({'error': 'Missing board_id in payload'}), 400
-
-            # Look up TrelloWebhook for this board
-            trello_webhook = TrelloWebhook.query.filter_by(board_id=board_id).first()
-            logger.debug(f"trello_webhook :: Found TrelloWebhook: {trello_webhook is not None}")
-            if not trello_webhook:
-                logger.warning(f"trello_webhook :: No webhook registered for board {board_id}")
-                return jsonify({'error': 'No webhook registered for this board'}), 404
-            webhook_id = trello_webhook.webhook_id
-            logger.debug(f"trello_webhook :: Using webhook_id: {webhook_id}")
-
-            # Look up event_type in TrelloWebhookSetting
-            # Map Trello event types to our custom event types
-            mapped_event_type = None
-            if event_type == "commentCard":
-                mapped_event_type = "Mentioned in a card"
-            elif event_type == "addMemberToCard":
-                mapped_event_type = "Added to a card"
-            else:
-                mapped_event_type = event_type  # Use as-is for other events
-            
-            logger.debug(f"trello_webhook :: Mapped event_type: {event_type} -> {mapped_event_type}")
-            
-            setting = TrelloWebhookSetting.query.filter_by(webhook_id=webhook_id, event_type=mapped_event_type).first()
-            logger.debug(f"trello_webhook :: Found TrelloWebhookSetting: {setting is not None}")
-            if setting:
-                logger.debug(f"trello_webhook :: TrelloWebhookSetting enabled: {setting.enabled}")
-            if not setting or not setting.enabled:
-                logger.debug(f"trello_webhook :: Event type {mapped_event_type} not enabled or not found")
-                return jsonify({'status': 'ignored', 'reason': f'Event type {mapped_event_type} not enabled'}), 200
-
-            # Get all user preferences for this webhook and event type
-            user_settings = WebhookSetting.query.filter_by(webhook_id=webhook_id, event_type=mapped_event_type).all()
-            logger.info(f"trello_webhook :: Found {len(user_settings)} user settings for event {mapped_event_type}")
-            
-            if not user_settings:
-                logger.debug(f"trello_webhook :: No user settings found for event type {mapped_event_type}")
-                return jsonify({'status': 'ignored', 'reason': f'No user settings found for event type {mapped_event_type}'}), 200
-
-            # Process event for each user who has settings for this event
-            for user_setting in user_settings:
-                logger.info(f"trello_webhook :: Processing for user {user_setting.user_email}")
-                # Add user-specific context to the payload
-                enriched_payload = {
-                    'trello_event': payload,
-                    'user_email': user_setting.user_email,
-                    'board_id': user_setting.board_id,
-                    'board_name': user_setting.board_name,
-                    'event_type': user_setting.event_type,
-                    'label': user_setting.label,  # Keep for backward compatibility
-                    'label_id': user_setting.label_id,
-                    'label_name': user_setting.label_name,
-                    'list_name': user_setting.list_name
-                }
-                logger.debug(f"trello_webhook :: Enqueuing task for user {user_setting.user_email}")
-                q.enqueue(process_trello_event, enriched_payload)
-            
-            logger.info(f"trello_webhook :: Queued {len(user_settings)} tasks for event {mapped_event_type}")
-            return jsonify({'status': 'queued', 'event_type': mapped_event_type, 'users_processed': len(user_settings)}), 200
+            body, status = webhook_router.route(payload)
+            return jsonify(body), status
     except Exception as e:
         logger.error(f"trello_webhook :: {e}");
         return jsonify({'status': 'failed', 'error': str(e)});
@@ -404,38 +546,41 @@ def trello_verify():
     user = current_user
     if not user.apiKey or not user.token:
         return jsonify({'error': 'Trello not linked'}), 400
-    api_key = user.apiKey
-    token = user.token
-    url = f'https://api.trello.com/1/members/me?key={api_key}&token={token}'
-    resp = requests.get(url)
-    if resp.status_code != 200:
-        return jsonify({'error': 'Invalid API Key or Token', 'details': resp.text}), 401
+    if identity_cache:
+        identity = identity_cache.get(user)
+        if not identity:
+            return jsonify({'error': 'Invalid API Key or Token'}), 401
+        return jsonify({'id': identity.member_id, 'username': identity.username}), 200
+    resp = get_trello_client().get_member(trello_auth(user))
+    if resp is None or resp.status_code != 200:
+        return jsonify({'error': 'Invalid API Key or Token', 'details': trello_error_text(resp)}), 401
     return jsonify(resp.json()), 200
 
 @app.route('/api/trello/boards', methods=['POST'])
 @login_required
 def trello_get_boards():
+    """The user's boards with their open lists; optional `offset`/`limit` (body or query) return one page"""
     user = current_user
     if not user.apiKey or not user.token:
         return jsonify({'error': 'Trello not linked'}), 400
-    api_key = user.apiKey
-    token = user.token
-    boards_url = f'https://api.trello.com/1/members/me/boards?key={api_key}&token={token}'
-    boards_resp = requests.get(boards_url)
-    if boards_resp.status_code != 200:
-        return jsonify({'error': 'Failed to fetch boards', 'details': boards_resp.text}), 400
-    boards_data = boards_resp.json()
-    boards_with_lists = []
-    for board in boards_data:
-        lists_url = f'https://api.trello.com/1/boards/{board["id"]}/lists?key={api_key}&token={token}'
-        lists_resp = requests.get(lists_url)
-        lists_data = lists_resp.json() if lists_resp.status_code == 200 else []
-        boards_with_lists.append({
-            'id': board['id'],
-            'name': board['name'],
-            'lists': [l['name'] for l in lists_data]
-        })
-    return jsonify({'boards': boards_with_lists}), 200
+    data = request.get_json(silent=True) or {}
+    try:
+        offset = max(0, int(data.get('offset', request.args.get('offset', 0))))
+        limit = data.get('limit', request.args.get('limit'))
+        limit = max(1, int(limit)) if limit is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    boards, total, error_resp = fetch_boards_with_lists(
+        get_trello_client(), trello_auth(user), offset, limit, cache=board_cache
+    )
+    if boards is None:
+        return jsonify({'error': 'Failed to fetch boards', 'details': trello_error_text(error_resp)}), 400
+    next_offset = offset + len(boards)
+    return jsonify({
+        'boards': boards,
+        'total': total,
+        'next_offset': next_offset if next_offset < total else None
+    }), 200
 
 @app.route('/api/trello/webhooks', methods=['POST'])
 @login_required
@@ -450,8 +595,6 @@ def trello_register_webhook():
     user = current_user
     if not user.apiKey or not user.token:
         return jsonify({'error': 'Trello not linked'}), 400
-    api_key = user.apiKey
-    token = user.token
     trello_webhook = TrelloWebhook.query.filter_by(board_id=board_id).first()
     if trello_webhook:
         webhook_id = trello_webhook.webhook_id
@@ -462,27 +605,20 @@ def trello_register_webhook():
             upsert_trello_webhook_setting(webhook_id, event_type, enabled, extra_config)
         db.session.commit()
         return jsonify({'message': 'Webhook already exists, settings updated', 'id': webhook_id}), 200
-    url = f'https://api.trello.com/1/webhooks'
-    payload = {
-        'key': api_key,
-        'token': token,
-        'callbackURL': callback_url,
-        'idModel': board_id,
-        'description': description
-    }
-    resp = requests.post(url, data=payload)
-    if resp.status_code not in [200, 201]:
+    resp = get_trello_client().create_webhook(trello_auth(user), callback_url, board_id, description)
+    if resp is None or resp.status_code not in [200, 201]:
         try:
             err = resp.json()
             msg = err.get('message', 'Failed to register webhook')
         except Exception:
-            msg = resp.text
+            msg = trello_error_text(resp)
         return jsonify({'error': msg}), 400
     webhook_data = resp.json()
     webhook_id = webhook_data.get('id')
     trello_webhook = TrelloWebhook(board_id=board_id, webhook_id=webhook_id, callback_url=callback_url)
     db.session.add(trello_webhook)
     db.session.commit()
+    subscription_index.invalidate(webhook_id)
     for setting in event_settings:
         event_type = setting.get('event_type')
         enabled = setting.get('enabled', True)
@@ -497,16 +633,13 @@ def trello_get_webhooks():
     user = current_user
     if not user.apiKey or not user.token:
         return jsonify({'error': 'Trello not linked'}), 400
-    api_key = user.apiKey
-    token = user.token
-    url = f'https://api.trello.com/1/tokens/{token}/webhooks?key={api_key}'
-    resp = requests.get(url)
-    if resp.status_code != 200:
+    resp = get_trello_client().get_token_webhooks(trello_auth(user))
+    if resp is None or resp.status_code != 200:
         try:
             err = resp.json()
             msg = err.get('message', 'Failed to fetch webhooks')
         except Exception:
-            msg = resp.text
+            msg = trello_error_text(resp)
         return jsonify({'error': msg}), 400
     return jsonify(resp.json()), 200
 
@@ -516,40 +649,115 @@ def setup_trello_board():
     user = current_user
     if not user.apiKey or not user.token:
         return jsonify({'error': 'Trello not linked'}), 400
-    api_key = user.apiKey
-    token = user.token
-    board_name = user.email.split('@')[0] if user.email and '@' in user.email else 'Integration Board'
+    board_name = default_board_name(user.email)
     user_board = UserBoard.query.filter_by(user_email=user.email).first()
     if user_board:
         return jsonify({'message': 'Board already exists', 'board': user_board.to_dict()}), 200
-    board_res = requests.post(
-        f'https://api.trello.com/1/boards/',
-        params={'name': board_name, 'defaultLists': 'false', 'key': api_key, 'token': token}
-    )
-    if board_res.status_code != 200:
-        return jsonify({'error': 'Failed to create board', 'details': board_res.text}), 500
-    board = board_res.json()
-    board_id = board['id']
-    list_names = ['Enquiry In', 'Todo', 'Doing', 'Done']
-    lists = {}
-    for name in list_names:
-        list_res = requests.post(
-            f'https://api.trello.com/1/lists',
-            params={'name': name, 'idBoard': board_id, 'key': api_key, 'token': token}
+    try:
+        result = board_provisioner.provision(get_trello_client(), trello_auth(user), user.email, board_name)
+    except ProvisioningError as e:
+        return jsonify({'error': str(e), 'details': trello_error_text(e.resp)}), 500
+    user_board = store_provisioned_boards([(user, result)])[0]
+    return jsonify({'message': 'Board created', 'board': user_board.to_dict()}), 201
+
+def store_provisioned_boards(provisioned):
+    """Insert the UserBoard rows for [(user, provision result)] and link each user, in one transaction"""
+    user_boards = []
+    for user, result in provisioned:
+        user_board = UserBoard(
+            user_email=user.email, board_id=result['board_id'], board_name=result['board_name'], lists=result['lists']
         )
-        if list_res.status_code != 200:
-            return jsonify({'error': f'Failed to create list {name}', 'details': list_res.text}), 500
-        list_data = list_res.json()
-        lists[name] = list_data['id']
-    user_board = UserBoard(user_email=user.email, board_id=board_id, board_name=board_name, lists=lists)
-    db.session.add(user_board)
-    
-    # Update user's linked board information
-    user.linked_board_id = board_id
-    user.linked_board_name = board_name
-    
+        db.session.add(user_board)
+        # Update user's linked board information
+        user.linked_board_id = result['board_id']
+        user.linked_board_name = result['board_name']
+        user_boards.append(user_board)
     db.session.commit()
-    return jsonify({'message': 'Board created', 'board': user_board.to_dict()}), 201
+    emails = [user.email for user, _ in provisioned]
+    board_provisioner.forget(*emails)
+    for email in emails:
+        invalidate_job_contexts(q.connection if q else None, email)
+    return user_boards
+
+@app.route('/api/users/bulk', methods=['POST'])
+@login_required
+def provision_users():
+    """Onboard many users at once: upsert each user, then create their boards and lists concurrently.
+
+    Body: {"users": [{"email", "apiKey", "token", "board_name"?}, ...]}. Safe to
+    re-run after a partial failure: users with a board are skipped and half-made
+    boards are finished rather than created again.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('users')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'Missing users'}), 400
+    report = {}
+    users = {}
+    relinked = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            report[f'#{i}'] = {'status': 'invalid', 'error': 'Each user must be an object'}
+            continue
+        email = entry.get('email')
+        if not isinstance(email, str) or not email or not entry.get('apiKey') or not entry.get('token'):
+            report[email if isinstance(email, str) and email else f'#{i}'] = {
+                'status': 'invalid', 'error': 'Missing required fields'
+            }
+            continue
+        user = User.query.get(email)
+        if user is None:
+            user = User(email=email, apiKey=entry['apiKey'], token=entry['token'])
+            db.session.add(user)
+        elif user.apiKey != entry['apiKey'] or user.token != entry['token']:
+            user.apiKey = entry['apiKey']
+            user.token = entry['token']
+            user.trello_member_id = None
+            user.trello_username = None
+            relinked.append(email)
+        users[email] = (user, entry.get('board_name') or default_board_name(email))
+    db.session.commit()
+    # As in add_user: jobs and mentions must not keep using the old credentials and username
+    for email in relinked:
+        invalidate_job_contexts(q.connection if q else None, email)
+        if username_directory:
+            username_directory.forget(email)
+        if identity_cache:
+            identity_cache.invalidate(email)
+
+    existing = {
+        ub.user_email: ub for ub in UserBoard.query.filter(UserBoard.user_email.in_(list(users))).all()
+    } if users else {}
+    pending = []
+    for email, (user, board_name) in users.items():
+        if email in existing:
+            report[email] = {'status': 'exists', 'board_id': existing[email].board_id}
+        else:
+            pending.append((email, trello_auth(user), board_name))
+
+    results = board_provisioner.provision_many(get_trello_client(), pending)
+    provisioned = []
+    for email, (result, error) in results.items():
+        if error is not None:
+            report[email] = {'status': 'failed', 'error': str(error), 'details': trello_error_text(error.resp)}
+        else:
+            provisioned.append((users[email][0], result))
+    try:
+        store_provisioned_boards(provisioned)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"[Provision] Could not store {len(provisioned)} boards: {e}")
+        # Boards stay in the provisioning progress, so a retry stores them without creating new ones
+        for user, result in provisioned:
+            report[user.email] = {'status': 'failed', 'board_id': result['board_id'], 'error': 'Could not save board'}
+        provisioned = []
+    for user, result in provisioned:
+        report[user.email] = {'status': 'created', 'board_id': result['board_id']}
+
+    summary = {}
+    for item in report.values():
+        summary[item['status']] = summary.get(item['status'], 0) + 1
+    return jsonify({'summary': summary, 'users': report}), 200
 
 @app.route('/api/trello/labels', methods=['GET'])
 @login_required
@@ -562,18 +770,14 @@ def get_trello_labels():
     if not user.linked_board_id:
         return jsonify({'error': 'No linked board found. Please connect to Trello first.'}), 400
     
-    api_key = user.apiKey
-    token = user.token
-    
     # Fetch labels from the linked board
-    labels_url = f"https://api.trello.com/1/boards/{user.linked_board_id}/labels?key={api_key}&token={token}"
     try:
-        resp = requests.get(labels_url)
-        if resp.status_code != 200:
-            logger.error(f"Failed to fetch labels for board {user.linked_board_id}: {resp.text}")
+        # ?refresh=1 lets the label picker skip a cached list that lacks a just-created label
+        labels = get_board_labels(user, user.linked_board_id, refresh=request.args.get('refresh') == '1')
+        if labels is None:
+            logger.error(f"Failed to fetch labels for board {user.linked_board_id}")
             return jsonify({'error': 'Failed to fetch labels from Trello'}), 500
-        
-        labels = resp.json()
+
         # Format labels for frontend consumption
         formatted_labels = []
         for label in labels:
@@ -623,6 +827,8 @@ def initialize_database():
 def clear_db():
     db.drop_all()
     db.create_all()
+    subscription_index.invalidate()
+    invalidate_job_contexts(q.connection if q else None)
     return "Database cleared!", 200
 
 
@@ -6,6 +6,7 @@ from db import db
 from redis import Redis
 from rq import Queue
 from dotenv import load_dotenv
+from serializers import get_rq_serializer, configure_json_provider
 import os
 import logging
 
@@ -13,6 +14,10 @@ import logging
 logger = logging.getLogger(__name__)
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+def get_redis_url():
+    redis_port = os.environ.get('REDIS_PORT', '6379')
+    return f"redis://redis:{redis_port}/0"
+
 def create_app():
     app = Flask(__name__, static_folder='frontend/dist', static_url_path='')
     secret_key = os.environ.get('SECRET_KEY')
@@ -22,14 +27,14 @@ def create_app():
     # Use environment variable directly for database URI
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI', 'sqlite:////app/instance/users.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_json_provider(app)
     # Redis connection - will be established when needed
-    redis_port = os.environ.get('REDIS_PORT', '6379')
-    redis_url = f"redis://redis:{redis_port}/0"
+    redis_url = get_redis_url()
     
     # Create Redis connection with error handling
     try:
         redis_conn = Redis.from_url(redis_url, socket_connect_timeout=5, socket_timeout=5)
-        q = Queue('trello-events', connection=redis_conn)
+        q = Queue('trello-events', connection=redis_conn, serializer=get_rq_serializer())
     except Exception as e:
         # If Redis is not available, create a dummy queue
         logger.warning(f"Redis connection failed: {e}. Using dummy queue.")
@@ -0,0 +1,241 @@
+# backend/board_cache.py
+
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BOARD_META_KEY_PREFIX = 'trello:board-meta:'
+BOARD_META_VERSION_KEY = 'trello:board-meta:version'
+BOARD_META_LOG_KEY = 'trello:board-meta:invalidations'
+BOARD_META_STATS_KEY = 'trello:board-meta:stats'
+
+# Webhook actions that change a board's cached metadata, and which part
+METADATA_ACTIONS = {
+    'createLabel': 'labels',
+    'updateLabel': 'labels',
+    'deleteLabel': 'labels',
+    'createList': 'lists',
+    'updateList': 'lists',
+    'moveListToBoard': 'lists',
+    'moveListFromBoard': 'lists',
+}
+
+# Drop the shared entry and log the invalidation under a new version, atomically
+INVALIDATE_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('DEL', KEYS[3])
+redis.call('ZADD', KEYS[2], version, version .. ':' .. ARGV[1])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+return version
+"""
+
+
+class BoardMetadataCache:
+    """Board labels and lists, cached in a per-process LRU in front of Redis.
+
+    A lookup tries the local LRU (bounded to `max_entries`), then Redis, then
+    Trello. Both tiers expire entries after `ttl` seconds. The label and list
+    webhook actions we already receive invalidate exactly the affected entry.
+    Those only come from boards with our webhook, usually source boards, so the
+    labels of a user's target board are also invalidated when Trello rejects a
+    label call on it with a 4xx (see tasks._process_event). An invalidated
+    entry's Redis key is deleted and the invalidation is logged under a new
+    shared version, so every process drops the same entry from its LRU within
+    `check_interval` seconds. Only the last `log_size` invalidations are kept;
+    a process that fell further behind clears its whole LRU instead.
+
+    Hit and miss counts are kept in memory and added to a shared Redis hash
+    once per `check_interval`, so local hits never cost a round trip.
+    """
+
+    def __init__(self, redis_conn, ttl=3600, max_entries=1024, check_interval=1.0, log_size=1000):
+        self.redis = redis_conn
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.log_size = log_size
+        self.local = OrderedDict()
+        self.version = None
+        self.last_check = 0.0
+        self.counts = {}
+        self.lock = Lock()
+        self.invalidate_script = redis_conn.register_script(INVALIDATE_SCRIPT)
+
+    def _key(self, kind, board_id):
+        return f"{kind}:{board_id}"
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def _sync(self):
+        """Apply invalidations made elsewhere and publish our counters"""
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        try:
+            pipe = self.redis.pipeline()
+            pipe.get(BOARD_META_VERSION_KEY)
+            for name, value in counts.items():
+                pipe.hincrby(BOARD_META_STATS_KEY, name, value)
+            version = int(pipe.execute()[0] or 0)
+            if self.version is None or version == self.version:
+                self.version = version
+                return
+            changed = self.redis.zrangebyscore(BOARD_META_LOG_KEY, self.version + 1, version, withscores=True)
+        except Exception as e:
+            logger.warning(f"[BoardCache] Could not sync with Redis: {e}")
+            return
+        with self.lock:
+            if len(changed) < version - self.version:
+                # Some invalidations fell out of the log; start over
+                self.local.clear()
+            else:
+                for member, _ in changed:
+                    self.local.pop(member.decode().split(':', 1)[1], None)
+            self.version = version
+
+    def _get_local(self, key):
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.local[key]
+                return None
+            self.local.move_to_end(key)
+            return value
+
+    def _put_local(self, key, value, expires_at):
+        with self.lock:
+            self.local[key] = (value, expires_at)
+            self.local.move_to_end(key)
+            while len(self.local) > self.max_entries:
+                self.local.popitem(last=False)
+
+    def _get_shared(self, key):
+        try:
+            raw = self.redis.get(f"{BOARD_META_KEY_PREFIX}{key}")
+        except Exception as e:
+            logger.warning(f"[BoardCache] Could not read {key}: {e}")
+            return None, None
+        if raw is None:
+            return None, None
+        entry = json.loads(raw)
+        return entry['value'], entry['expires_at']
+
+    def put_many(self, kind, values):
+        """Store fresh metadata for several boards, e.g. lists that came nested in another response"""
+        self._sync()
+        expires_at = time.time() + self.ttl
+        try:
+            pipe = self.redis.pipeline()
+            for board_id, value in values.items():
+                key = self._key(kind, board_id)
+                self._put_local(key, value, expires_at)
+                pipe.set(
+                    f"{BOARD_META_KEY_PREFIX}{key}",
+                    json.dumps({'value': value, 'expires_at': expires_at}, separators=(',', ':')),
+                    ex=self.ttl,
+                )
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[BoardCache] Could not store {kind} for {len(values)} boards: {e}")
+
+    def get(self, kind, board_id, fetch, refresh=False):
+        """Cached `kind` metadata for a board; on a miss `fetch()` loads it (None = don't cache).
+
+        `refresh` drops the cached entry everywhere first, for a caller that
+        found it stale (e.g. a label id missing from the cached labels).
+        """
+        if refresh:
+            self.invalidate(kind, board_id)
+        self._sync()
+        key = self._key(kind, board_id)
+        value = self._get_local(key)
+        if value is not None:
+            self._count(f"{kind}_local_hits")
+            return value
+        value, expires_at = self._get_shared(key)
+        if value is not None:
+            self._count(f"{kind}_redis_hits")
+            self._put_local(key, value, expires_at)
+            return value
+        self._count(f"{kind}_misses")
+        value = fetch()
+        if value is not None:
+            self.put_many(kind, {board_id: value})
+        return value
+
+    def labels(self, client, auth, board_id, refresh=False):
+        """The board's labels, or None if Trello could not be asked"""
+        return self.get('labels', board_id, lambda: _fetch(client.get_board_labels, auth, board_id), refresh)
+
+    def lists(self, client, auth, board_id, refresh=False):
+        """The board's open lists, or None if Trello could not be asked"""
+        return self.get('lists', board_id, lambda: _fetch(client.get_board_lists, auth, board_id), refresh)
+
+    def invalidate(self, kind, board_id):
+        key = self._key(kind, board_id)
+        with self.lock:
+            self.local.pop(key, None)
+        try:
+            self.invalidate_script(
+                keys=[BOARD_META_VERSION_KEY, BOARD_META_LOG_KEY, f"{BOARD_META_KEY_PREFIX}{key}"],
+                args=[key, self.log_size],
+            )
+        except Exception as e:
+            logger.warning(f"[BoardCache] Could not invalidate {key}: {e}")
+            return
+        logger.info(f"[BoardCache] Invalidated {kind} of board {board_id}")
+
+    def invalidate_for_action(self, action_type, board_id):
+        """Drop what a webhook action changed. Returns True if the action touched cached metadata."""
+        kind = METADATA_ACTIONS.get(action_type)
+        if kind is None or not board_id:
+            return False
+        self.invalidate(kind, board_id)
+        return True
+
+    def stats(self):
+        return board_cache_stats(self.redis)
+
+
+def _fetch(call, auth, board_id):
+    resp = call(auth, board_id)
+    if resp is None or resp.status_code != 200:
+        return None
+    return resp.json()
+
+
+def board_cache_stats(redis_conn):
+    """Shared hit/miss counters per metadata kind and tier"""
+    try:
+        stats = {k.decode(): int(v) for k, v in redis_conn.hgetall(BOARD_META_STATS_KEY).items()}
+    except Exception as e:
+        logger.warning(f"[BoardCache] Could not read counters: {e}")
+        return {}
+    for kind in set(METADATA_ACTIONS.values()):
+        lookups = sum(stats.get(f"{kind}_{name}", 0) for name in ('local_hits', 'redis_hits', 'misses'))
+        if lookups:
+            stats[f"{kind}_hit_rate"] = round(1 - stats.get(f"{kind}_misses", 0) / lookups, 3)
+    return stats
+
+
+def build_board_cache(redis_conn):
+    """BoardMetadataCache configured from BOARD_CACHE_TTL and BOARD_CACHE_LOCAL_SIZE"""
+    return BoardMetadataCache(
+        redis_conn,
+        ttl=int(os.environ.get('BOARD_CACHE_TTL', '3600')),
+        max_entries=int(os.environ.get('BOARD_CACHE_LOCAL_SIZE', '1024')),
+    )
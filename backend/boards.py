@@ -0,0 +1,67 @@
+# backend/boards.py
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Boards with their open lists nested in, one request for all of them
+MEMBER_BOARDS_PARAMS = {'fields': 'name', 'lists': 'open', 'list_fields': 'name'}
+
+# Just the boards, for paging through them before fetching any lists
+MEMBER_BOARD_NAMES_PARAMS = {'fields': 'name'}
+
+# Bounds how many per-board list fetches run at once when nesting isn't available
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('TRELLO_BOARDS_CONCURRENCY', '8')),
+    thread_name_prefix='trello-boards'
+)
+
+
+def _board_summary(board, lists):
+    return {
+        'id': board['id'],
+        'name': board['name'],
+        'lists': [board_list['name'] for board_list in lists]
+    }
+
+
+def fetch_board_lists(client, auth, board_ids, cache=None):
+    """{board_id: [list, ...]} fetched concurrently; every call still waits on the shared rate limiter"""
+    def fetch(board_id):
+        if cache is not None:
+            return cache.lists(client, auth, board_id) or []
+        resp = client.get_board_lists(auth, board_id)
+        return resp.json() if resp is not None and resp.status_code == 200 else []
+
+    return dict(zip(board_ids, _executor.map(fetch, board_ids), strict=True))
+
+
+def fetch_boards_with_lists(client, auth, offset=0, limit=None, cache=None):
+    """The member's boards (one page of them with `limit`) with their open list names.
+
+    Returns (boards, total, error_response). Without `limit` this is normally
+    one Trello request with every board's lists nested in. A page fetches only
+    the board names, then the lists of the boards on that page concurrently, so
+    the first page doesn't wait for every board's lists. Boards that come back
+    without nested lists get theirs fetched the same way. With `cache` (a
+    board_cache.BoardMetadataCache) nested lists are stored in it and separate
+    fetches are served from it.
+    """
+    params = MEMBER_BOARD_NAMES_PARAMS if limit else MEMBER_BOARDS_PARAMS
+    boards_resp = client.get_member_boards(auth, params=params)
+    if boards_resp is None or boards_resp.status_code != 200:
+        return None, 0, boards_resp
+    boards_data = boards_resp.json()
+    total = len(boards_data)
+    page = boards_data[offset:offset + limit] if limit else boards_data[offset:]
+    missing = [board['id'] for board in page if 'lists' not in board]
+    if cache is not None:
+        cache.put_many('lists', {board['id']: board['lists'] for board in page if 'lists' in board})
+    fetched = fetch_board_lists(client, auth, missing, cache) if missing else {}
+    if missing:
+        logger.info(f"[Boards] Fetched lists for {len(missing)} boards separately")
+    boards = [_board_summary(board, board['lists'] if 'lists' in board else fetched[board['id']]) for board in page]
+    return boards, total, None
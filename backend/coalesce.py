@@ -0,0 +1,90 @@
+# backend/coalesce.py
+
+import logging
+from rate_limit import TrelloThrottled
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COALESCE_KEY_PREFIX = 'trello:coalesce:'
+COALESCE_STATS_KEY = 'trello:coalesce:stats'
+
+# Delete the window only if this job still owns it
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class CopyInProgress(TrelloThrottled):
+    """Another job is copying this card for the user; defer like a throttled call
+    and come back to add this job's label to that copy"""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.args = (f"card is being copied by another job, retry after {retry_after}s",)
+
+
+class CardCoalescer:
+    """Collapses events for the same (user, source card) into one card copy.
+
+    One action on Trello often fires several webhooks for a card within a
+    second or two (a mention plus an add-member, an edited comment...). The
+    first job that is about to copy the card opens a `window`-second claim in
+    Redis; any other job for the same user and card inside that window is
+    collapsed into it. A collapsed job whose setting adds nothing to the copy
+    returns; one with its own label is merged into the copy instead (see
+    tasks._process_event). The owner keeps its claim across throttling
+    deferrals by presenting the same token, and gives it up if the copy fails
+    so a later event can still go through.
+    """
+
+    def __init__(self, redis_conn, window=5):
+        self.redis = redis_conn
+        self.window = window
+        self.release_script = redis_conn.register_script(RELEASE_SCRIPT)
+
+    def _key(self, user_email, card_id):
+        return f"{COALESCE_KEY_PREFIX}{user_email}:{card_id}"
+
+    def claim(self, user_email, card_id, token):
+        """True if this job should copy the card, False if it was collapsed into another"""
+        if self.window <= 0:
+            return True
+        key = self._key(user_email, card_id)
+        try:
+            if self.redis.set(key, token, nx=True, ex=self.window):
+                self.redis.hincrby(COALESCE_STATS_KEY, 'copies', 1)
+                return True
+            owner = self.redis.get(key)
+            if owner is not None and owner.decode() == token:
+                return True
+            self.redis.hincrby(COALESCE_STATS_KEY, 'collapsed', 1)
+        except Exception as e:
+            # Fail open: a duplicate copy beats a lost one
+            logger.warning(f"[Coalesce] Could not claim {user_email}/{card_id}: {e}")
+            return True
+        logger.info(f"[Coalesce] Event for {user_email}/{card_id} collapsed into job {owner.decode() if owner else '?'}")
+        return False
+
+    def release(self, user_email, card_id, token):
+        if self.window <= 0:
+            return
+        try:
+            self.release_script(keys=[self._key(user_email, card_id)], args=[token])
+        except Exception as e:
+            logger.warning(f"[Coalesce] Could not release {user_email}/{card_id}: {e}")
+
+    def stats(self):
+        return {**coalesce_stats(self.redis), 'window_seconds': self.window}
+
+
+def coalesce_stats(redis_conn):
+    """Shared counters: copies that opened a window and events collapsed into one"""
+    try:
+        return {k.decode(): int(v) for k, v in redis_conn.hgetall(COALESCE_STATS_KEY).items()}
+    except Exception as e:
+        logger.warning(f"[Coalesce] Could not read counters: {e}")
+        return {}
@@ -0,0 +1,167 @@
+# backend/copy_plan.py
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COPY_STATS_KEY = 'trello:copy:stats'
+
+# Shared by every plan in the process; bounds how many follow-up calls run at once
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('TRELLO_CALL_CONCURRENCY', '4')),
+    thread_name_prefix='trello-call'
+)
+
+
+class CardCopyPlan:
+    """The Trello calls that copy one card onto a user's board, in as few round trips as possible.
+
+    The label goes out with the card-create call (idLabels next to idCardSource),
+    so a copy with a known label id is two calls: create, then attach the link to
+    the original. Calls that only need the new card id run concurrently. Each
+    finished step is written to `progress`, so a job resumed after throttling
+    skips it, and `progress['calls']` counts every call made for the event.
+    With `metadata` (a board_cache.BoardMetadataCache) label names resolve from
+    the cache.
+    """
+
+    def __init__(self, client, auth, progress, metadata=None):
+        self.client = client
+        self.metadata = metadata
+        self.auth = auth
+        self.progress = progress
+        self.lock = threading.Lock()
+        progress.setdefault('calls', 0)
+
+    def _call(self, fn, *args, **kwargs):
+        with self.lock:
+            self.progress['calls'] += 1
+        return fn(self.auth, *args, **kwargs)
+
+    def resolve_label(self, board_id, label_name):
+        """Label id for a label name on the target board (at most one labels fetch), or None"""
+        if 'label_id' in self.progress:
+            return self.progress['label_id']
+        if self.metadata is not None:
+            # Only a cache miss costs a call
+            labels = self.metadata.get('labels', board_id, lambda: self._fetch_labels(board_id))
+        else:
+            labels = self._fetch_labels(board_id)
+        if labels is None:
+            logger.error(f'[CopyPlan] Failed to fetch labels for board {board_id}')
+            return None
+        label_obj = next((label for label in labels if label.get('name') == label_name), None)
+        if not label_obj:
+            logger.warning(f'[CopyPlan] Label {label_name} not found on board {board_id}')
+        self.progress['label_id'] = label_obj['id'] if label_obj else None
+        return self.progress['label_id']
+
+    def _fetch_labels(self, board_id):
+        resp = self._call(self.client.get_board_labels, board_id)
+        if not resp or resp.status_code != 200:
+            return None
+        return resp.json()
+
+    def create_card(self, source_card_id, list_id, label_id=None):
+        """Copy the source card with its label applied. Returns the Trello response.
+
+        A stored label id can go stale (the label was deleted on Trello), which
+        makes Trello reject the whole create; the card is then created again
+        without it, and finish() tries the label on its own.
+        """
+        resp = self._call(
+            self.client.copy_card, source_card_id, list_id, label_ids=[label_id] if label_id else None
+        )
+        if label_id and resp is not None and 400 <= resp.status_code < 500 and resp.status_code != 401:
+            logger.warning(
+                f'[CopyPlan] Copy of {source_card_id} with label {label_id} was rejected '
+                f'({resp.status_code}), copying without it'
+            )
+            resp = self._call(self.client.copy_card, source_card_id, list_id, label_ids=None)
+            label_id = None
+        if resp is not None and resp.status_code == 200:
+            new_card_id = resp.json().get('id')
+            if new_card_id:
+                self.progress['new_card_id'] = new_card_id
+                self.progress['labelled'] = bool(label_id)
+        return resp
+
+    def finish(self, new_card_id, attachment_url, attachment_name, label_id=None):
+        """Run the follow-up calls for a created card concurrently.
+
+        The label is only sent here when it couldn't go out with the create call
+        (e.g. a job resumed from an older progress record, or a create that
+        rejected it). Returns step -> response.
+        """
+        steps = {}
+        if not self.progress.get('attached'):
+            steps['attached'] = (self.client.add_attachment, new_card_id, attachment_url, attachment_name)
+        if label_id and not self.progress.get('labelled'):
+            steps['labelled'] = (self.client.add_label, new_card_id, label_id)
+        if len(steps) <= 1:
+            results = {step: self._call(*call) for step, call in steps.items()}
+        else:
+            results = self._run_concurrently(steps)
+        for step, resp in results.items():
+            # A failed step stays pending, so a deferred or replayed job tries it again
+            if _succeeded(resp):
+                self.progress[step] = True
+        return results
+
+    def _run_concurrently(self, steps):
+        deferring = self.client.is_deferring()
+
+        def run(call):
+            # The deferring flag is per thread; carry it into the pool thread
+            if deferring:
+                with self.client.deferring():
+                    return self._call(*call)
+            return self._call(*call)
+
+        futures = {step: _executor.submit(run, call) for step, call in steps.items()}
+        results, error = {}, None
+        for step, future in futures.items():
+            try:
+                results[step] = future.result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            # Keep what did finish so a resumed job doesn't repeat it
+            for step, resp in results.items():
+                if _succeeded(resp):
+                    self.progress[step] = True
+            raise error
+        return results
+
+    def record(self, redis_conn):
+        """Add this event's call count to the shared copy counters"""
+        if redis_conn is None:
+            return
+        try:
+            pipe = redis_conn.pipeline()
+            pipe.hincrby(COPY_STATS_KEY, 'events', 1)
+            pipe.hincrby(COPY_STATS_KEY, 'calls', self.progress['calls'])
+            pipe.hincrby(COPY_STATS_KEY, f"events_with_{self.progress['calls']}_calls", 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[CopyPlan] Could not record call counts: {e}")
+
+
+def _succeeded(resp):
+    return resp is not None and resp.status_code in (200, 201)
+
+
+def copy_stats(redis_conn):
+    """Shared copy counters, with the average number of Trello calls per copied card"""
+    try:
+        stats = {k.decode(): int(v) for k, v in redis_conn.hgetall(COPY_STATS_KEY).items()}
+    except Exception as e:
+        logger.warning(f"[CopyPlan] Could not read call counts: {e}")
+        return {}
+    if stats.get('events'):
+        stats['calls_per_event'] = round(stats.get('calls', 0) / stats['events'], 2)
+    return stats
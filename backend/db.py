@@ -13,6 +13,8 @@ class User(db.Model, UserMixin):
     token = db.Column(db.String, nullable=False)
     linked_board_id = db.Column(db.String, nullable=True)
     linked_board_name = db.Column(db.String, nullable=True)
+    trello_member_id = db.Column(db.String, nullable=True)
+    trello_username = db.Column(db.String, nullable=True)
 
     def get_id(self):
         return self.email
@@ -23,7 +25,9 @@ class User(db.Model, UserMixin):
             'apiKey': self.apiKey,
             'token': self.token,
             'linked_board_id': self.linked_board_id,
-            'linked_board_name': self.linked_board_name
+            'linked_board_name': self.linked_board_name,
+            'trello_member_id': self.trello_member_id,
+            'trello_username': self.trello_username
         }
 
 class WebhookSetting(db.Model):
@@ -38,6 +42,8 @@ class WebhookSetting(db.Model):
     label_name = db.Column(db.String, nullable=True)
     list_name = db.Column(db.String, nullable=True)
     webhook_id = db.Column(db.String, nullable=True)  # Trello webhook id
+    # A user's settings are listed a page at a time in id order
+    __table_args__ = (db.Index('ix_webhook_settings_user_email_id', 'user_email', 'id'),)
 
     def to_dict(self):
         return {
@@ -56,7 +62,7 @@ class WebhookSetting(db.Model):
 class UserBoard(db.Model):
     __tablename__ = 'user_boards'
     id = db.Column(db.Integer, primary_key=True)
-    user_email = db.Column(db.String, db.ForeignKey('users.email'), nullable=False)
+    user_email = db.Column(db.String, db.ForeignKey('users.email'), nullable=False, index=True)
     board_id = db.Column(db.String, nullable=False)
     board_name = db.Column(db.String, nullable=False)
     lists = db.Column(JSON, nullable=False)  # {list_name: list_id}
@@ -70,6 +76,28 @@ class UserBoard(db.Model):
             'lists': self.lists
         }
 
+class CardCopy(db.Model):
+    """Ledger of source cards copied to a user's board: one row per (user, source card)"""
+    __tablename__ = 'card_copies'
+    id = db.Column(db.Integer, primary_key=True)
+    user_email = db.Column(db.String, db.ForeignKey('users.email'), nullable=False)
+    source_card_id = db.Column(db.String, nullable=False)
+    new_card_id = db.Column(db.String, nullable=True)  # Set once the copy exists
+    claim_token = db.Column(db.String, nullable=True)  # Job that is copying (or copied) the card
+    claimed_at = db.Column(db.DateTime, nullable=False)
+    copied_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (db.UniqueConstraint('user_email', 'source_card_id', name='_user_source_card_uc'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_email': self.user_email,
+            'source_card_id': self.source_card_id,
+            'new_card_id': self.new_card_id,
+            'claimed_at': self.claimed_at.isoformat() if self.claimed_at else None,
+            'copied_at': self.copied_at.isoformat() if self.copied_at else None
+        }
+
 class TrelloWebhook(db.Model):
     __tablename__ = 'trello_webhooks'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,103 @@
+# backend/dead_letter.py
+
+import json
+import time
+import uuid
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_ENTRIES_KEY = 'trello:dead-letter:entries'
+DEAD_LETTER_INDEX_KEY = 'trello:dead-letter:index'
+
+
+class DeadLetterQueue:
+    """Events whose copy failed for good, kept in Redis until they are replayed.
+
+    Each entry holds the parsed event, the webhook setting it was processed
+    for (its id, or the whole setting for legacy full-payload jobs), the job's
+    progress, why it failed and how many times it has been tried. Entries are
+    stored in a hash by id and indexed by failure time in a sorted set; past
+    `max_entries` the oldest are dropped.
+    """
+
+    def __init__(self, redis_conn, max_entries=10000):
+        self.redis = redis_conn
+        self.max_entries = max_entries
+
+    def record(self, event, reason, attempts=1, setting_id=None, setting=None, progress=None):
+        """Store a failed event. Returns the entry id, or None if Redis is unavailable."""
+        entry_id = uuid.uuid4().hex
+        setting = setting or {}
+        entry = {
+            'id': entry_id,
+            'failed_at': time.time(),
+            'reason': reason,
+            'attempts': attempts,
+            'user_email': setting.get('user_email'),
+            'board_id': event.board_id if event else setting.get('board_id'),
+            'setting_id': setting_id,
+            'setting': None if setting_id is not None else setting,
+            'event': event.to_dict() if event else None,
+            'progress': progress or {},
+        }
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hset(DEAD_LETTER_ENTRIES_KEY, entry_id, json.dumps(entry, separators=(',', ':')))
+            pipe.zadd(DEAD_LETTER_INDEX_KEY, {entry_id: entry['failed_at']})
+            pipe.execute()
+            self._trim()
+        except Exception as e:
+            logger.error(f"[DeadLetter] Could not record failed event {event.action_id if event else '?'}: {e}")
+            return None
+        logger.warning(
+            f"[DeadLetter] Event {event.action_id if event else '?'} for {entry['user_email']} "
+            f"dead-lettered after {attempts} attempt(s): {reason}"
+        )
+        return entry_id
+
+    def _trim(self):
+        excess = self.redis.zcard(DEAD_LETTER_INDEX_KEY) - self.max_entries
+        if excess > 0:
+            dropped = [entry_id for entry_id, _ in self.redis.zpopmin(DEAD_LETTER_INDEX_KEY, excess)]
+            self.redis.hdel(DEAD_LETTER_ENTRIES_KEY, *dropped)
+            logger.warning(f"[DeadLetter] Dropped {len(dropped)} oldest entries (limit {self.max_entries})")
+
+    def entries(self, user_email=None, board_id=None, since=None, until=None, limit=None):
+        """Entries oldest first, filtered by user, source board and failure time (epoch seconds)"""
+        ids = self.redis.zrangebyscore(
+            DEAD_LETTER_INDEX_KEY,
+            since if since is not None else '-inf',
+            until if until is not None else '+inf',
+        )
+        found = []
+        for start in range(0, len(ids), 500):
+            for raw in self.redis.hmget(DEAD_LETTER_ENTRIES_KEY, ids[start:start + 500]):
+                if raw is None:
+                    continue
+                entry = json.loads(raw)
+                if user_email and entry.get('user_email') != user_email:
+                    continue
+                if board_id and entry.get('board_id') != board_id:
+                    continue
+                found.append(entry)
+                if limit and len(found) >= limit:
+                    return found
+        return found
+
+    def restore(self, entry):
+        """Put back an entry taken off the queue (e.g. by a replay that could not run it)"""
+        pipe = self.redis.pipeline()
+        pipe.hset(DEAD_LETTER_ENTRIES_KEY, entry['id'], json.dumps(entry, separators=(',', ':')))
+        pipe.zadd(DEAD_LETTER_INDEX_KEY, {entry['id']: entry['failed_at']})
+        pipe.execute()
+
+    def remove(self, entry_id):
+        pipe = self.redis.pipeline()
+        pipe.hdel(DEAD_LETTER_ENTRIES_KEY, entry_id)
+        pipe.zrem(DEAD_LETTER_INDEX_KEY, entry_id)
+        return pipe.execute()[0] > 0
+
+    def count(self):
+        return self.redis.zcard(DEAD_LETTER_INDEX_KEY)
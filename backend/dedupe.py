@@ -0,0 +1,129 @@
+# backend/dedupe.py
+
+import math
+import hashlib
+import logging
+from threading import Lock
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SEEN_KEY_PREFIX = 'trello:seen-action:'
+STATS_KEY = 'trello:dedupe:stats'
+
+
+class BloomFilter:
+    """Small two-generation Bloom filter.
+
+    When the current generation reaches its capacity it becomes the previous one
+    and a fresh generation starts, so memory stays bounded and old ids age out.
+    """
+
+    def __init__(self, capacity=100000, error_rate=1e-6):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.current = bytearray((self.size + 7) // 8)
+        self.previous = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little')
+        # Enhanced double hashing keeps the probes independent for any filter size
+        return [(h1 + i * h2 + (i * i * i - i) // 6) % self.size for i in range(self.hash_count)]
+
+    @staticmethod
+    def _contains(bits, positions):
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def __contains__(self, item):
+        positions = self._positions(item)
+        return self._contains(self.current, positions) or self._contains(self.previous, positions)
+
+    def add(self, item):
+        if self.count >= self.capacity:
+            self.previous = self.current
+            self.current = bytearray(len(self.previous))
+            self.count = 0
+        for p in self._positions(item):
+            self.current[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class ActionDeduplicator:
+    """Suppress Trello redeliveries by action id.
+
+    Redis SET NX with a TTL is the source of truth across processes. The optional
+    local Bloom filter only remembers ids that have already been seen as duplicates,
+    so repeated redeliveries of a hot action are answered without a Redis round trip.
+    A Bloom false positive would drop a new action, hence the low default error rate.
+    """
+
+    def __init__(self, redis_conn, ttl=86400, use_bloom=False, bloom_capacity=100000, bloom_error_rate=1e-6):
+        self.redis = redis_conn
+        self.ttl = ttl
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate) if use_bloom else None
+        self.lock = Lock()
+        # Local suppressions not yet added to the shared counters
+        self.pending_local = 0
+        self.suppressed_local = 0
+        self.suppressed_redis = 0
+
+    def claim(self, action_id):
+        """Return True for the first delivery of an action, False for a duplicate"""
+        if self.bloom is not None:
+            with self.lock:
+                if action_id in self.bloom:
+                    self.suppressed_local += 1
+                    self.pending_local += 1
+                    return False
+        try:
+            first = self.redis.set(f"{SEEN_KEY_PREFIX}{action_id}", 1, nx=True, ex=self.ttl)
+        except Exception as e:
+            # Fail open: a duplicate copy is better than a lost event
+            logger.warning(f"[Dedupe] Could not check action {action_id}: {e}")
+            return True
+        if first:
+            return True
+        with self.lock:
+            self.suppressed_redis += 1
+            pending_local, self.pending_local = self.pending_local, 0
+            if self.bloom is not None:
+                self.bloom.add(action_id)
+        self._record(redis_hits=1, local_hits=pending_local)
+        return False
+
+    def release(self, action_id):
+        """Forget a claim whose routing failed so Trello's retry is processed"""
+        try:
+            self.redis.delete(f"{SEEN_KEY_PREFIX}{action_id}")
+        except Exception as e:
+            logger.warning(f"[Dedupe] Could not release action {action_id}: {e}")
+
+    def _record(self, redis_hits=0, local_hits=0):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            if redis_hits:
+                pipe.hincrby(STATS_KEY, 'suppressed_redis', redis_hits)
+            if local_hits:
+                pipe.hincrby(STATS_KEY, 'suppressed_local', local_hits)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[Dedupe] Could not record counters: {e}")
+
+    def stats(self):
+        """Duplicate counters for this process and across all processes"""
+        shared = {}
+        try:
+            shared = {k.decode(): int(v) for k, v in self.redis.hgetall(STATS_KEY).items()}
+        except Exception as e:
+            logger.warning(f"[Dedupe] Could not read counters: {e}")
+        return {
+            'process': {
+                'suppressed_local': self.suppressed_local,
+                'suppressed_redis': self.suppressed_redis,
+            },
+            'cluster': shared,
+        }
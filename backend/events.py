@@ -0,0 +1,81 @@
+# backend/events.py
+
+import json
+import hashlib
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EVENT_KEY_PREFIX = 'trello:event:'
+
+
+class TrelloEvent:
+    """The slice of a Trello webhook action that process_trello_event reads"""
+
+    __slots__ = (
+        'action_id', 'action_type', 'webhook_id', 'board_id',
+        'card_id', 'card_name', 'comment_text', 'member_username',
+    )
+
+    def __init__(self, action_id=None, action_type=None, webhook_id=None, board_id=None,
+                 card_id=None, card_name=None, comment_text=None, member_username=None):
+        self.action_id = action_id
+        self.action_type = action_type
+        self.webhook_id = webhook_id
+        self.board_id = board_id
+        self.card_id = card_id
+        self.card_name = card_name
+        self.comment_text = comment_text
+        self.member_username = member_username
+
+    @classmethod
+    def from_payload(cls, payload):
+        """Parse a raw Trello webhook payload once"""
+        action = payload.get('action') or {}
+        data = action.get('data') or {}
+        card = data.get('card') or {}
+        member = action.get('member') or {}
+        return cls(
+            action_id=action.get('id'),
+            action_type=action.get('type'),
+            webhook_id=(payload.get('webhook') or {}).get('id'),
+            board_id=(data.get('board') or {}).get('id'),
+            card_id=card.get('id'),
+            card_name=card.get('name'),
+            comment_text=data.get('text'),
+            member_username=member.get('username'),
+        )
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+
+class EventStore:
+    """Stores each parsed event once in Redis so jobs can carry just its key"""
+
+    def __init__(self, redis_conn, ttl=86400):
+        self.redis = redis_conn
+        self.ttl = ttl
+
+    @staticmethod
+    def key_for(event):
+        if event.action_id:
+            return f"{EVENT_KEY_PREFIX}{event.action_id}"
+        body = json.dumps(event.to_dict(), sort_keys=True).encode('utf-8')
+        return f"{EVENT_KEY_PREFIX}{hashlib.sha1(body).hexdigest()}"
+
+    def save(self, event):
+        key = self.key_for(event)
+        self.redis.set(key, json.dumps(event.to_dict(), separators=(',', ':')), ex=self.ttl)
+        return key
+
+    def load(self, key):
+        raw = self.redis.get(key)
+        if raw is None:
+            return None
+        return TrelloEvent.from_dict(json.loads(raw))
@@ -0,0 +1,175 @@
+# backend/fair_queue.py
+
+import os
+import time
+import logging
+from threading import Lock
+from rq import Queue
+from rq.job import Job
+from rq.utils import now
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TENANT_QUEUE_PREFIX = 'trello-events:'
+TENANTS_KEY = 'trello:fair:tenants'
+WEIGHTS_KEY = 'trello:fair:weights'
+WAIT_STATS_KEY = 'trello:fair:wait'
+
+
+class FairQueues:
+    """Per-tenant sub-queues of trello-events, so one busy board or user can't starve the rest.
+
+    Jobs for tenant T go to the RQ queue 'trello-events:T', and T is added to a
+    Redis set that workers watch. A tenant is the source board or the
+    subscribing user, depending on `tenant_by` ('board', 'user' or 'off'; 'off'
+    keeps everything on the base queue). Optional per-tenant weights live in the
+    trello:fair:weights hash (tenant -> integer, default 1).
+    """
+
+    def __init__(self, base_queue, tenant_by='board'):
+        self.base_queue = base_queue
+        self.redis = base_queue.connection
+        self.tenant_by = tenant_by
+        self.queues = {}
+        self.lock = Lock()
+
+    @property
+    def enabled(self):
+        return self.tenant_by in ('board', 'user')
+
+    def tenant_for(self, board_id=None, user_email=None):
+        if self.tenant_by == 'board':
+            return board_id
+        if self.tenant_by == 'user':
+            return user_email
+        return None
+
+    def queue_for(self, tenant):
+        """The queue to enqueue a tenant's jobs on (the base queue when fairness is off)"""
+        if not self.enabled or not tenant:
+            return self.base_queue
+        queue = self.queues.get(tenant)
+        if queue is None:
+            queue = self.tenant_queue(tenant)
+            try:
+                self.redis.sadd(TENANTS_KEY, tenant)
+            except Exception as e:
+                logger.warning(f"[FairQueue] Could not register tenant {tenant}: {e}")
+                return self.base_queue
+            with self.lock:
+                self.queues[tenant] = queue
+        return queue
+
+    def tenant_queue(self, tenant):
+        return Queue(
+            f"{TENANT_QUEUE_PREFIX}{tenant}",
+            connection=self.redis,
+            serializer=self.base_queue.serializer,
+        )
+
+    def tenants(self):
+        return sorted(t.decode() for t in self.redis.smembers(TENANTS_KEY))
+
+    def weights(self):
+        return {k.decode(): max(1, int(v)) for k, v in self.redis.hgetall(WEIGHTS_KEY).items()}
+
+    def record_wait(self, queue, job):
+        """Count how long a dequeued job waited on its queue"""
+        if not job.enqueued_at:
+            return
+        waited = max(0.0, (now() - job.enqueued_at).total_seconds())
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrbyfloat(WAIT_STATS_KEY, f"{queue.name}:wait_seconds", waited)
+            pipe.hincrby(WAIT_STATS_KEY, f"{queue.name}:jobs", 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[FairQueue] Could not record wait time for {queue.name}: {e}")
+
+    def stats(self):
+        """Depth, oldest waiting job and average wait for the base queue and every tenant queue"""
+        try:
+            queues = [self.base_queue] + [self.tenant_queue(t) for t in self.tenants()]
+            waits = {k.decode(): float(v) for k, v in self.redis.hgetall(WAIT_STATS_KEY).items()}
+            weights = self.weights()
+        except Exception as e:
+            logger.warning(f"[FairQueue] Could not read queue stats: {e}")
+            return {}
+        stats = {}
+        for queue in queues:
+            depth = queue.count
+            oldest = None
+            if depth:
+                job_id = queue.get_job_ids(0, 1)
+                job = Job.fetch(job_id[0], connection=self.redis, serializer=queue.serializer) if job_id else None
+                if job and job.enqueued_at:
+                    oldest = round((now() - job.enqueued_at).total_seconds(), 3)
+            served = int(waits.get(f"{queue.name}:jobs", 0))
+            stats[queue.name] = {
+                'depth': depth,
+                'oldest_wait_seconds': oldest,
+                'jobs_served': served,
+                'avg_wait_seconds': round(waits.get(f"{queue.name}:wait_seconds", 0) / served, 3) if served else None,
+                'weight': weights.get(queue.name[len(TENANT_QUEUE_PREFIX):], 1) if queue is not self.base_queue else 1,
+            }
+        return stats
+
+
+class DeficitRoundRobin:
+    """Worker-side dequeue order over the base queue and every tenant queue.
+
+    RQ pops from the first non-empty queue in the worker's order. After each
+    job, the queue it came from spends one unit of its deficit; once spent, the
+    queue moves to the back of the order and is topped up with its weight. So
+    each tenant with work gets up to `weight` jobs per turn, and a tenant with
+    a deep backlog waits its turn like everyone else. Tenant queues that
+    appear later are picked up every `refresh_interval` seconds.
+    """
+
+    def __init__(self, fair_queues, refresh_interval=5.0):
+        self.fair_queues = fair_queues
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0.0
+        self.weights = {}
+        self.deficits = {}
+
+    def _weight(self, queue):
+        if not queue.name.startswith(TENANT_QUEUE_PREFIX):
+            return 1
+        return self.weights.get(queue.name[len(TENANT_QUEUE_PREFIX):], 1)
+
+    def refresh(self, worker):
+        """Add tenant queues the worker doesn't listen to yet"""
+        if time.monotonic() - self.last_refresh < self.refresh_interval:
+            return
+        self.last_refresh = time.monotonic()
+        try:
+            tenants = self.fair_queues.tenants()
+            self.weights = self.fair_queues.weights()
+        except Exception as e:
+            logger.warning(f"[FairQueue] Could not refresh tenant queues: {e}")
+            return
+        known = set(worker.queue_names())
+        for tenant in tenants:
+            queue = self.fair_queues.tenant_queue(tenant)
+            if queue.name not in known:
+                worker.queues.append(queue)
+                worker._ordered_queues.append(queue)
+                logger.debug(f"[FairQueue] Listening on {queue.name}")
+
+    def on_dequeued(self, worker, queue):
+        deficit = self.deficits.get(queue.name, self._weight(queue)) - 1
+        if deficit > 0:
+            self.deficits[queue.name] = deficit
+            return
+        # Turn over: to the back of the line with a fresh allowance
+        self.deficits[queue.name] = self._weight(queue)
+        order = [q for q in worker._ordered_queues if q.name != queue.name]
+        order.append(queue)
+        worker._ordered_queues = order
+
+
+def build_fair_queues(base_queue):
+    """FairQueues configured from FAIR_QUEUE_TENANT (board|user|off)"""
+    return FairQueues(base_queue, tenant_by=os.environ.get('FAIR_QUEUE_TENANT', 'off').lower())
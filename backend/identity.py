@@ -0,0 +1,155 @@
+# backend/identity.py
+
+import time
+import logging
+import threading
+from collections import namedtuple
+from flask import current_app, has_app_context
+from db import db, User
+from job_context import invalidate_job_contexts
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+IDENTITY_KEY_PREFIX = 'trello:identity:'
+REFRESH_LOCK_PREFIX = 'trello:identity-refresh:'
+
+TrelloIdentity = namedtuple('TrelloIdentity', ['member_id', 'username'])
+
+
+class IdentityCache:
+    """Redis-backed cache of each user's Trello member id and username.
+
+    Lookups go Redis -> User row -> Trello /members/me. Entries live for `ttl`
+    seconds; once an entry is within `refresh_ahead` seconds of expiring, one
+    caller refreshes it in the background while everyone keeps getting the cached
+    value. An entry seeded from the User row is refreshed the same way, since the
+    row may predate a rename. A refresh that finds a different identity stores it
+    on the User row like a foreground fetch. A 401 from Trello drops the entry and
+    the values stored on the User row.
+
+    `fetch(api_key, token)` performs the /members/me call and returns a response
+    (or None), so callers can route it through their rate limiter. With a
+    `directory` (mentions.UsernameDirectory), every identity cached is also
+    recorded there, so ingress hears about a renamed Trello account.
+    """
+
+    def __init__(self, redis_conn, fetch, ttl=3600, refresh_ahead=300, directory=None):
+        self.redis = redis_conn
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.directory = directory
+
+    def _key(self, email):
+        return f"{IDENTITY_KEY_PREFIX}{email}"
+
+    def _read(self, email):
+        try:
+            raw = self.redis.hgetall(self._key(email))
+        except Exception as e:
+            logger.warning(f"[Identity] Could not read cache for {email}: {e}")
+            return None, None
+        if not raw or b'username' not in raw:
+            return None, None
+        identity = TrelloIdentity(raw.get(b'id', b'').decode() or None, raw[b'username'].decode())
+        return identity, float(raw.get(b'fetched_at', 0))
+
+    def put(self, email, identity):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hset(self._key(email), mapping={
+                'id': identity.member_id or '',
+                'username': identity.username,
+                'fetched_at': time.time(),
+            })
+            pipe.expire(self._key(email), self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[Identity] Could not cache identity for {email}: {e}")
+        if self.directory is not None:
+            self.directory.set(email, identity.username)
+
+    def invalidate(self, email):
+        try:
+            self.redis.delete(self._key(email))
+        except Exception as e:
+            logger.warning(f"[Identity] Could not invalidate identity for {email}: {e}")
+
+    def fetch_identity(self, email, api_key, token):
+        """Ask Trello who the token belongs to. Returns (identity, unauthorized)."""
+        resp = self.fetch(api_key, token)
+        if resp is None:
+            return None, False
+        if resp.status_code == 401:
+            logger.warning(f"[Identity] Trello rejected credentials for {email}")
+            self.invalidate(email)
+            return None, True
+        if resp.status_code != 200:
+            logger.error(f"Failed to fetch Trello username: {resp.text}")
+            return None, False
+        member = resp.json()
+        identity = TrelloIdentity(member.get('id'), member.get('username'))
+        if not identity.username:
+            return None, False
+        self.put(email, identity)
+        return identity, False
+
+    def _refresh(self, app, email, api_key, token, previous):
+        identity, unauthorized = self.fetch_identity(email, api_key, token)
+        if identity == previous or not (identity or unauthorized):
+            return
+        if app is None:
+            logger.warning(f"[Identity] No app context to store the refreshed identity for {email}")
+            return
+        with app.app_context():
+            try:
+                user = User.query.get(email)
+                if user is not None:
+                    self.store_on_user(user, identity)
+            except Exception as e:
+                logger.error(f"[Identity] Could not store the refreshed identity for {email}: {e}")
+                return
+        # Workers hold the old values in their job contexts
+        invalidate_job_contexts(self.redis, email)
+        logger.info(f"[Identity] Trello identity of {email} changed to {identity.username if identity else None}")
+
+    def _refresh_in_background(self, email, api_key, token, previous):
+        try:
+            claimed = self.redis.set(f"{REFRESH_LOCK_PREFIX}{email}", 1, nx=True, ex=30)
+        except Exception:
+            return
+        if claimed:
+            app = current_app._get_current_object() if has_app_context() else None
+            threading.Thread(
+                target=self._refresh, args=(app, email, api_key, token, previous), daemon=True
+            ).start()
+
+    def get(self, user):
+        """Return the TrelloIdentity for a User, or None if Trello won't tell us"""
+        identity, fetched_at = self._read(user.email)
+        if identity:
+            if time.time() - fetched_at > self.ttl - self.refresh_ahead:
+                self._refresh_in_background(user.email, user.apiKey, user.token, identity)
+            return identity
+        if user.trello_username:
+            # Stored when Trello was linked; seed the cache without waiting on Trello
+            identity = TrelloIdentity(user.trello_member_id, user.trello_username)
+            self.put(user.email, identity)
+            self._refresh_in_background(user.email, user.apiKey, user.token, identity)
+            return identity
+        identity, unauthorized = self.fetch_identity(user.email, user.apiKey, user.token)
+        if identity or unauthorized:
+            self.store_on_user(user, identity)
+        return identity
+
+    @staticmethod
+    def store_on_user(user, identity):
+        """Persist (or clear) the identity on the User row (`user` may be a cached job context)"""
+        if not isinstance(user, User):
+            user = User.query.get(user.email)
+            if user is None:
+                return
+        user.trello_member_id = identity.member_id if identity else None
+        user.trello_username = identity.username if identity else None
+        db.session.commit()
@@ -0,0 +1,74 @@
+# backend/inbox.py
+
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_KEY = 'trello:webhook-inbox'
+DEFAULT_GROUP = 'trello-router'
+
+
+class WebhookInbox:
+    """Durable webhook inbox backed by a Redis Stream.
+
+    Ingress appends raw request bodies; router processes read them through a
+    consumer group, acknowledge what they have routed and reclaim entries left
+    pending by routers that died mid-batch.
+    """
+
+    def __init__(self, redis_conn, stream_key=DEFAULT_STREAM_KEY, group=DEFAULT_GROUP, maxlen=100000):
+        self.redis = redis_conn
+        self.stream_key = stream_key
+        self.group = group
+        self.maxlen = maxlen
+
+    def append(self, raw_body):
+        """Append a raw webhook body, trimming the stream to roughly maxlen entries"""
+        return self.redis.xadd(
+            self.stream_key,
+            {'body': raw_body},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+    def ensure_group(self):
+        """Create the consumer group (and the stream) if they don't exist yet"""
+        try:
+            self.redis.xgroup_create(self.stream_key, self.group, id='0', mkstream=True)
+            logger.info(f"[Inbox] Created consumer group {self.group} on {self.stream_key}")
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read(self, consumer, count=50, block_ms=5000):
+        """Read new entries for this consumer. Returns a list of (entry_id, fields)."""
+        response = self.redis.xreadgroup(
+            self.group, consumer, {self.stream_key: '>'}, count=count, block=block_ms
+        )
+        if not response:
+            return []
+        return response[0][1]
+
+    def ack(self, *entry_ids):
+        if entry_ids:
+            self.redis.xack(self.stream_key, self.group, *entry_ids)
+
+    def reclaim(self, consumer, min_idle_ms=60000, count=50, max_deliveries=5):
+        """Take over entries other consumers left pending for longer than min_idle_ms.
+
+        Entries that have already been delivered max_deliveries times are acknowledged
+        and dropped so a poison message can't cycle forever.
+        """
+        pending = self.redis.xpending_range(
+            self.stream_key, self.group, min='-', max='+', count=count, idle=min_idle_ms
+        )
+        poisoned = [p['message_id'] for p in pending if p['times_delivered'] >= max_deliveries]
+        if poisoned:
+            logger.error(f"[Inbox] Dropping {len(poisoned)} entries after {max_deliveries} deliveries: {poisoned}")
+            self.ack(*poisoned)
+        # Redis 7 replies [next_id, entries, deleted_ids], Redis 6.2 only [next_id, entries]
+        reply = self.redis.xautoclaim(
+            self.stream_key, self.group, consumer, min_idle_time=min_idle_ms, start_id='0-0', count=count
+        )
+        return reply[1]
@@ -0,0 +1,159 @@
+# backend/job_context.py
+
+import time
+import logging
+from collections import namedtuple
+from threading import Lock
+from db import db, User, WebhookSetting, UserBoard
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JOB_CONTEXT_VERSION_KEY = 'trello:job-context:version'
+# routing.ROUTING_VERSION_KEY, bumped on every webhook settings change. Not
+# imported: routing imports tasks, which imports this module.
+SETTINGS_VERSION_KEY = 'trello:routing:version'
+
+# Everything a copy job needs to know about the subscribing user. The field
+# names match User so the identity cache can read it like a User row.
+JobContext = namedtuple('JobContext', [
+    'email', 'apiKey', 'token', 'trello_member_id', 'trello_username',
+    'board_id', 'enquiry_in_list_id',
+])
+
+SETTING_COLUMNS = (
+    WebhookSetting.id, WebhookSetting.user_email, WebhookSetting.board_id, WebhookSetting.board_name,
+    WebhookSetting.event_type, WebhookSetting.label, WebhookSetting.label_id, WebhookSetting.label_name,
+    WebhookSetting.list_name, WebhookSetting.webhook_id,
+)
+CONTEXT_COLUMNS = (
+    User.email, User.apiKey, User.token, User.trello_member_id, User.trello_username,
+    UserBoard.board_id, UserBoard.lists,
+)
+
+
+def _context_from_row(row):
+    if row is None or row.email is None:
+        return None
+    lists = row.lists or {}
+    return JobContext(
+        row.email, row.apiKey, row.token, row.trello_member_id, row.trello_username,
+        row.board_id, lists.get('Enquiry In'),
+    )
+
+
+def _setting_from_row(row):
+    return {column.key: getattr(row, column.key) for column in SETTING_COLUMNS}
+
+
+class JobContextLoader:
+    """Per-worker cache of webhook settings and job contexts, one joined query per miss.
+
+    A miss loads the setting, its user's credentials and identity, and the
+    user's board with its 'Enquiry In' list in a single query. Hits cost no SQL.
+    The cache is dropped whenever the routing version (bumped on every settings
+    change) or the job-context version (bumped by invalidate() when a user or
+    board changes) moves in Redis.
+    """
+
+    def __init__(self, redis_conn=None, check_interval=1.0):
+        self.redis = redis_conn
+        self.check_interval = check_interval
+        self.by_setting = {}
+        self.by_email = {}
+        self.version = None
+        self.last_check = 0.0
+        self.lock = Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+        if self.redis is None:
+            version = None
+        else:
+            try:
+                version = tuple(self.redis.mget(SETTINGS_VERSION_KEY, JOB_CONTEXT_VERSION_KEY))
+            except Exception as e:
+                logger.warning(f"[JobContext] Could not read cache version, dropping cache: {e}")
+                version = None
+        if version is None or version != self.version:
+            with self.lock:
+                self.by_setting = {}
+                self.by_email = {}
+                self.version = version
+
+    def _base_query(self, *columns):
+        return (
+            db.session.query(*columns)
+            .outerjoin(UserBoard, UserBoard.user_email == User.email)
+        )
+
+    def load_setting(self, setting_id):
+        """(setting dict, JobContext or None) for a webhook setting id, or (None, None)"""
+        self._refresh()
+        cached = self.by_setting.get(setting_id)
+        if cached is not None:
+            return cached
+        row = (
+            db.session.query(*SETTING_COLUMNS, *CONTEXT_COLUMNS)
+            .select_from(WebhookSetting)
+            .outerjoin(User, User.email == WebhookSetting.user_email)
+            .outerjoin(UserBoard, UserBoard.user_email == User.email)
+            .filter(WebhookSetting.id == setting_id)
+            .first()
+        )
+        if row is None:
+            return None, None
+        entry = (_setting_from_row(row), _context_from_row(row))
+        with self.lock:
+            self.by_setting[setting_id] = entry
+        return entry
+
+    def load_user(self, email):
+        """JobContext for a user email, or None if there is no such user"""
+        self._refresh()
+        if email in self.by_email:
+            return self.by_email[email]
+        row = self._base_query(*CONTEXT_COLUMNS).filter(User.email == email).first()
+        context = _context_from_row(row)
+        with self.lock:
+            self.by_email[email] = context
+        return context
+
+    def update_identity(self, email, identity):
+        """Patch this worker's cached contexts after the worker itself stored a user's identity"""
+        fields = {
+            'trello_member_id': identity.member_id if identity else None,
+            'trello_username': identity.username if identity else None,
+        }
+        with self.lock:
+            for setting_id, (setting, context) in list(self.by_setting.items()):
+                if context is not None and context.email == email:
+                    self.by_setting[setting_id] = (setting, context._replace(**fields))
+            if self.by_email.get(email) is not None:
+                self.by_email[email] = self.by_email[email]._replace(**fields)
+
+    def invalidate(self, email=None):
+        """Drop cached contexts here and in every other worker (call after user/board changes)"""
+        with self.lock:
+            self.by_setting = {}
+            self.by_email = {}
+            self.version = None
+        if self.redis is None:
+            return
+        try:
+            self.redis.incr(JOB_CONTEXT_VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"[JobContext] Could not bump cache version for {email}: {e}")
+
+
+def invalidate_job_contexts(redis_conn, email=None):
+    """Bump the job-context version from processes that don't hold a loader (e.g. the web app)"""
+    if redis_conn is None:
+        return
+    try:
+        redis_conn.incr(JOB_CONTEXT_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"[JobContext] Could not bump cache version for {email}: {e}")
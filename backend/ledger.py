@@ -0,0 +1,82 @@
+# backend/ledger.py
+
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from db import db, CardCopy
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CLAIMED = 'claimed'
+COPIED = 'copied'
+BUSY = 'busy'
+
+
+class CardCopyLedger:
+    """Durable record of which source card was copied to which user's board.
+
+    Before copying, a job claims (user, source card) by inserting its row; the
+    unique index on the pair makes that atomic, so of several workers racing on
+    retries, duplicate deliveries or overlapping event types only one copies.
+    The others see the row and either find the finished copy or back off. A job
+    resumed after throttling presents the same token and keeps its claim; a claim
+    older than `stale_after` seconds without a copy (its worker died) can be
+    taken over.
+    """
+
+    def __init__(self, stale_after=600):
+        self.stale_after = stale_after
+
+    def claim(self, user_email, source_card_id, token):
+        """(CLAIMED, None) if this job should copy, (COPIED, new_card_id) or (BUSY, None) otherwise"""
+        now = datetime.utcnow()
+        db.session.add(CardCopy(
+            user_email=user_email, source_card_id=source_card_id, claim_token=token, claimed_at=now
+        ))
+        try:
+            db.session.commit()
+            return CLAIMED, None
+        except IntegrityError:
+            db.session.rollback()
+        row = CardCopy.query.filter_by(user_email=user_email, source_card_id=source_card_id).first()
+        if row is None:
+            # Released between our insert and read; the next event will claim it
+            return BUSY, None
+        if row.new_card_id:
+            return COPIED, row.new_card_id
+        if row.claim_token == token:
+            return CLAIMED, None
+        if row.claimed_at < now - timedelta(seconds=self.stale_after):
+            # Take over only if nobody else did in the meantime
+            taken = CardCopy.query.filter_by(id=row.id, claim_token=row.claim_token, new_card_id=None).update(
+                {'claim_token': token, 'claimed_at': now}, synchronize_session=False
+            )
+            db.session.commit()
+            if taken:
+                logger.info(f"[Ledger] Took over stale claim on {user_email}/{source_card_id}")
+                return CLAIMED, None
+        return BUSY, None
+
+    def complete(self, user_email, source_card_id, token, new_card_id):
+        """Record the copy made under this job's claim"""
+        CardCopy.query.filter_by(user_email=user_email, source_card_id=source_card_id, claim_token=token).update(
+            {'new_card_id': new_card_id, 'copied_at': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+
+    def release(self, user_email, source_card_id, token):
+        """Give up this job's claim after a failed copy so a later event can try again"""
+        CardCopy.query.filter_by(
+            user_email=user_email, source_card_id=source_card_id, claim_token=token, new_card_id=None
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    def lookup(self, user_email, source_card_id):
+        """Id of the copy of a source card on a user's board, or None"""
+        row = (
+            db.session.query(CardCopy.new_card_id)
+            .filter_by(user_email=user_email, source_card_id=source_card_id)
+            .first()
+        )
+        return row.new_card_id if row else None
@@ -0,0 +1,205 @@
+# backend/mentions.py
+
+import time
+import logging
+from collections import deque
+from threading import Lock
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+USERNAMES_KEY = 'trello:usernames'
+USERNAMES_LEARNED_KEY = 'trello:usernames:learned'
+USERNAMES_VERSION_KEY = 'trello:usernames:version'
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text finds every pattern"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def _add(self, pattern):
+        node = 0
+        for char in pattern:
+            nxt = self.goto[node].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+            node = nxt
+        self.output[node].add(pattern)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.output[nxt] |= self.output[self.fail[nxt]]
+
+    def find(self, text):
+        """Return the set of patterns that occur anywhere in text"""
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            if self.output[node]:
+                found |= self.output[node]
+        return found
+
+
+class UsernameDirectory:
+    """Cached email -> Trello username map shared through a Redis hash.
+
+    Every process keeps a local copy and reloads it when the shared version
+    counter moves, which happens whenever a user's username is learned or their
+    Trello link changes. With `max_age`, a username not confirmed for that many
+    seconds counts as unknown, so a rename we never heard about can only hide
+    mentions for that long.
+    """
+
+    def __init__(self, redis_conn, check_interval=1.0, max_age=None):
+        self.redis = redis_conn
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.usernames = {}
+        self.learned_at = {}
+        self.version = None
+        self.last_check = 0.0
+        self.lock = Lock()
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+        try:
+            version = int(self.redis.get(USERNAMES_VERSION_KEY) or 0)
+            if version == self.version:
+                return
+            pipe = self.redis.pipeline()
+            pipe.hgetall(USERNAMES_KEY)
+            pipe.hgetall(USERNAMES_LEARNED_KEY)
+            raw, learned = pipe.execute()
+        except Exception as e:
+            logger.warning(f"[Mentions] Could not refresh username directory: {e}")
+            return
+        with self.lock:
+            self.usernames = {k.decode(): v.decode() for k, v in raw.items()}
+            self.learned_at = {k.decode(): float(v) for k, v in learned.items()}
+            self.version = version
+
+    def fresh_until(self, email):
+        """When the user's username stops being trusted (never without max_age)"""
+        if self.max_age is None:
+            return float('inf')
+        return self.learned_at.get(email, 0.0) + self.max_age
+
+    def lookup(self, email):
+        """The user's username if known and fresh, from the local copy only"""
+        username = self.usernames.get(email)
+        if username and time.time() < self.fresh_until(email):
+            return username
+        return None
+
+    def get(self, email):
+        self.refresh()
+        return self.lookup(email)
+
+    def set(self, email, username):
+        """Record a username learned from Trello. Cheap when nothing changed and the entry is fresh."""
+        self.refresh()
+        if self.usernames.get(email) == username:
+            if self.max_age is None or time.time() < self.learned_at.get(email, 0.0) + self.max_age / 2:
+                return
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hset(USERNAMES_KEY, email, username)
+            pipe.hset(USERNAMES_LEARNED_KEY, email, time.time())
+            pipe.incr(USERNAMES_VERSION_KEY)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[Mentions] Could not store username for {email}: {e}")
+            return
+        self.version = None
+
+    def forget(self, email):
+        """Drop a user's username, e.g. when they link a different Trello account"""
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hdel(USERNAMES_KEY, email)
+            pipe.hdel(USERNAMES_LEARNED_KEY, email)
+            pipe.incr(USERNAMES_VERSION_KEY)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[Mentions] Could not forget username for {email}: {e}")
+            return
+        self.version = None
+
+
+class MentionFilter:
+    """Drops subscribers an event can't concern before any job is enqueued.
+
+    commentCard events are scanned once with a per-board Aho-Corasick automaton
+    over the subscribers' '@username' patterns; addMemberToCard events are matched
+    on the added member's username. Subscribers whose username isn't known yet, or
+    hasn't been confirmed within the directory's max_age, are always kept so the
+    worker can decide (and learn the username).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        # board_id -> (subscribers, directory version, usernames, automaton, valid until)
+        self.automata = {}
+        self.lock = Lock()
+
+    def _automaton(self, board_id, subscribers):
+        self.directory.refresh()
+        version = self.directory.version
+        cached = self.automata.get(board_id)
+        if cached and cached[0] is subscribers and cached[1] == version and time.time() < cached[4]:
+            return cached[2], cached[3]
+        usernames = {s.user_email: self.directory.lookup(s.user_email) for s in subscribers}
+        valid_until = min(
+            (self.directory.fresh_until(email) for email, name in usernames.items() if name),
+            default=float('inf'),
+        )
+        if cached and cached[2] == usernames:
+            # Only the version moved; this board's subscribers are unaffected
+            automaton = cached[3]
+        else:
+            automaton = AhoCorasick({f"@{name}" for name in usernames.values() if name})
+        with self.lock:
+            self.automata[board_id] = (subscribers, version, usernames, automaton, valid_until)
+        return usernames, automaton
+
+    def filter(self, board_id, subscribers, event):
+        if event.action_type == 'commentCard':
+            usernames, automaton = self._automaton(board_id, subscribers)
+            mentioned = automaton.find(event.comment_text or '')
+            return tuple(
+                s for s in subscribers
+                if not usernames.get(s.user_email) or f"@{usernames[s.user_email]}" in mentioned
+            )
+        if event.action_type == 'addMemberToCard':
+            kept = []
+            for s in subscribers:
+                username = self.directory.get(s.user_email)
+                if not username or username == event.member_username:
+                    kept.append(s)
+            return tuple(kept)
+        return subscribers
@@ -14,8 +14,8 @@ Usage:
 
 import sqlite3
 import os
-import requests
 import logging
+from trello_client import TrelloAuth, get_trello_client
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,11 +24,10 @@ logger = logging.getLogger(__name__)
 def get_trello_labels(api_key, token, board_id):
     """Fetch labels from Trello for a given board"""
     try:
-        labels_url = f"https://api.trello.com/1/boards/{board_id}/labels?key={api_key}&token={token}"
-        resp = requests.get(labels_url, timeout=10)
+        resp = get_trello_client().get_board_labels(TrelloAuth(api_key, token), board_id)
         
-        if resp.status_code != 200:
-            logger.warning(f"Failed to fetch labels for board {board_id}: {resp.status_code}")
+        if resp is None or resp.status_code != 200:
+            logger.warning(f"Failed to fetch labels for board {board_id}: {resp.status_code if resp is not None else 'no response'}")
             return []
         
         return resp.json()
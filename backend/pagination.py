@@ -0,0 +1,93 @@
+# backend/pagination.py
+
+import os
+import json
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Largest page a client may ask for
+MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '1000'))
+
+# Rows loaded from the database per round trip while streaming
+STREAM_BATCH_SIZE = int(os.environ.get('API_STREAM_BATCH_SIZE', '500'))
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+class PageParamsError(ValueError):
+    """A malformed `after`, `limit` or `stream` query parameter"""
+
+
+def page_params(args, key_column):
+    """(after, limit, stream) from the request's query string; all None when not given.
+
+    `after` is converted to the key column's type, so it compares the same way
+    in the database as the cursor that was handed out.
+    """
+    after = args.get('after')
+    limit = args.get('limit')
+    stream = args.get('stream')
+    if after is not None and key_column.type.python_type is int:
+        try:
+            after = int(after)
+        except ValueError:
+            raise PageParamsError('after must be an integer id') from None
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise PageParamsError('limit must be an integer') from None
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise PageParamsError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise PageParamsError(f"stream must be one of {', '.join(STREAM_FORMATS)}")
+    return after, limit, stream
+
+
+def _after(query, key_column, after):
+    query = query.order_by(key_column)
+    if after is not None:
+        query = query.filter(key_column > after)
+    return query
+
+
+def keyset_page(query, key_column, serialize, after=None, limit=MAX_PAGE_SIZE):
+    """One page of rows after the cursor, in key order: {'items': [...], 'next_after': key or None}.
+
+    The query asks for one row more than `limit` to know whether another page
+    follows, so the last page never comes back empty.
+    """
+    rows = _after(query, key_column, after).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'items': [serialize(row) for row in rows],
+        'next_after': getattr(rows[-1], key_column.key) if more else None,
+    }
+
+
+def stream_rows(query, key_column, serialize, after=None, limit=None, fmt='ndjson'):
+    """Yield the rows after the cursor as NDJSON lines or one JSON array, a batch of rows at a time.
+
+    Rows are loaded `STREAM_BATCH_SIZE` at a time with yield_per, so memory
+    stays flat however large the table is.
+    """
+    query = _after(query, key_column, after)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.yield_per(STREAM_BATCH_SIZE)
+    if fmt == 'ndjson':
+        for row in rows:
+            yield json.dumps(serialize(row), default=str) + '\n'
+        return
+    yield '['
+    first = True
+    for row in rows:
+        yield ('' if first else ',') + json.dumps(serialize(row), default=str)
+        first = False
+    yield ']\n'
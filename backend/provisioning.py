@@ -0,0 +1,131 @@
+# backend/provisioning.py
+
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROVISION_KEY_PREFIX = 'trello:provision:'
+
+# Lists every integration board gets, left to right
+BOARD_LISTS = ['Enquiry In', 'Todo', 'Doing', 'Done']
+
+# Users provisioned at once by a bulk request, and list creations in flight across them
+_user_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PROVISION_CONCURRENCY', '8')),
+    thread_name_prefix='provision-user'
+)
+_list_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PROVISION_CONCURRENCY', '8')) * len(BOARD_LISTS),
+    thread_name_prefix='provision-list'
+)
+
+
+class ProvisioningError(Exception):
+    """A Trello call needed to provision a board failed"""
+
+    def __init__(self, message, resp=None):
+        super().__init__(message)
+        self.resp = resp
+
+
+class BoardProvisioner:
+    """Creates users' integration boards with their Enquiry In/Todo/Doing/Done lists.
+
+    The board comes first, then its four lists concurrently (each with an
+    explicit position, so they keep their order). Every call goes through the
+    given Trello client and its shared rate limiter. What was created so far
+    is kept in Redis per user for `ttl` seconds, so a run that failed halfway
+    resumes where it stopped instead of creating a second board; `forget()`
+    drops it once the board is stored.
+    """
+
+    def __init__(self, redis_conn=None, ttl=86400):
+        self.redis = redis_conn
+        self.ttl = ttl
+
+    def _key(self, email):
+        return f"{PROVISION_KEY_PREFIX}{email}"
+
+    def _load(self, email):
+        if self.redis is None:
+            return {}
+        try:
+            raw = self.redis.get(self._key(email))
+        except Exception as e:
+            logger.warning(f"[Provision] Could not read progress for {email}: {e}")
+            return {}
+        return json.loads(raw) if raw else {}
+
+    def _save(self, email, progress):
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(self._key(email), json.dumps(progress, separators=(',', ':')), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"[Provision] Could not save progress for {email}: {e}")
+
+    def forget(self, *emails):
+        if self.redis is None or not emails:
+            return
+        try:
+            self.redis.delete(*[self._key(email) for email in emails])
+        except Exception as e:
+            logger.warning(f"[Provision] Could not clear progress: {e}")
+
+    def provision(self, client, auth, email, board_name):
+        """Create (or finish creating) one user's board. Returns {'board_id', 'board_name', 'lists'}."""
+        progress = self._load(email)
+        progress.setdefault('lists', {})
+        if not progress.get('board_id'):
+            resp = client.create_board(auth, board_name)
+            if resp is None or resp.status_code != 200:
+                raise ProvisioningError('Failed to create board', resp)
+            progress['board_id'] = resp.json()['id']
+            progress['board_name'] = board_name
+            self._save(email, progress)
+        board_id = progress['board_id']
+        missing = [(pos, name) for pos, name in enumerate(BOARD_LISTS, 1) if name not in progress['lists']]
+        futures = {
+            name: _list_executor.submit(client.create_list, auth, board_id, name, pos)
+            for pos, name in missing
+        }
+        failed = None
+        for name, future in futures.items():
+            try:
+                resp = future.result()
+            except Exception as e:
+                logger.error(f"[Provision] Creating list {name} for {email} raised: {e}")
+                resp = None
+            if resp is None or resp.status_code != 200:
+                failed = failed or (name, resp)
+                continue
+            progress['lists'][name] = resp.json()['id']
+        if futures:
+            self._save(email, progress)
+        if failed:
+            raise ProvisioningError(f'Failed to create list {failed[0]}', failed[1])
+        return progress
+
+    def provision_many(self, client, requests):
+        """Provision several users at once. `requests` is [(email, auth, board_name)];
+        returns {email: (result, error)} with exactly one of the two set."""
+        def run(request):
+            email, auth, board_name = request
+            try:
+                return email, (self.provision(client, auth, email, board_name), None)
+            except ProvisioningError as e:
+                logger.error(f"[Provision] {e} for {email}")
+                return email, (None, e)
+            except Exception as e:
+                logger.exception(f"[Provision] Unexpected error for {email}")
+                return email, (None, ProvisioningError(str(e)))
+
+        return dict(_user_executor.map(run, requests))
+
+
+def default_board_name(email):
+    return email.split('@')[0] if email and '@' in email else 'Integration Board'
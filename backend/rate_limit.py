@@ -0,0 +1,264 @@
+# backend/rate_limit.py
+
+import time
+import hashlib
+import logging
+from collections import deque
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY_PREFIX = 'trello:ratelimit:'
+
+# Refill and check every bucket in KEYS atomically. Either all of them pay `cost`
+# and 0 is returned, or none of them do and the longest wait (ms) is returned.
+# ARGV: cost, then capacity and refill rate (tokens per ms) for each key. Limits
+# learned from Trello's response headers (see OBSERVE_SCRIPT) take precedence.
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local levels = {}
+local capacities = {}
+local rates = {}
+local wait = 0
+for i = 1, #KEYS do
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts', 'cap', 'rate')
+    local capacity = tonumber(bucket[3]) or tonumber(ARGV[2 * i])
+    local rate = tonumber(bucket[4]) or tonumber(ARGV[2 * i + 1])
+    capacities[i] = capacity
+    rates[i] = rate
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        local needed = math.ceil((cost - tokens) / rate)
+        if needed > wait then
+            wait = needed
+        end
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i = 1, #KEYS do
+    redis.call('HSET', KEYS[i], 'tokens', tostring(levels[i] - cost), 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacities[i] / rates[i]) + 1000)
+end
+return 0
+"""
+
+# Overwrite buckets with what Trello reported. ARGV holds four values per key:
+# limit, window (ms), requests remaining, and how long (ms) to hold the bucket
+# empty (Retry-After). A held bucket goes negative so the next call fits exactly
+# when the hold ends.
+OBSERVE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[4 * i - 3])
+    local interval = tonumber(ARGV[4 * i - 2])
+    local remaining = tonumber(ARGV[4 * i - 1])
+    local hold = tonumber(ARGV[4 * i])
+    local rate = capacity / interval
+    local tokens = remaining
+    if hold > 0 then
+        -- Refills to exactly one call's worth when the hold ends
+        tokens = 1 - hold * rate
+    end
+    redis.call('HSET', KEYS[i], 'cap', capacity, 'rate', tostring(rate),
+               'tokens', tostring(tokens), 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], interval + hold + 1000)
+end
+return #KEYS
+"""
+
+# Trello reports its budgets per scope in headers such as
+# x-rate-limit-api-token-remaining; bucket kind -> header scope
+HEADER_SCOPES = {'key': 'api-key', 'token': 'api-token'}
+
+
+class TrelloThrottled(Exception):
+    """Raised instead of sleeping when a call made under TrelloClient.deferring() is throttled.
+
+    `retry_after` is how long (seconds) to wait before trying again, None when
+    Trello answered 429 without a Retry-After; `status` is 429 when Trello itself
+    refused the call and None when our own limiter did.
+    """
+
+    def __init__(self, retry_after, status=None):
+        super().__init__(f"Trello throttled, retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.status = status
+
+
+def parse_retry_after(headers, now=None):
+    """Seconds from a Retry-After header (delay seconds or an HTTP date), or None if absent or malformed"""
+    value = headers.get('Retry-After') if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None or retry_at.tzinfo is None:
+        return None
+    return max(0.0, retry_at.timestamp() - (time.time() if now is None else now))
+
+
+def parse_rate_limit(headers, scope):
+    """(limit, window ms, remaining) from Trello's x-rate-limit-<scope>-* headers, or None"""
+    try:
+        limit = int(headers.get(f'x-rate-limit-{scope}-max'))
+        interval = int(headers.get(f'x-rate-limit-{scope}-interval-ms'))
+        remaining = int(headers.get(f'x-rate-limit-{scope}-remaining'))
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if limit <= 0 or interval <= 0:
+        return None
+    return limit, interval, remaining
+
+
+def _fingerprint(secret):
+    # Bucket keys never contain the raw credential
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:32]
+
+
+# Rate limiter
+class TrelloRateLimiter:
+    """In-process sliding window limiter, used when Redis is unreachable"""
+
+    def __init__(self, max_requests=100, per_seconds=10):
+        self.max_requests = max_requests
+        self.per_seconds = per_seconds
+        self.request_times = deque()
+        self.lock = Lock()
+
+    def acquire(self, auth=None, cost=1):
+        with self.lock:
+            now = time.time()
+            while self.request_times and self.request_times[0] < now - self.per_seconds:
+                self.request_times.popleft()
+            if len(self.request_times) >= self.max_requests:
+                return self.per_seconds - (now - self.request_times[0])
+            self.request_times.append(now)
+            return 0.0
+
+    def observe(self, auth, headers, retry_after=None):
+        """Response headers are only tracked by the Redis limiter"""
+
+    def wait(self, auth=None):
+        while True:
+            sleep_time = self.acquire(auth)
+            if sleep_time <= 0:
+                return
+            logger.info(f"[RateLimiter] Sleeping {sleep_time:.2f}s to avoid 429")
+            time.sleep(sleep_time)
+
+
+class RedisTokenBucketLimiter:
+    """Cluster-wide Trello limiter: one token bucket per API key and one per token.
+
+    Trello enforces both budgets separately (by default 300 requests per 10s per
+    key and 100 per 10s per token), so a call only goes out when both buckets
+    have room. Every web and worker process shares the buckets through Redis.
+
+    The configured limits are only a starting point: observe() feeds each
+    response's x-rate-limit-* headers back in, so buckets track the budget
+    Trello actually reports, and a 429's Retry-After empties the bucket for
+    exactly that long.
+    """
+
+    def __init__(self, redis_conn, key_limit=300, token_limit=100, per_seconds=10, fallback=None):
+        self.redis = redis_conn
+        self.key_limit = key_limit
+        self.token_limit = token_limit
+        self.per_seconds = per_seconds
+        self.fallback = fallback or TrelloRateLimiter(token_limit, per_seconds)
+        self.script = redis_conn.register_script(TOKEN_BUCKET_SCRIPT)
+        self.observe_script = redis_conn.register_script(OBSERVE_SCRIPT)
+        # While Redis is down, don't pay a connection attempt on every call
+        self.redis_retry_at = 0.0
+
+    def _buckets(self, auth):
+        buckets = []
+        if auth.api_key:
+            buckets.append((f"{BUCKET_KEY_PREFIX}key:{_fingerprint(auth.api_key)}", self.key_limit, 'key'))
+        if auth.token:
+            buckets.append((f"{BUCKET_KEY_PREFIX}token:{_fingerprint(auth.token)}", self.token_limit, 'token'))
+        return buckets
+
+    def acquire(self, auth, cost=1):
+        """Take `cost` from every bucket for these credentials.
+
+        Returns 0 when the call may go ahead, otherwise the number of seconds the
+        caller would have to wait (nothing is consumed in that case).
+        """
+        if auth is None:
+            return 0.0
+        buckets = self._buckets(auth)
+        if not buckets:
+            return 0.0
+        if time.monotonic() < self.redis_retry_at:
+            return self.fallback.acquire(auth, cost)
+        args = [cost]
+        for _, capacity, _ in buckets:
+            args += [capacity, capacity / (self.per_seconds * 1000.0)]
+        try:
+            wait_ms = self.script(keys=[key for key, _, _ in buckets], args=args)
+        except Exception as e:
+            logger.warning(f"[RateLimiter] Redis limiter unavailable, using local limiter: {e}")
+            self.redis_retry_at = time.monotonic() + 5
+            return self.fallback.acquire(auth, cost)
+        return int(wait_ms) / 1000.0
+
+    def observe(self, auth, headers, retry_after=None):
+        """Sync the buckets for these credentials with a Trello response's headers.
+
+        `retry_after` (seconds) comes from a 429: the exhausted bucket, or the
+        token bucket when the headers don't say which, is held empty that long.
+        """
+        if auth is None or headers is None or time.monotonic() < self.redis_retry_at:
+            return
+        hold_ms = int(retry_after * 1000) if retry_after else 0
+        keys, updates = [], []
+        for key, capacity, kind in self._buckets(auth):
+            reported = parse_rate_limit(headers, HEADER_SCOPES[kind])
+            if reported:
+                limit, interval, remaining = reported
+                held = hold_ms if remaining <= 0 else 0
+            elif hold_ms and kind == 'token':
+                limit, interval, remaining = capacity, self.per_seconds * 1000, 0
+                held = hold_ms
+            else:
+                continue
+            keys.append(key)
+            updates.append([limit, interval, max(0, remaining), held])
+        if not keys:
+            return
+        if hold_ms and not any(update[3] for update in updates):
+            # Trello refused the call but no reported budget is exhausted: hold them all
+            for update in updates:
+                update[2:] = [0, hold_ms]
+        args = [value for update in updates for value in update]
+        try:
+            self.observe_script(keys=keys, args=args)
+        except Exception as e:
+            logger.warning(f"[RateLimiter] Could not record Trello rate limit headers: {e}")
+            self.redis_retry_at = time.monotonic() + 5
+
+    def wait(self, auth=None):
+        """Block until the call may go ahead. Nothing is locked while sleeping."""
+        while True:
+            sleep_time = self.acquire(auth)
+            if sleep_time <= 0:
+                return
+            logger.info(f"[RateLimiter] Sleeping {sleep_time:.2f}s to avoid 429")
+            time.sleep(sleep_time)
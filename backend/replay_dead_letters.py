@@ -0,0 +1,94 @@
+"""
+Dead-letter replay
+
+Replays events from the dead-letter queue (copies that failed for good: Trello
+errors, jobs that raised, jobs throttled too often) after the cause is fixed.
+Events run in this process at --rate events per second, and every Trello call
+still waits on the shared Redis rate limiter, so a replay never starves live
+traffic. Entries are removed as they are replayed; one that fails again is
+dead-lettered anew with its attempt count increased, and one that can't be
+replayed (e.g. its event expired) is kept.
+
+Usage:
+    python3 backend/replay_dead_letters.py [--user EMAIL] [--board BOARD_ID]
+        [--since 2026-10-17T08:00] [--until 2026-10-17T12:00] [--rate 2] [--limit 100] [--dry-run]
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from datetime import datetime
+
+# Ensure the backend directory is in the Python path
+sys.path.append(os.path.dirname(__file__))
+
+import tasks
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def parse_time(value):
+    """Epoch seconds from an ISO 8601 timestamp (local time unless it has an offset) or epoch seconds"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', help='only events for this user email')
+    parser.add_argument('--board', help='only events from this source board id')
+    parser.add_argument('--since', help='only events that failed at or after this time')
+    parser.add_argument('--until', help='only events that failed at or before this time')
+    parser.add_argument('--rate', type=float, default=float(os.environ.get('DEAD_LETTER_REPLAY_RATE', '2')),
+                        help='events replayed per second (default 2)')
+    parser.add_argument('--limit', type=int, default=None, help='replay at most this many events')
+    parser.add_argument('--dry-run', action='store_true', help='list matching entries without replaying')
+    args = parser.parse_args()
+
+    dead_letters = tasks.get_dead_letters()
+    if dead_letters is None:
+        logger.error("[Replay] Redis is not available, exiting")
+        sys.exit(1)
+    entries = dead_letters.entries(
+        user_email=args.user, board_id=args.board,
+        since=parse_time(args.since), until=parse_time(args.until), limit=args.limit,
+    )
+    logger.info(f"[Replay] {len(entries)} of {dead_letters.count()} dead-lettered events match")
+    if args.dry_run:
+        for entry in entries:
+            failed_at = datetime.fromtimestamp(entry['failed_at']).isoformat(timespec='seconds')
+            print(f"{entry['id']}  {failed_at}  {entry['user_email']}  board {entry['board_id']}  "
+                  f"attempts {entry['attempts']}  {entry['reason']}")
+        return
+
+    interval = 1.0 / args.rate if args.rate > 0 else 0
+    replayed = failed = 0
+    for entry in entries:
+        started = time.monotonic()
+        # Take it off the queue first, so two replays never run it twice; a second
+        # failure records a fresh entry and one that can't be replayed is put back
+        if not dead_letters.remove(entry['id']):
+            continue
+        try:
+            ok = tasks.replay_dead_letter(entry)
+        except Exception:
+            logger.exception(f"[Replay] Replaying entry {entry['id']} raised, keeping it")
+            dead_letters.restore(entry)
+            ok = False
+        if ok:
+            replayed += 1
+        else:
+            failed += 1
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    logger.info(f"[Replay] Replayed {replayed} events, {failed} failed again or could not be replayed")
+
+
+if __name__ == "__main__":
+    main()
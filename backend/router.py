@@ -0,0 +1,133 @@
+"""
+Webhook inbox router
+
+Drains the Redis Stream filled by /api/trello-webhook when WEBHOOK_INGRESS_MODE=stream:
+parses each raw body, routes it through the subscription index and enqueues jobs on
+the trello-events queue. Entries are acknowledged once routed; entries left pending by
+a crashed router are reclaimed after WEBHOOK_ROUTER_RECLAIM_IDLE_MS.
+
+Usage:
+    python3 backend/router.py
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+
+# Ensure the backend directory is in the Python path
+sys.path.append(os.path.dirname(__file__))
+
+from app_factory import create_app
+from inbox import WebhookInbox
+from dedupe import ActionDeduplicator
+from routing import SubscriptionIndex, WebhookRouter
+from events import EventStore
+from mentions import MentionFilter
+from tasks import build_username_directory
+from fair_queue import build_fair_queues
+from board_cache import build_board_cache
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+WEBHOOK_FANOUT = os.environ.get('WEBHOOK_FANOUT', 'false').lower() in ['true', '1', 'yes']
+BATCH_SIZE = int(os.environ.get('WEBHOOK_ROUTER_BATCH', '50'))
+# Keep below the Redis socket timeout set in create_app
+BLOCK_MS = int(os.environ.get('WEBHOOK_ROUTER_BLOCK_MS', '2000'))
+RECLAIM_IDLE_MS = int(os.environ.get('WEBHOOK_ROUTER_RECLAIM_IDLE_MS', '60000'))
+RECLAIM_EVERY_SECONDS = 30
+MAX_DELIVERIES = int(os.environ.get('WEBHOOK_ROUTER_MAX_DELIVERIES', '5'))
+
+
+def handle_entry(entry_id, fields, webhook_router):
+    """Route one inbox entry. Returns True if the entry can be acknowledged."""
+    raw = fields.get(b'body') if fields else None
+    if not raw:
+        return True
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        logger.warning(f"[Router] Entry {entry_id} is not valid JSON, dropping")
+        return True
+    if not payload:
+        return True
+    if not isinstance(payload, dict) or not isinstance(payload.get('action'), dict):
+        # Routing it would fail the same way on every redelivery
+        logger.warning(f"[Router] Entry {entry_id} is not a Trello webhook payload, dropping")
+        return True
+    try:
+        body, status = webhook_router.route(payload)
+    except Exception as e:
+        # Leave it pending; it will be reclaimed and retried
+        logger.error(f"[Router] Failed to route entry {entry_id}: {e}")
+        return False
+    logger.debug(f"[Router] Entry {entry_id} -> {status} {body}")
+    return True
+
+
+def process_entries(entries, inbox, webhook_router):
+    acked = [entry_id for entry_id, fields in entries if handle_entry(entry_id, fields, webhook_router)]
+    inbox.ack(*acked)
+    return len(acked)
+
+
+def main():
+    app, q = create_app()
+    if q is None:
+        logger.error("[Router] Redis is not available, exiting")
+        sys.exit(1)
+    inbox = WebhookInbox(q.connection, maxlen=int(os.environ.get('WEBHOOK_STREAM_MAXLEN', '100000')))
+    index = SubscriptionIndex(
+        redis_conn=q.connection,
+        check_interval=float(os.environ.get('ROUTING_VERSION_CHECK_SECONDS', '1.0'))
+    )
+    deduper = None
+    if os.environ.get('WEBHOOK_DEDUPE', 'true').lower() in ['true', '1', 'yes']:
+        deduper = ActionDeduplicator(
+            q.connection,
+            ttl=int(os.environ.get('WEBHOOK_DEDUPE_TTL', '86400')),
+            use_bloom=os.environ.get('WEBHOOK_DEDUPE_BLOOM', 'false').lower() in ['true', '1', 'yes']
+        )
+    webhook_router = WebhookRouter(
+        index,
+        q,
+        EventStore(q.connection, ttl=int(os.environ.get('WEBHOOK_EVENT_TTL', '86400'))),
+        fanout=WEBHOOK_FANOUT,
+        deduper=deduper,
+        mention_filter=MentionFilter(build_username_directory(q.connection)),
+        fair_queues=build_fair_queues(q),
+        metadata_cache=build_board_cache(q.connection)
+    )
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    inbox.ensure_group()
+    logger.info(f"[Router] Consumer {consumer} reading {inbox.stream_key} as group {inbox.group}")
+
+    last_reclaim = 0.0
+    while True:
+        try:
+            # Fresh app context per batch so the SQLAlchemy session never goes stale
+            with app.app_context():
+                if time.monotonic() - last_reclaim >= RECLAIM_EVERY_SECONDS:
+                    last_reclaim = time.monotonic()
+                    reclaimed = inbox.reclaim(
+                        consumer, min_idle_ms=RECLAIM_IDLE_MS, count=BATCH_SIZE, max_deliveries=MAX_DELIVERIES
+                    )
+                    if reclaimed:
+                        logger.info(f"[Router] Reclaimed {len(reclaimed)} pending entries")
+                        process_entries(reclaimed, inbox, webhook_router)
+                entries = inbox.read(consumer, count=BATCH_SIZE, block_ms=BLOCK_MS)
+                if entries:
+                    process_entries(entries, inbox, webhook_router)
+        except KeyboardInterrupt:
+            logger.info("[Router] Shutting down")
+            break
+        except Exception as e:
+            logger.error(f"[Router] Inbox loop error: {e}")
+            time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# backend/routing.py
+
+import time
+import logging
+from collections import namedtuple
+from threading import Lock
+from db import WebhookSetting, TrelloWebhook, TrelloWebhookSetting
+from events import TrelloEvent
+from tasks import process_trello_event_ref, dispatch_trello_event_ref
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Redis key shared by every gunicorn worker; bumped whenever routing data changes
+ROUTING_VERSION_KEY = 'trello:routing:version'
+
+# One row per user setting that should receive an event
+Subscriber = namedtuple('Subscriber', [
+    'setting_id', 'user_email', 'board_id', 'board_name', 'event_type',
+    'label', 'label_id', 'label_name', 'list_name',
+])
+
+# Everything ingress needs to know about one Trello board
+BoardRoute = namedtuple('BoardRoute', ['webhook_id', 'enabled_events', 'subscribers'])
+
+
+def map_trello_event_type(event_type):
+    """Map Trello action types to the event types users subscribe to"""
+    if event_type == "commentCard":
+        return "Mentioned in a card"
+    if event_type == "addMemberToCard":
+        return "Added to a card"
+    return event_type  # Use as-is for other events
+
+
+def _subscriber_from_setting(ws):
+    return Subscriber(
+        setting_id=ws.id,
+        user_email=ws.user_email,
+        board_id=ws.board_id,
+        board_name=ws.board_name,
+        event_type=ws.event_type,
+        label=ws.label,
+        label_id=ws.label_id,
+        label_name=ws.label_name,
+        list_name=ws.list_name,
+    )
+
+
+def _build_routes(trello_webhooks, trello_webhook_settings, webhook_settings):
+    """Fold the three routing tables into board_id -> BoardRoute"""
+    enabled = {}
+    for tws in trello_webhook_settings:
+        if tws.enabled:
+            enabled.setdefault(tws.webhook_id, set()).add(tws.event_type)
+    subscribers = {}
+    for ws in webhook_settings:
+        by_event = subscribers.setdefault(ws.webhook_id, {})
+        by_event.setdefault(ws.event_type, []).append(_subscriber_from_setting(ws))
+    routes = {}
+    for tw in trello_webhooks:
+        by_event = subscribers.get(tw.webhook_id, {})
+        routes[tw.board_id] = BoardRoute(
+            webhook_id=tw.webhook_id,
+            enabled_events=frozenset(enabled.get(tw.webhook_id, ())),
+            subscribers={event: tuple(subs) for event, subs in by_event.items()},
+        )
+    return routes
+
+
+class SubscriptionIndex:
+    """In-memory board_id -> event_type -> subscribers index for webhook ingress.
+
+    The index is a full snapshot of the routing tables, so a board missing from it
+    is a negative entry and costs no SQL. Changes made in this process patch the
+    affected board in place; other processes notice the bumped Redis version
+    counter and rebuild on their next lookup.
+    """
+
+    def __init__(self, redis_conn=None, check_interval=1.0):
+        self.redis = redis_conn
+        self.check_interval = check_interval
+        self.routes = {}
+        self.version = None
+        self.stale = True
+        self.last_check = 0.0
+        self.lock = Lock()
+
+    def _remote_version(self):
+        if self.redis is None:
+            return None
+        try:
+            value = self.redis.get(ROUTING_VERSION_KEY)
+            return int(value) if value is not None else 0
+        except Exception as e:
+            logger.warning(f"[Routing] Could not read routing version: {e}")
+            return self.version
+
+    def build(self):
+        """Load the whole routing table set. Requires an app context."""
+        with self.lock:
+            version = self._remote_version()
+            routes = _build_routes(
+                TrelloWebhook.query.all(),
+                TrelloWebhookSetting.query.all(),
+                WebhookSetting.query.all(),
+            )
+            self.routes = routes
+            self.version = version
+            self.stale = False
+            self.last_check = time.monotonic()
+        logger.info(f"[Routing] Built subscription index for {len(routes)} boards (version {version})")
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if not self.stale and now - self.last_check < self.check_interval:
+            return
+        self.last_check = now
+        if self.stale or self._remote_version() != self.version:
+            self.build()
+
+    def lookup(self, board_id):
+        """Return the BoardRoute for a board, or None if no webhook is registered"""
+        self._ensure_fresh()
+        return self.routes.get(board_id)
+
+    def _patch_webhook(self, webhook_id):
+        tw = TrelloWebhook.query.filter_by(webhook_id=webhook_id).first()
+        if not tw:
+            # Drop any route still pointing at this webhook
+            self.routes = {b: r for b, r in self.routes.items() if r.webhook_id != webhook_id}
+            return
+        routes = _build_routes(
+            [tw],
+            TrelloWebhookSetting.query.filter_by(webhook_id=webhook_id).all(),
+            WebhookSetting.query.filter_by(webhook_id=webhook_id).all(),
+        )
+        self.routes = {**self.routes, **routes}
+
+    def invalidate(self, webhook_id=None):
+        """Record a routing change. Call after the change has been committed.
+
+        With a webhook_id the affected board is reloaded in place; without one the
+        whole index is rebuilt on the next lookup. Either way the shared version is
+        bumped so other processes pick the change up.
+        """
+        with self.lock:
+            previous = self.version
+            try:
+                if webhook_id is not None and not self.stale:
+                    self._patch_webhook(webhook_id)
+                else:
+                    self.stale = True
+            except Exception as e:
+                logger.warning(f"[Routing] Patch for webhook {webhook_id} failed, rebuilding: {e}")
+                self.stale = True
+            if self.redis is None:
+                return
+            try:
+                version = self.redis.incr(ROUTING_VERSION_KEY)
+            except Exception as e:
+                logger.warning(f"[Routing] Could not bump routing version: {e}")
+                return
+            if previous is not None and version == previous + 1:
+                # Nobody else changed anything since our last sync
+                self.version = version
+            else:
+                self.stale = True
+
+
+class WebhookRouter:
+    """Turns a parsed Trello webhook payload into jobs for its subscribers.
+
+    Shared by the HTTP ingress and the stream router so both report outcomes the
+    same way. The action is parsed once into a TrelloEvent and stored under a
+    content key; each job carries only that key and the subscriber's setting id.
+    With fair_queues, jobs go to their tenant's sub-queue instead of `queue`.
+    With metadata_cache, label and list actions invalidate the board's cached metadata.
+    """
+
+    def __init__(self, index, queue, event_store, fanout=False, deduper=None, mention_filter=None, fair_queues=None,
+                 metadata_cache=None):
+        self.index = index
+        self.metadata_cache = metadata_cache
+        self.queue = queue
+        self.fair_queues = fair_queues
+        self.event_store = event_store
+        self.fanout = fanout
+        self.deduper = deduper
+        self.mention_filter = mention_filter
+
+    def _queue_for(self, board_id, user_email):
+        if self.fair_queues is None or not self.fair_queues.enabled:
+            return self.queue
+        tenant = self.fair_queues.tenant_for(board_id, user_email)
+        return self.fair_queues.queue_for(tenant) if tenant else self.queue
+
+    def route(self, payload):
+        """Route one payload. Returns a (response_body, status_code) pair.
+
+        With a deduper, redeliveries of an action that was already routed are
+        acknowledged without enqueueing.
+        """
+        if not isinstance(payload, dict) or not isinstance(payload.get('action'), dict):
+            logger.warning("[Routing] No action in payload, returning 400")
+            return {'error': 'Invalid webhook payload'}, 400
+        event = TrelloEvent.from_payload(payload)
+        if self.deduper is None or not event.action_id:
+            return self._route_event(event)
+        if not self.deduper.claim(event.action_id):
+            logger.info(f"[Routing] Duplicate delivery of action {event.action_id}, ignoring")
+            return {'status': 'duplicate', 'action_id': event.action_id}, 200
+        try:
+            return self._route_event(event)
+        except Exception:
+            self.deduper.release(event.action_id)
+            raise
+
+    def _route_event(self, event):
+        event_type = event.action_type
+        logger.debug(f"[Routing] event_type :: {event_type}")
+
+        board_id = event.board_id
+        logger.debug(f"[Routing] Extracted board_id: {board_id}")
+        if not board_id:
+            logger.warning("[Routing] Missing board_id in payload")
+            return {'error': 'Missing board_id in payload'}, 400
+
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate_for_action(event_type, board_id)
+
+        # Route through the in-memory subscription index (no SQL in steady state)
+        route = self.index.lookup(board_id)
+        logger.debug(f"[Routing] Found route: {route is not None}")
+        if not route:
+            logger.warning(f"[Routing] No webhook registered for board {board_id}")
+            return {'error': 'No webhook registered for this board'}, 404
+        logger.debug(f"[Routing] Using webhook_id: {route.webhook_id}")
+
+        # Map Trello event types to our custom event types
+        mapped_event_type = map_trello_event_type(event_type)
+        logger.debug(f"[Routing] Mapped event_type: {event_type} -> {mapped_event_type}")
+
+        if mapped_event_type not in route.enabled_events:
+            logger.debug(f"[Routing] Event type {mapped_event_type} not enabled or not found")
+            return {'status': 'ignored', 'reason': f'Event type {mapped_event_type} not enabled'}, 200
+
+        # Get all user preferences for this webhook and event type
+        user_settings = route.subscribers.get(mapped_event_type, ())
+        logger.info(f"[Routing] Found {len(user_settings)} user settings for event {mapped_event_type}")
+
+        if not user_settings:
+            logger.debug(f"[Routing] No user settings found for event type {mapped_event_type}")
+            return {'status': 'ignored', 'reason': f'No user settings found for event type {mapped_event_type}'}, 200
+
+        if self.mention_filter is not None:
+            # Only enqueue for users this comment mentions / this member add concerns
+            user_settings = self.mention_filter.filter(board_id, user_settings, event)
+            logger.debug(f"[Routing] {len(user_settings)} user settings left after mention prefilter")
+            if not user_settings:
+                return {'status': 'ignored', 'reason': 'No subscribed user is concerned by this event'}, 200
+
+        # Store the slim event once; jobs only carry its key
+        event_key = self.event_store.save(event)
+        setting_ids = [s.setting_id for s in user_settings]
+        if self.fanout:
+            # One job per Trello action; the worker expands it per user in a single pipeline
+            logger.debug(f"[Routing] Enqueuing fan-out job for {len(setting_ids)} users")
+            if self.fair_queues is not None and self.fair_queues.enabled:
+                tenants = [self.fair_queues.tenant_for(board_id, s.user_email) for s in user_settings]
+                self._queue_for(board_id, None).enqueue(dispatch_trello_event_ref, event_key, setting_ids, tenants)
+            else:
+                self.queue.enqueue(dispatch_trello_event_ref, event_key, setting_ids)
+        else:
+            # Process event for each user who has settings for this event
+            for user_setting in user_settings:
+                logger.debug(f"[Routing] Enqueuing task for user {user_setting.user_email}")
+                self._queue_for(board_id, user_setting.user_email).enqueue(
+                    process_trello_event_ref, event_key, user_setting.setting_id
+                )
+
+        logger.info(f"[Routing] Queued {len(user_settings)} tasks for event {mapped_event_type}")
+        return {'status': 'queued', 'event_type': mapped_event_type, 'users_processed': len(user_settings)}, 200
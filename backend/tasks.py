@@ -1,204 +1,580 @@
-import time
-import requests
+import os
+import random
 import logging
-from collections import deque
-from threading import Lock
-from db import db, User, WebhookSetting, UserBoard
+import threading
+import uuid
+from datetime import timedelta
+from sqlalchemy import text
+from rq import get_current_job
+from db import db, WebhookSetting
 from app_factory import create_app
+from events import TrelloEvent, EventStore
+from mentions import UsernameDirectory
+from identity import IdentityCache
+from trello_client import TrelloAuth, get_trello_client
+from rate_limit import TrelloThrottled
+from copy_plan import CardCopyPlan
+from coalesce import CardCoalescer, CopyInProgress
+from fair_queue import build_fair_queues
+from job_context import JobContextLoader
+from dead_letter import DeadLetterQueue
+from ledger import CardCopyLedger, CLAIMED, COPIED, BUSY
+from board_cache import build_board_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# How many times one job may be rescheduled because Trello throttled it
+MAX_DEFERRALS = int(os.environ.get('TRELLO_MAX_DEFERRALS', '20'))
+
 # Don't create app during import - it will be created when needed
 app = None
 q = None
+username_directory = None
+identity_cache = None
+coalescer = None
+fair_queues = None
+job_context_loader = None
+dead_letters = None
+card_ledger = None
+board_cache = None
+
+# Threaded workers (WORKER_CONCURRENCY > 1) may hit the lazy getters at once
+_init_lock = threading.RLock()
+
+# The copy job running on this thread: (job id, args with its live progress), for the dead-letter handler
+_running = threading.local()
+
+def _track_running_job(*args):
+    job = get_current_job()
+    _running.job = (job.id if job else None, args)
 
 def get_app():
     global app, q
     if app is None:
-        app, q = create_app()
+        with _init_lock:
+            if app is None:
+                app, q = create_app()
     return app, q
 
-# Rate limiter
-class TrelloRateLimiter:
-    def __init__(self, max_requests=100, per_seconds=10):
-        self.max_requests = max_requests
-        self.per_seconds = per_seconds
-        self.request_times = deque()
-        self.lock = Lock()
-
-    def wait(self):
-        with self.lock:
-            now = time.time()
-            while self.request_times and self.request_times[0] < now - self.per_seconds:
-                self.request_times.popleft()
-            if len(self.request_times) >= self.max_requests:
-                sleep_time = self.per_seconds - (now - self.request_times[0])
-                logger.info(f"[RateLimiter] Sleeping {sleep_time:.2f}s to avoid 429")
-                time.sleep(sleep_time)
-            self.request_times.append(time.time())
-
-rate_limiter = TrelloRateLimiter()
-
-def process_trello_event(enriched_payload):
+def get_username_directory():
+    global username_directory
+    if username_directory is None:
+        with _init_lock:
+            app_instance, q_instance = get_app()
+            if username_directory is None and q_instance is not None:
+                username_directory = build_username_directory(q_instance.connection)
+    return username_directory
+
+def get_identity_cache():
+    global identity_cache
+    if identity_cache is None:
+        with _init_lock:
+            app_instance, q_instance = get_app()
+            if identity_cache is None and q_instance is not None:
+                identity_cache = build_identity_cache(q_instance.connection, get_username_directory())
+    return identity_cache
+
+def get_coalescer():
+    global coalescer
+    if coalescer is None:
+        with _init_lock:
+            app_instance, q_instance = get_app()
+            if coalescer is None and q_instance is not None:
+                coalescer = CardCoalescer(
+                    q_instance.connection, window=int(os.environ.get('COPY_COALESCE_WINDOW', '5'))
+                )
+    return coalescer
+
+def get_fair_queues():
+    global fair_queues
+    if fair_queues is None:
+        with _init_lock:
+            app_instance, q_instance = get_app()
+            if fair_queues is None and q_instance is not None:
+                fair_queues = build_fair_queues(q_instance)
+    return fair_queues
+
+def get_job_context_loader():
+    global job_context_loader
+    if job_context_loader is None:
+        with _init_lock:
+            app_instance, q_instance = get_app()
+            if job_context_loader is None:
+                job_context_loader = JobContextLoader(
+                    q_instance.connection if q_instance else None,
+                    check_interval=float(os.environ.get('JOB_CONTEXT_CHECK_SECONDS', '1.0'))
+                )
+    return job_context_loader
+
+def get_dead_letters():
+    global dead_letters
+    if dead_letters is None:
+        with _init_lock:
+            app_instance, q_instance = get_app()
+            if dead_letters is None and q_instance is not None:
+                dead_letters = DeadLetterQueue(
+                    q_instance.connection, max_entries=int(os.environ.get('DEAD_LETTER_MAX_ENTRIES', '10000'))
+                )
+    return dead_letters
+
+def get_card_ledger():
+    global card_ledger
+    if card_ledger is None:
+        with _init_lock:
+            if card_ledger is None:
+                card_ledger = CardCopyLedger(stale_after=int(os.environ.get('COPY_CLAIM_STALE_SECONDS', '600')))
+    return card_ledger
+
+def get_board_cache():
+    global board_cache
+    if board_cache is None:
+        with _init_lock:
+            app_instance, q_instance = get_app()
+            if board_cache is None and q_instance is not None:
+                board_cache = build_board_cache(q_instance.connection)
+    return board_cache
+
+def warm_up():
+    """Build everything jobs share (app, DB pool, Redis, caches, Trello client) once per process"""
+    app_instance, q_instance = get_app()
+    with app_instance.app_context():
+        db.session.execute(text('SELECT 1'))
+        db.session.remove()
+    get_username_directory()
+    get_identity_cache()
+    get_coalescer()
+    get_fair_queues()
+    get_job_context_loader()
+    get_dead_letters()
+    get_board_cache()
+    get_trello_client()
+    return app_instance, q_instance
+
+def recover_after_failure(job=None):
+    """Called by warm workers after a failed job: drop DB connections a crash may have poisoned"""
+    app_instance, q_instance = get_app()
+    with app_instance.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    logger.info(f'[Worker] Reset DB connections after failed job {job.id if job else ""}')
+
+def build_identity_cache(redis_conn, directory=None):
+    return IdentityCache(
+        redis_conn,
+        fetch_trello_member,
+        ttl=int(os.environ.get('TRELLO_IDENTITY_TTL', '3600')),
+        refresh_ahead=int(os.environ.get('TRELLO_IDENTITY_REFRESH_AHEAD', '300')),
+        directory=directory
+    )
+
+def build_username_directory(redis_conn):
+    # A username the identity cache hasn't confirmed within its TTL may be stale
+    return UsernameDirectory(redis_conn, max_age=int(os.environ.get('TRELLO_IDENTITY_TTL', '3600')))
+
+def build_enriched_payload(trello_event, subscriber):
+    """Attach one user's webhook setting to a raw Trello event"""
+    return {
+        'trello_event': trello_event,
+        'user_email': subscriber.get('user_email'),
+        'board_id': subscriber.get('board_id'),
+        'board_name': subscriber.get('board_name'),
+        'event_type': subscriber.get('event_type'),
+        'label': subscriber.get('label'),  # Keep for backward compatibility
+        'label_id': subscriber.get('label_id'),
+        'label_name': subscriber.get('label_name'),
+        'list_name': subscriber.get('list_name')
+    }
+
+def dispatch_trello_event(trello_event, subscribers):
+    """Legacy fan-out job carrying the whole payload; kept so queued jobs still drain"""
+    if not subscribers:
+        return 0
+    app_instance, q_instance = get_app()
+    if q_instance is None:
+        logger.error('[Dispatcher] No queue available, dropping fan-out')
+        return 0
+    job_datas = [
+        q_instance.prepare_data(process_trello_event, args=(build_enriched_payload(trello_event, subscriber),))
+        for subscriber in subscribers
+    ]
+    jobs = q_instance.enqueue_many(job_datas)
+    logger.info(f'[Dispatcher] Fanned out {len(jobs)} jobs for action {trello_event.get("action", {}).get("id")}')
+    return len(jobs)
+
+def dispatch_trello_event_ref(event_key, setting_ids, tenants=None):
+    """Expand one stored webhook event into per-user jobs with a single Redis pipeline per queue.
+
+    `tenants` (parallel to setting_ids) puts each job on its tenant's fair sub-queue.
+    """
+    if not setting_ids:
+        return 0
+    app_instance, q_instance = get_app()
+    if q_instance is None:
+        logger.error('[Dispatcher] No queue available, dropping fan-out')
+        return 0
+    fair_queues = get_fair_queues()
+    by_queue = {}
+    for setting_id, tenant in zip(setting_ids, tenants or [None] * len(setting_ids), strict=True):
+        queue = fair_queues.queue_for(tenant) if tenant else q_instance
+        by_queue.setdefault(queue.name, (queue, []))[1].append(
+            queue.prepare_data(process_trello_event_ref, args=(event_key, setting_id))
+        )
+    jobs = 0
+    for queue, job_datas in by_queue.values():
+        jobs += len(queue.enqueue_many(job_datas))
+    logger.info(f'[Dispatcher] Fanned out {jobs} jobs for event {event_key}')
+    return jobs
+
+def process_trello_event(enriched_payload, progress=None, deferrals=0):
+    """Legacy job format carrying the whole Trello payload; kept so queued jobs still drain"""
     logger.info(f'[Worker] Starting to process task with payload keys: {list(enriched_payload.keys())}')
     # Get app context when needed
     app_instance, q_instance = get_app()
     with app_instance.app_context():
-        # Extract Trello event and user context
-        trello_event = enriched_payload.get('trello_event', {})
-        user_email = enriched_payload.get('user_email')
-        board_id = enriched_payload.get('board_id')
-        board_name = enriched_payload.get('board_name')
-        event_type = enriched_payload.get('event_type')
-        label = enriched_payload.get('label')  # Keep for backward compatibility
-        label_id = enriched_payload.get('label_id')
-        label_name = enriched_payload.get('label_name')
-        list_name = enriched_payload.get('list_name')
-        
-        logger.info(f'[Worker] Extracted user_email: {user_email}, event_type: {event_type}, board_name: {board_name}')
-        
-        action = trello_event.get('action', {})
-        webhook_id = trello_event.get('webhook', {}).get('id')
-        card_id = action.get('data', {}).get('card', {}).get('id')
-        trello_event_type = action.get('type')
-        
-        logger.info(f'[Worker] Extracted webhook_id: {webhook_id}, card_id: {card_id}, trello_event_type: {trello_event_type}')
-        
-        if not webhook_id or not card_id or not trello_event_type or not user_email:
-            logger.error('[Worker] Missing required fields in enriched payload')
+        event = TrelloEvent.from_payload(enriched_payload.get('trello_event', {}))
+        progress = progress or {}
+        _track_running_job(enriched_payload, progress, deferrals)
+        try:
+            with get_trello_client().deferring():
+                _process_event(event, enriched_payload, progress)
+        except TrelloThrottled as e:
+            defer_job(q_instance, e, process_trello_event, enriched_payload, progress, deferrals)
+
+def process_trello_event_ref(event_key, setting_id, progress=None, deferrals=0):
+    """Process one stored event for one user's webhook setting"""
+    logger.info(f'[Worker] Starting to process event {event_key} for setting {setting_id}')
+    app_instance, q_instance = get_app()
+    with app_instance.app_context():
+        event = EventStore(q_instance.connection).load(event_key)
+        # Setting, credentials and target list in one query (or none, when cached)
+        setting, context = get_job_context_loader().load_setting(setting_id)
+        if not setting:
+            logger.info(f'[Worker] Webhook setting {setting_id} no longer exists, skipping')
             return
-            
-        logger.info(f'[Worker] Processing event {trello_event_type} for user {user_email} on board {board_name}')
-        
-        # Find user
-        user = User.query.filter_by(email=user_email).first()
-        if not user:
-            logger.error(f'[Worker] No user found for email {user_email}')
+        progress = progress or {}
+        if event is None:
+            # Expired or evicted before the job (or its deferred retry) ran; keep a trace for replay_dead_letters
+            logger.error(f'[Worker] Event {event_key} expired or missing, dead-lettering it')
+            dead_letter_event(None, setting, dict(progress, event_key=event_key), 'event expired')
             return
-        # Only proceed if the event type matches the setting
-        # Map 'Mentioned in a card' to 'commentCard' and 'Added to a card' to 'addMemberToCard' for comparison
-        setting_event_type = "commentCard" if event_type == "Mentioned in a card" else (
-            "addMemberToCard" if event_type == "Added to a card" else event_type
-        )
+        _track_running_job(event_key, setting_id, progress, deferrals)
+        try:
+            with get_trello_client().deferring():
+                _process_event(event, setting, progress, context)
+        except TrelloThrottled as e:
+            defer_job(q_instance, e, process_trello_event_ref, event_key, setting_id, progress, deferrals)
+
+def defer_job(q_instance, throttled, func, *args):
+    """Reschedule a throttled job with enqueue_in instead of sleeping in the worker.
 
-        if trello_event_type != setting_event_type:
-            logger.debug(f"[Worker] Event type {trello_event_type} does not match setting {setting_event_type}")
+    The last two args are the job's progress dict (steps already done, so a
+    resumed job never copies a card twice) and its deferral count. Jobs from a
+    tenant's fair sub-queue come back on the base queue: RQ's scheduler only
+    promotes jobs for the queues a worker started with, which never include
+    tenant queues.
+    """
+    *job_args, progress, deferrals = args
+    if deferrals >= MAX_DEFERRALS:
+        logger.error(f'[Worker] {func.__name__}{tuple(job_args)} deferred {deferrals} times, giving up')
+        dead_letter_job(func.__name__, (*job_args, progress), f'deferred {deferrals} times, last: {throttled}')
+        return None
+    delay = throttled.retry_after
+    if delay is None:
+        # Trello refused the call without saying for how long: back off harder each time
+        delay = 2 ** min(deferrals, 6)
+    delay += random.uniform(0, 0.5)
+    logger.info(f'[Worker] Deferring {func.__name__} ({throttled}), retrying in {delay:.2f}s (progress: {progress})')
+    return q_instance.enqueue_in(timedelta(seconds=delay), func, *job_args, progress, deferrals + 1)
+
+def _process_event(event, setting, progress, context=None):
+    """Copy the event's card for one user. `progress` records the Trello writes
+    already done so a job resumed after throttling picks up where it stopped.
+    `context` is the user's JobContext, loaded here when the caller has none."""
+    # Extract user context from the webhook setting
+    user_email = setting.get('user_email')
+    board_name = setting.get('board_name')
+    event_type = setting.get('event_type')
+    label = setting.get('label')  # Keep for backward compatibility
+    label_id = setting.get('label_id')
+
+    logger.info(f'[Worker] Extracted user_email: {user_email}, event_type: {event_type}, board_name: {board_name}')
+
+    webhook_id = event.webhook_id
+    card_id = event.card_id
+    trello_event_type = event.action_type
+
+    logger.info(f'[Worker] Extracted webhook_id: {webhook_id}, card_id: {card_id}, trello_event_type: {trello_event_type}')
+
+    if not webhook_id or not card_id or not trello_event_type or not user_email:
+        logger.error('[Worker] Missing required fields in enriched payload')
+        return
+
+    logger.info(f'[Worker] Processing event {trello_event_type} for user {user_email} on board {board_name}')
+
+    # Find user (credentials, identity and target board come together)
+    user = context or get_job_context_loader().load_user(user_email)
+    if not user:
+        logger.error(f'[Worker] No user found for email {user_email}')
+        return
+    # Only proceed if the event type matches the setting
+    # Map 'Mentioned in a card' to 'commentCard' and 'Added to a card' to 'addMemberToCard' for comparison
+    setting_event_type = "commentCard" if event_type == "Mentioned in a card" else (
+        "addMemberToCard" if event_type == "Added to a card" else event_type
+    )
+
+    if trello_event_type != setting_event_type:
+        logger.debug(f"[Worker] Event type {trello_event_type} does not match setting {setting_event_type}")
+        return
+    trello_username = get_trello_username(user)
+    if not trello_username:
+        logger.warning("Could not fetch Trello username, skipping.")
+        return
+    # Share the username with ingress so it can prefilter mentions
+    directory = get_username_directory()
+    if directory is not None:
+        directory.set(user_email, trello_username)
+
+    # Event-specific checks
+    if trello_event_type == "commentCard":
+        comment_text = event.comment_text or ''
+        if f"@{trello_username}" not in comment_text:
+            logger.debug("User not mentioned in comment, skipping.")
             return
-        trello_username = get_trello_username(user.apiKey, user.token)
-        if not trello_username:
-            logger.warning("Could not fetch Trello username, skipping.")
+    elif trello_event_type == "addMemberToCard":
+        # Check if the user was added to the card
+        member_added = event.member_username
+        if member_added != trello_username:
+            logger.debug(f"User {trello_username} was not added to the card, skipping.")
             return
 
-        # Event-specific checks
-        if trello_event_type == "commentCard":
-            comment_text = trello_event['action']['data'].get('text', '')
-            if f"@{trello_username}" not in comment_text:
-                logger.debug("User not mentioned in comment, skipping.")
-                return
-        elif trello_event_type == "addMemberToCard":
-            # Check if the user was added to the card
-            member_added = trello_event['action']['member'].get('username') if trello_event['action'].get('member') else None
-            if member_added != trello_username:
-                logger.debug(f"User {trello_username} was not added to the card, skipping.")
-                return
-
-        api_key = user.apiKey
-        token = user.token
-        # Always copy to user's board and 'Enquiry In' list
-        user_board = UserBoard.query.filter_by(user_email=user_email).first()
-        if not user_board:
-            logger.error(f"[Worker] No user board found for {user_email}")
-            return
-        target_board_id = user_board.board_id
-        enquiry_in_list_id = user_board.lists.get('Enquiry In')
-        if not enquiry_in_list_id:
-            logger.error(f"[Worker] No 'Enquiry In' list found for user {user_email}")
+    api_key = user.apiKey
+    token = user.token
+    # Always copy to user's board and 'Enquiry In' list
+    if not user.board_id:
+        logger.error(f"[Worker] No user board found for {user_email}")
+        return
+    target_board_id = user.board_id
+    enquiry_in_list_id = user.enquiry_in_list_id
+    if not enquiry_in_list_id:
+        logger.error(f"[Worker] No 'Enquiry In' list found for user {user_email}")
+        return
+    card_coalescer = get_coalescer()
+    ledger = get_card_ledger()
+    if not progress.get('new_card_id'):
+        # One token per job, kept across deferrals, for both the coalescing window and the ledger claim
+        resumed = 'coalesce_token' in progress
+        copy_token = progress.setdefault('coalesce_token', uuid.uuid4().hex)
+        # Several webhooks for one card in quick succession become a single copy,
+        # and each source card is copied once per user whatever retries or duplicate deliveries arrive.
+        # A resumed job may still own the ledger claim after its window expired and a newer
+        # event opened another, so only the ledger can tell it to back off.
+        if card_coalescer is not None and not card_coalescer.claim(user_email, card_id, copy_token) and not resumed:
+            state, copied_card_id = BUSY, None
+        else:
+            state, copied_card_id = ledger.claim(user_email, card_id, copy_token)
+        if state != CLAIMED and not (label_id or label):
+            # The other job's copy is everything this setting would produce
+            logger.info(f'[Worker] Card {card_id} is copied for {user_email} by another job ({state}), skipping')
             return
-        # Copy the card to the user's board and 'Enquiry In' list
-        copy_url = f"https://api.trello.com/1/cards?idCardSource={card_id}&idList={enquiry_in_list_id}&key={api_key}&token={token}"
-        logger.debug("process_trello_event :: %s", copy_url)
-        copy_resp = call_trello_api("POST", copy_url)
+        if state == BUSY:
+            # This setting's label still has to go on that copy once it exists
+            raise CopyInProgress(card_coalescer.window if card_coalescer is not None and card_coalescer.window > 0 else 5)
+        if state == COPIED:
+            logger.info(f'[Worker] Card {card_id} was already copied to {copied_card_id} for {user_email}, adding this setting\'s label')
+            progress.update({'new_card_id': copied_card_id, 'attached': True, 'labelled': False})
+
+    # Copy the card to the user's board and 'Enquiry In' list
+    trello = get_trello_client()
+    auth = TrelloAuth(api_key, token)
+    plan = CardCopyPlan(trello, auth, progress, metadata=get_board_cache())
+    if not label_id and label:
+        # Fallback: find the label by name (for backward compatibility), then remember its id
+        label_id = plan.resolve_label(target_board_id, label)
+        if label_id and setting.get('id'):
+            remember_label_id(setting['id'], label_id, label)
+
+    new_card_id = progress.get('new_card_id')
+    if not new_card_id:
+        logger.debug(f"process_trello_event :: copying {card_id} to list {enquiry_in_list_id}")
+        try:
+            copy_resp = plan.create_card(card_id, enquiry_in_list_id, label_id)
+        except TrelloThrottled:
+            # Deferred: the claim stays with this job's token
+            raise
+        except Exception:
+            ledger.release(user_email, card_id, progress['coalesce_token'])
+            raise
+        if copy_resp is not None and copy_resp.status_code == 401:
+            # Credentials revoked: drop the cached identity so it is re-resolved
+            invalidate_trello_identity(user)
         if not copy_resp or copy_resp.status_code != 200:
             logger.error(f'[Worker] Failed to copy card {card_id}')
+            # Let the next event for this card try again
+            ledger.release(user_email, card_id, progress['coalesce_token'])
+            if card_coalescer is not None:
+                card_coalescer.release(user_email, card_id, progress['coalesce_token'])
+            dead_letter_event(event, setting, progress, (
+                f'copy failed with HTTP {copy_resp.status_code}' if copy_resp is not None
+                else 'copy failed: Trello did not respond'
+            ))
             return
-        new_card = copy_resp.json()
-        new_card_id = new_card.get('id')
+        new_card_id = progress.get('new_card_id')
         if not new_card_id:
             logger.error('[Worker] No new card id after copy')
+            ledger.release(user_email, card_id, progress['coalesce_token'])
             return
+        ledger.complete(user_email, card_id, progress['coalesce_token'], new_card_id)
 
-        # Link the main card to the copied card as an attachment
-        main_card_url = f"https://trello.com/c/{card_id}"
-        main_card_name = action.get('data', {}).get('card', {}).get('name', 'Main Card')
-        attachment_url = f"https://api.trello.com/1/cards/{new_card_id}/attachments?key={api_key}&token={token}"
-        attachment_payload = {
-            "url": main_card_url,
-            "name": f"Original Card: {main_card_name}"
-        }
-        attach_resp = call_trello_api("POST", attachment_url, json=attachment_payload)
+    # Link the main card to the copied card as an attachment (and label it, if creation didn't)
+    main_card_url = f"https://trello.com/c/{card_id}"
+    main_card_name = event.card_name or 'Main Card'
+    results = plan.finish(new_card_id, main_card_url, f"Original Card: {main_card_name}", label_id)
+    if 'attached' in results:
+        attach_resp = results['attached']
         if not attach_resp or attach_resp.status_code not in [200, 201]:
             logger.warning(f"[Worker] Failed to attach main card link to copied card {new_card_id}")
         else:
             logger.info(f"[Worker] Linked main card {card_id} to copied card {new_card_id} as attachment.")
+    if 'labelled' in results:
+        label_resp = results['labelled']
+        if not label_resp or label_resp.status_code not in [200, 201]:
+            logger.warning(f'[Worker] Failed to apply label {label_id} to card {new_card_id}')
+            if label_resp is not None and 400 <= label_resp.status_code < 500 and plan.metadata is not None:
+                # The target board rarely has our webhook, so a rejected label is how we learn its labels changed
+                plan.metadata.invalidate('labels', target_board_id)
 
-        # Apply label if specified
-        if label_id:
-            # Apply label by ID (preferred method)
-            add_label_url = f"https://api.trello.com/1/cards/{new_card_id}/idLabels?key={api_key}&token={token}"
-            label_resp = call_trello_api("POST", add_label_url, json={"value": label_id})
-            if label_resp and label_resp.status_code in [200, 201]:
-                logger.info(f'[Worker] Applied label {label_id} to card {new_card_id}')
-            else:
-                logger.warning(f'[Worker] Failed to apply label {label_id} to card {new_card_id}')
-        elif label:
-            # Fallback: Find label by name (for backward compatibility)
-            labels_url = f"https://api.trello.com/1/boards/{target_board_id}/labels?key={api_key}&token={token}"
-            labels_resp = call_trello_api("GET", labels_url)
-            if labels_resp and labels_resp.status_code == 200:
-                labels = labels_resp.json()
-                label_obj = next((l for l in labels if l['name'] == label), None)
-                if label_obj:
-                    fallback_label_id = label_obj['id']
-                    add_label_url = f"https://api.trello.com/1/cards/{new_card_id}/idLabels?key={api_key}&token={token}"
-                    call_trello_api("POST", add_label_url, json={"value": fallback_label_id})
-                    logger.info(f'[Worker] Applied label {label} (ID: {fallback_label_id}) to card {new_card_id}')
-                else:
-                    logger.warning(f'[Worker] Label {label} not found on board {target_board_id}')
-            else:
-                logger.error(f'[Worker] Failed to fetch labels for board {target_board_id}')
-        
-        logger.info(f'[Worker] Card {card_id} copied to {new_card_id} in list {enquiry_in_list_id} and label applied if specified.')
-
-def call_trello_api(method, url, json=None):
-    rate_limiter.wait()
-    for attempt in range(3):
-        resp = requests.request(method, url, json=json)
-        if resp.status_code == 429:
-            wait_time = 2 ** attempt
-            logger.info(f"[Worker] 429 received. Backing off for {wait_time}s")
-            time.sleep(wait_time)
+    _, q_instance = get_app()
+    plan.record(q_instance.connection if q_instance else None)
+    logger.info(
+        f'[Worker] Card {card_id} copied to {new_card_id} in list {enquiry_in_list_id} '
+        f'(label: {label_id or "none"}) with {progress["calls"]} Trello calls.'
+    )
+
+def dead_letter_event(event, setting, progress, reason):
+    """Keep an event whose copy failed for good so it can be replayed later (replay_dead_letters.py)"""
+    progress['failed'] = reason
+    queue = get_dead_letters()
+    if queue is None:
+        return None
+    return queue.record(
+        event, reason,
+        attempts=progress.get('attempts', 0) + 1,
+        setting_id=setting.get('id'),
+        setting={k: v for k, v in setting.items() if k != 'trello_event'},
+        progress=progress,
+    )
+
+def dead_letter_job(func_name, args, reason):
+    """Dead-letter a copy job from its function name and args (for jobs that raised or gave up)"""
+    name = func_name.rsplit('.', 1)[-1]
+    if name not in ('process_trello_event_ref', 'process_trello_event'):
+        return None
+    app_instance, q_instance = get_app()
+    with app_instance.app_context():
+        if name == 'process_trello_event_ref':
+            event_key, setting_id, *rest = args
+            event = EventStore(q_instance.connection).load(event_key) if q_instance else None
+            setting, _ = get_job_context_loader().load_setting(setting_id)
+            setting = setting or {'id': setting_id}
         else:
-            return resp
-    logger.error("[Worker] Failed after retries")
-    return None
+            payload, *rest = args
+            event = TrelloEvent.from_payload(payload.get('trello_event', {}))
+            setting = payload
+        progress = rest[0] if rest and rest[0] else {}
+        return dead_letter_event(event, setting, progress, reason)
 
-def handle_mentioned(payload):
+def dead_letter_exception(job, exc_type, exc_value, tb):
+    """RQ exception handler: dead-letter copy jobs that raised, with the progress they made"""
+    running_id, running_args = getattr(_running, 'job', (None, None))
+    # The handler runs on the job's thread; the job's own args hold its progress as of the enqueue
+    args = running_args if running_id == job.id else job.args
+    try:
+        dead_letter_job(job.func_name, args, f'{exc_type.__name__}: {exc_value}')
+    except Exception as e:
+        logger.error(f'[Worker] Could not dead-letter failed job {job.id}: {e}')
+    # Fall through to RQ's default handler, which moves the job to the failed registry
+    return True
+
+def replay_dead_letter(entry):
+    """Run a dead-lettered event again in this process.
+
+    Trello calls wait on the shared rate limiter instead of deferring, and the
+    stored progress is resumed so an already-copied card is not copied again.
+    The caller has taken the entry off the queue. Returns True if the event was
+    handled; otherwise it is back in the queue, dead-lettered anew after a
+    second failure or restored as it was when it can't be replayed.
+    """
+    app_instance, q_instance = get_app()
+    with app_instance.app_context():
+        if not entry.get('event'):
+            logger.error(f"[Replay] Entry {entry['id']} has no event (it expired before the failure), keeping it")
+            get_dead_letters().restore(entry)
+            return False
+        event = TrelloEvent.from_dict(entry['event'])
+        context = None
+        if entry.get('setting_id') is not None:
+            setting, context = get_job_context_loader().load_setting(entry['setting_id'])
+            if not setting:
+                logger.info(f"[Replay] Webhook setting {entry['setting_id']} no longer exists, skipping")
+                return True
+        else:
+            setting = entry.get('setting') or {}
+        progress = dict(entry.get('progress') or {}, attempts=entry.get('attempts', 1))
+        progress.pop('failed', None)
+        try:
+            _process_event(event, setting, progress, context)
+        except Exception as e:
+            logger.error(f"[Replay] Event {event.action_id} failed again: {e}")
+            dead_letter_event(event, setting, progress, f'{type(e).__name__}: {e}')
+            return False
+        return 'failed' not in progress
+
+def remember_label_id(setting_id, label_id, label_name):
+    """Store a label id resolved by name so later events skip the labels fetch"""
+    setting = WebhookSetting.query.get(setting_id)
+    if setting and not setting.label_id:
+        setting.label_id = label_id
+        setting.label_name = setting.label_name or label_name
+        db.session.commit()
+        logger.info(f'[Worker] Stored label id {label_id} for webhook setting {setting_id}')
+        # Other workers cached the setting without the id
+        get_job_context_loader().invalidate()
+
+def call_trello_api(method, path, auth=None, params=None, json=None):
+    """Generic Trello call through the shared pooled client"""
+    return get_trello_client().request(method, path, auth, params=params, json=json)
+
+def handle_mentioned(payload, auth=None):
     # Trello API call
     card_id = payload['action']['data']['card']['id']
-    url = f"https://api.trello.com/1/cards/{card_id}/actions"
-    return call_trello_api("GET", url)
+    return get_trello_client().get_card_actions(auth, card_id)
 
-def handle_added(payload):
+def handle_added(payload, auth=None):
     card_id = payload['action']['data']['card']['id']
-    url = f"https://api.trello.com/1/cards/{card_id}"
-    return call_trello_api("GET", url)
-
-def get_trello_username(api_key, token):
-    url = f"https://api.trello.com/1/members/me?key={api_key}&token={token}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json().get("username")
-    else:
-        logger.error(f"Failed to fetch Trello username: {response.text}")
+    return get_trello_client().get_card(auth, card_id)
+
+def fetch_trello_member(api_key, token):
+    return get_trello_client().get_member(TrelloAuth(api_key, token))
+
+def get_trello_username(user):
+    """Trello username for a User, served from the identity cache when possible"""
+    cache = get_identity_cache()
+    if cache is None:
+        resp = fetch_trello_member(user.apiKey, user.token)
+        if resp is not None and resp.status_code == 200:
+            return resp.json().get("username")
+        logger.error(f"Failed to fetch Trello username: {resp.text if resp is not None else 'no response'}")
         return None
+    identity = cache.get(user)
+    if identity and not user.trello_username:
+        # cache.get stored a freshly fetched identity on the User row
+        get_job_context_loader().update_identity(user.email, identity)
+    return identity.username if identity else None
+
+def invalidate_trello_identity(user):
+    cache = get_identity_cache()
+    if cache is not None:
+        cache.invalidate(user.email)
+    IdentityCache.store_on_user(user, None)
+    get_job_context_loader().invalidate(user.email)
@@ -0,0 +1,171 @@
+# backend/trello_batch.py
+
+import json
+import logging
+import threading
+from urllib.parse import quote
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Trello accepts at most this many URLs per /1/batch request
+MAX_BATCH_URLS = 10
+
+
+class BatchResponse:
+    """One sub-response of a /1/batch call, shaped like the requests.Response callers expect"""
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self._body if isinstance(self._body, str) else json.dumps(self._body)
+
+    def json(self):
+        return self._body
+
+
+def split_batch_item(item):
+    """(status, body) from one /1/batch result.
+
+    Successes come as {"<status>": body}; a failed URL is the error itself,
+    e.g. {"name": "...", "message": "...", "statusCode": 404}, so its status is
+    read from there. Anything else maps to 500.
+    """
+    if isinstance(item, dict) and len(item) == 1:
+        status, body = next(iter(item.items()))
+        if str(status).isdigit():
+            return int(status), body
+    if isinstance(item, dict):
+        for field in ('statusCode', 'status'):
+            status = item.get(field)
+            if isinstance(status, int) or (isinstance(status, str) and status.isdigit()):
+                return int(status), item
+    return 500, item
+
+
+def batch_url(path, params=None):
+    """One entry of the /1/batch `urls` list, its query values encoded exactly once.
+
+    Its own `&` separators are encoded too, so they don't end the `urls`
+    parameter; literal commas never appear, since they separate the entries.
+    """
+    if not params:
+        return quote(path, safe='/')
+    query = '%26'.join(f"{quote(str(k), safe='')}={quote(str(v), safe='')}" for k, v in params.items())
+    return f"{quote(path, safe='/')}?{query}"
+
+
+class _PendingBatch:
+    def __init__(self):
+        self.calls = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.responses = None
+        self.error = None
+
+
+class TrelloBatcher:
+    """Folds concurrent Trello GETs for the same credentials into /1/batch calls.
+
+    A GET with nothing else in flight for its credentials goes straight out,
+    so a lone caller (e.g. a web request) never waits. One that arrives while
+    another is in flight opens a batch and waits up to `window` seconds (or
+    until ten GETs have joined) for others to join, then sends them all as one
+    request through the client, so through its rate limiter, and hands each
+    caller its own sub-response. A batch of one goes out as a plain GET. Callers inside the client's deferring() block batch
+    separately from those outside it, since a throttled batch raises in every
+    caller.
+    """
+
+    def __init__(self, client, window=0.01):
+        self.client = client
+        self.window = window
+        self.pending = {}
+        self.in_flight = {}
+        self.counts = {'batches': 0, 'batched_calls': 0, 'single_calls': 0}
+        self.lock = threading.Lock()
+
+    def get(self, auth, path, params=None):
+        group = (auth.api_key, auth.token, self.client.is_deferring())
+        with self.lock:
+            concurrent = self.in_flight.get(group, 0)
+            self.in_flight[group] = concurrent + 1
+        try:
+            if not concurrent:
+                resp = self.client.request('GET', path, auth, params=params)
+                self._count(single_calls=1)
+                return resp
+            return self._get_batched(group, auth, path, params)
+        finally:
+            with self.lock:
+                self.in_flight[group] -= 1
+                if not self.in_flight[group]:
+                    del self.in_flight[group]
+
+    def _get_batched(self, group, auth, path, params):
+        with self.lock:
+            batch = self.pending.get(group)
+            leader = batch is None
+            if leader:
+                batch = self.pending[group] = _PendingBatch()
+            index = len(batch.calls)
+            batch.calls.append((path, params))
+            if len(batch.calls) >= MAX_BATCH_URLS:
+                # Closed: the next GET opens a new batch
+                del self.pending[group]
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.window)
+            with self.lock:
+                if self.pending.get(group) is batch:
+                    del self.pending[group]
+            self._send(auth, batch)
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return batch.responses[index]
+
+    def _send(self, auth, batch):
+        try:
+            if len(batch.calls) == 1:
+                path, params = batch.calls[0]
+                batch.responses = [self.client.request('GET', path, auth, params=params)]
+                self._count(single_calls=1)
+                return
+            urls = [batch_url(path, params) for path, params in batch.calls]
+            # The query string is final: handing `urls` to params would encode every value a second time
+            resp = self.client.request('GET', f"/batch?urls={','.join(urls)}", auth)
+            self._count(batches=1, batched_calls=len(urls))
+            if resp is None or resp.status_code != 200:
+                # The whole batch failed; every caller sees that response
+                batch.responses = [resp] * len(urls)
+                return
+            items = resp.json()
+            if not isinstance(items, list) or len(items) != len(urls):
+                logger.error(f"[TrelloBatch] Batch of {len(urls)} GETs returned {len(items) if isinstance(items, list) else 'no'} results")
+                batch.responses = [None] * len(urls)
+                return
+            batch.responses = [BatchResponse(*split_batch_item(item)) for item in items]
+            logger.debug(f"[TrelloBatch] Sent {len(urls)} GETs in one batch")
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+
+    def _count(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        requests = counts['batches'] + counts['single_calls']
+        gets = counts['batched_calls'] + counts['single_calls']
+        counts['round_trips_saved'] = gets - requests
+        return counts
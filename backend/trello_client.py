@@ -0,0 +1,209 @@
+# backend/trello_client.py
+
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+import requests
+from redis import Redis
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app_factory import get_redis_url
+from rate_limit import RedisTokenBucketLimiter, TrelloThrottled, parse_retry_after
+from trello_batch import TrelloBatcher
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TRELLO_API_BASE = 'https://api.trello.com/1'
+
+# Credentials for one Trello account; sent as query params, never baked into URLs
+TrelloAuth = namedtuple('TrelloAuth', ['api_key', 'token'])
+
+
+class TrelloClient:
+    """Pooled, throttled Trello REST client.
+
+    One instance per process owns a keep-alive requests.Session, so repeated
+    calls reuse TLS connections. Every call goes through the rate limiter, has a
+    timeout, retries connection errors and 5xx on idempotent methods, and backs
+    off on 429. Methods return the requests.Response, or None if Trello could not
+    be reached or kept answering 429.
+
+    Inside `deferring()` nothing sleeps: a throttled call raises TrelloThrottled
+    so the job can be rescheduled and the worker moves on to other work.
+
+    With a `batcher`, the read calls for lists, labels and members that run
+    concurrently for the same credentials share /1/batch requests.
+    """
+
+    def __init__(self, pool_size=10, timeout=(5, 15), retries=3, max_429_attempts=3, rate_limiter=None):
+        self.timeout = timeout
+        self.max_429_attempts = max_429_attempts
+        self.rate_limiter = rate_limiter
+        self.batcher = None
+        self.local = threading.local()
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'PUT', 'DELETE']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @contextmanager
+    def deferring(self):
+        """Raise TrelloThrottled from calls in this block (this thread only) instead of sleeping"""
+        previous = getattr(self.local, 'defer', False)
+        self.local.defer = True
+        try:
+            yield self
+        finally:
+            self.local.defer = previous
+
+    def is_deferring(self):
+        return getattr(self.local, 'defer', False)
+
+    def request(self, method, path, auth=None, params=None, json=None, data=None):
+        url = path if path.startswith('http') else f"{TRELLO_API_BASE}{path}"
+        params = dict(params or {})
+        if auth:
+            params['key'] = auth.api_key
+            params['token'] = auth.token
+        defer = self.is_deferring()
+        for attempt in range(self.max_429_attempts):
+            if self.rate_limiter:
+                if defer:
+                    wait_time = self.rate_limiter.acquire(auth)
+                    if wait_time > 0:
+                        raise TrelloThrottled(wait_time)
+                else:
+                    self.rate_limiter.wait(auth)
+            try:
+                resp = self.session.request(
+                    method, url, params=params, json=json, data=data, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                logger.error(f"[TrelloClient] {method} {path} failed: {e}")
+                return None
+            retry_after = parse_retry_after(resp.headers) if resp.status_code == 429 else None
+            if self.rate_limiter:
+                self.rate_limiter.observe(auth, resp.headers, retry_after)
+            if resp.status_code != 429:
+                return resp
+            if defer:
+                raise TrelloThrottled(retry_after, status=429)
+            # Trello says exactly how long to wait; fall back to exponential backoff
+            wait_time = retry_after if retry_after is not None else 2 ** attempt
+            logger.info(f"[TrelloClient] 429 received. Backing off for {wait_time}s")
+            time.sleep(wait_time)
+        logger.error("[TrelloClient] Failed after retries")
+        return None
+
+    def get(self, path, auth=None, params=None):
+        """A GET that may share a /1/batch request with concurrent GETs for the same credentials"""
+        if self.batcher is not None and auth is not None and auth.token:
+            return self.batcher.get(auth, path, params)
+        return self.request('GET', path, auth, params=params)
+
+    # Members
+    def get_member(self, auth, member='me'):
+        return self.get(f"/members/{member}", auth)
+
+    def get_member_boards(self, auth, member='me', params=None):
+        return self.request('GET', f"/members/{member}/boards", auth, params=params)
+
+    # Boards
+    def create_board(self, auth, name, default_lists=False):
+        return self.request('POST', '/boards/', auth, params={
+            'name': name, 'defaultLists': 'true' if default_lists else 'false'
+        })
+
+    def get_board_lists(self, auth, board_id):
+        return self.get(f"/boards/{board_id}/lists", auth)
+
+    def get_board_labels(self, auth, board_id):
+        return self.get(f"/boards/{board_id}/labels", auth)
+
+    # Lists
+    def create_list(self, auth, board_id, name, pos=None):
+        params = {'name': name, 'idBoard': board_id}
+        if pos is not None:
+            params['pos'] = pos
+        return self.request('POST', '/lists', auth, params=params)
+
+    # Cards
+    def get_card(self, auth, card_id):
+        return self.request('GET', f"/cards/{card_id}", auth)
+
+    def get_card_actions(self, auth, card_id):
+        return self.request('GET', f"/cards/{card_id}/actions", auth)
+
+    def copy_card(self, auth, source_card_id, list_id, label_ids=None):
+        params = {'idCardSource': source_card_id, 'idList': list_id}
+        if label_ids:
+            # Applied as part of the create, saving a separate idLabels call
+            params['idLabels'] = ','.join(label_ids)
+        return self.request('POST', '/cards', auth, params=params)
+
+    def add_attachment(self, auth, card_id, url, name):
+        return self.request('POST', f"/cards/{card_id}/attachments", auth, json={'url': url, 'name': name})
+
+    def add_label(self, auth, card_id, label_id):
+        return self.request('POST', f"/cards/{card_id}/idLabels", auth, json={'value': label_id})
+
+    # Webhooks
+    def create_webhook(self, auth, callback_url, model_id, description=''):
+        return self.request('POST', '/webhooks', auth, data={
+            'callbackURL': callback_url, 'idModel': model_id, 'description': description
+        })
+
+    def get_token_webhooks(self, auth):
+        return self.request('GET', f"/tokens/{auth.token}/webhooks", TrelloAuth(auth.api_key, None))
+
+    def delete_webhook(self, auth, webhook_id):
+        return self.request('DELETE', f"/webhooks/{webhook_id}", auth)
+
+
+_client = None
+_client_pid = None
+
+def build_rate_limiter():
+    """Redis token buckets shared by every process, per Trello API key and token"""
+    redis_conn = Redis.from_url(get_redis_url(), socket_connect_timeout=5, socket_timeout=5)
+    return RedisTokenBucketLimiter(
+        redis_conn,
+        key_limit=int(os.environ.get('TRELLO_KEY_RATE_LIMIT', '300')),
+        token_limit=int(os.environ.get('TRELLO_TOKEN_RATE_LIMIT', '100')),
+        per_seconds=int(os.environ.get('TRELLO_RATE_LIMIT_WINDOW', '10')),
+    )
+
+_client_lock = threading.Lock()
+
+def get_trello_client():
+    """The TrelloClient for this process (rebuilt after a fork so pools aren't shared)"""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = TrelloClient(
+                    pool_size=int(os.environ.get('TRELLO_POOL_SIZE', '10')),
+                    timeout=(
+                        float(os.environ.get('TRELLO_CONNECT_TIMEOUT', '5')),
+                        float(os.environ.get('TRELLO_READ_TIMEOUT', '15')),
+                    ),
+                    retries=int(os.environ.get('TRELLO_RETRIES', '3')),
+                    rate_limiter=build_rate_limiter(),
+                )
+                # Milliseconds a read waits for others to share its /1/batch request (0 = off)
+                batch_window = float(os.environ.get('TRELLO_BATCH_WINDOW_MS', '10')) / 1000
+                if batch_window > 0:
+                    _client.batcher = TrelloBatcher(_client, window=batch_window)
+                _client_pid = os.getpid()
+    return _client
@@ -1,16 +1,61 @@
 import os
 import sys
 from redis import Redis
-from rq import Worker, Queue, Connection
+from rq import Queue
 
 # Ensure the backend directory is in the Python path
 sys.path.append(os.path.dirname(__file__))
 
+from app_factory import get_redis_url
+from serializers import get_rq_serializer
+
 listen = ['trello-events']  # The queue(s) to listen to
 
-redis_conn = Redis()
+# warm: run jobs in this process, reusing the app, DB pool and connections (default)
+# fork: the classic rq worker, a fresh child process per job
+mode = os.environ.get('WORKER_MODE', 'warm').lower()
+# Jobs run concurrently on this many threads (warm mode only)
+concurrency = int(os.environ.get('WORKER_CONCURRENCY', '1'))
+# Restart the process after this many jobs (0 = never); let the supervisor bring it back
+max_jobs = int(os.environ.get('WORKER_MAX_JOBS', '0')) or None
+
+redis_conn = Redis.from_url(get_redis_url())
 
 if __name__ == '__main__':
-    with Connection(redis_conn):
-        worker = Worker(list(map(Queue, listen)))
-        worker.work()
\ No newline at end of file
+    serializer = get_rq_serializer()
+    queues = [Queue(name, connection=redis_conn, serializer=serializer) for name in listen]
+    import tasks
+    # Jobs that raise are kept in the dead-letter queue for replay (replay_dead_letters.py)
+    exception_handlers = [tasks.dead_letter_exception]
+    from workers import ForkWorker, WarmWorker, ThreadedWorkerPool
+    from fair_queue import DeficitRoundRobin, build_fair_queues
+    fair_queues = build_fair_queues(queues[0])
+    # Take turns between tenant sub-queues (FAIR_QUEUE_TENANT); each worker keeps its own turn order.
+    # Existing tenant queues are still drained after fairness is switched off.
+    fair_factory = (lambda: DeficitRoundRobin(fair_queues)) if fair_queues.enabled or fair_queues.tenants() else None
+    if mode == 'fork':
+        worker = ForkWorker(
+            queues, connection=redis_conn, serializer=serializer, exception_handlers=exception_handlers,
+            fair=fair_factory() if fair_factory else None
+        )
+        # The scheduler promotes jobs deferred with enqueue_in (e.g. throttled Trello calls)
+        worker.work(with_scheduler=True, max_jobs=max_jobs)
+        sys.exit(0)
+
+    # Let every thread hold its own keep-alive connection to Trello
+    os.environ.setdefault('TRELLO_POOL_SIZE', str(max(concurrency, 10)))
+    # Build the app once, before any job (or thread) needs it
+    tasks.warm_up()
+    if concurrency > 1:
+        pool = ThreadedWorkerPool(
+            queues, connection=redis_conn, serializer=serializer,
+            concurrency=concurrency, on_job_failure=tasks.recover_after_failure, fair_factory=fair_factory,
+            exception_handlers=exception_handlers
+        )
+        pool.work(with_scheduler=True, max_jobs=max_jobs)
+    else:
+        worker = WarmWorker(
+            queues, connection=redis_conn, serializer=serializer, on_job_failure=tasks.recover_after_failure,
+            fair=fair_factory() if fair_factory else None, exception_handlers=exception_handlers
+        )
+        worker.work(with_scheduler=True, max_jobs=max_jobs)
@@ -0,0 +1,176 @@
+# backend/workers.py
+
+import sys
+import signal
+import logging
+import threading
+from rq import SimpleWorker, Worker
+from rq.worker import WorkerStatus
+from rq.timeouts import TimerDeathPenalty
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class FairDequeueMixin:
+    """With `fair` (a fair_queue.DeficitRoundRobin) an RQ worker also listens on
+    every tenant sub-queue and takes turns between them"""
+
+    fair = None
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        if self.fair is None:
+            return super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        while True:
+            self.fair.refresh(self)
+            # New tenant queues are only seen between waits, so never block longer than a refresh
+            wait = None if timeout is None else min(timeout, self.fair.refresh_interval)
+            result = super().dequeue_job_and_maintain_ttl(wait, max_idle_time=wait)
+            if result is not None:
+                job, queue = result
+                self.fair.fair_queues.record_wait(queue, job)
+                return result
+            if timeout is None or self._stop_requested:
+                return None
+
+    def reorder_queues(self, reference_queue):
+        if self.fair is None:
+            return super().reorder_queues(reference_queue)
+        self.fair.on_dequeued(self, reference_queue)
+
+
+class ForkWorker(FairDequeueMixin, Worker):
+    """The classic rq worker, a fresh child process per job, serving tenant sub-queues too"""
+
+    def __init__(self, *args, fair=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fair = fair
+
+
+class WarmWorker(FairDequeueMixin, SimpleWorker):
+    """RQ worker that keeps the process warm: jobs run in-process, one at a time.
+
+    The default Worker forks a child per job, so everything a job sets up (the
+    Flask app, the DB engine pool, Redis and Trello connections) is thrown away
+    with the child. Here that setup happens once and is reused by every job.
+
+    Each job runs behind a crash boundary: anything escaping RQ's own job
+    handling marks that job failed instead of killing the worker, and after any
+    failed job `on_job_failure(job)` gets a chance to reset shared state (e.g.
+    a poisoned DB connection) before the next job.
+    """
+
+    def __init__(self, *args, on_job_failure=None, fair=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_job_failure = on_job_failure
+        self.fair = fair
+
+    def execute_job(self, job, queue):
+        succeeded = False
+        try:
+            self.prepare_execution(job)
+            succeeded = self.perform_job(job, queue)
+        except Exception as e:
+            logger.exception(f"[Worker] Job {job.id} crashed outside its own error handling")
+            try:
+                self.handle_job_failure(job, queue, exc_string=repr(e))
+                # Give the exception handlers (e.g. the dead-letter queue) their turn
+                self.handle_exception(job, *sys.exc_info())
+            except Exception:
+                logger.exception(f"[Worker] Could not mark job {job.id} as failed")
+        finally:
+            self.set_state(WorkerStatus.IDLE)
+        if not succeeded and self.on_job_failure:
+            try:
+                self.on_job_failure(job)
+            except Exception:
+                logger.exception("[Worker] Recovery after a failed job raised")
+        return succeeded
+
+
+class ThreadWorker(WarmWorker):
+    """RQ worker that runs jobs in its own thread of a ThreadedWorkerPool.
+
+    Jobs execute in-thread like WarmWorker, so RQ still handles registries,
+    failures and retries per job. Job timeouts use a timer instead of SIGALRM
+    (signals only reach the main thread), and the idle wait wakes up every
+    `poll_interval` seconds to notice a stop request.
+    """
+
+    death_penalty_class = TimerDeathPenalty
+    poll_interval = 5
+
+    def _install_signal_handlers(self):
+        # The pool's main thread owns SIGINT/SIGTERM
+        pass
+
+    def request_stop_soon(self):
+        """Finish the current job (if any), then leave the work loop"""
+        self._stop_requested = True
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        if timeout is None:
+            # Burst mode never blocks
+            return super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        while not self._stop_requested:
+            wait = min(timeout, self.poll_interval)
+            result = super().dequeue_job_and_maintain_ttl(wait, max_idle_time=wait)
+            if result is not None:
+                return result
+        return None
+
+
+class ThreadedWorkerPool:
+    """Runs `concurrency` ThreadWorkers in one process on the same queues.
+
+    Trello jobs spend nearly all their time waiting on HTTP, so threads keep
+    several in flight per process. Each job opens its own app context, which
+    gives it its own SQLAlchemy session; Trello calls still go through the
+    shared Redis rate limiter. SIGINT/SIGTERM stop the pool after running jobs
+    finish; a second signal exits immediately.
+    """
+
+    def __init__(self, queues, connection, serializer=None, concurrency=4, on_job_failure=None, fair_factory=None,
+                 exception_handlers=None):
+        self.concurrency = concurrency
+        self.workers = [
+            ThreadWorker(
+                queues, connection=connection, serializer=serializer, on_job_failure=on_job_failure,
+                fair=fair_factory() if fair_factory else None, exception_handlers=exception_handlers
+            )
+            for _ in range(concurrency)
+        ]
+        self.threads = []
+        self.stopping = False
+
+    def request_stop(self, signum, frame):
+        if self.stopping:
+            logger.warning("[WorkerPool] Second stop signal, exiting without waiting for jobs")
+            raise SystemExit(1)
+        self.stopping = True
+        logger.info(f"[WorkerPool] Stopping {self.concurrency} workers after their current jobs")
+        for worker in self.workers:
+            worker.request_stop_soon()
+
+    def work(self, with_scheduler=False, max_jobs=None, burst=False):
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        for i, worker in enumerate(self.workers):
+            thread = threading.Thread(
+                target=worker.work,
+                # One scheduler per pool is enough to promote deferred jobs
+                kwargs={'with_scheduler': with_scheduler and i == 0, 'max_jobs': max_jobs, 'burst': burst},
+                name=f"rq-{worker.name}",
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"[WorkerPool] Started {self.concurrency} worker threads")
+        # Join with a timeout so the main thread keeps receiving signals
+        while any(thread.is_alive() for thread in self.threads):
+            for thread in self.threads:
+                thread.join(timeout=0.5)
+            if not self.stopping and not burst and not all(thread.is_alive() for thread in self.threads):
+                logger.warning("[WorkerPool] A worker thread stopped (max jobs or error), stopping the pool")
+                self.request_stop(None, None)
+        logger.info("[WorkerPool] All worker threads stopped")
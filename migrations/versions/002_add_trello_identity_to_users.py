@@ -0,0 +1,27 @@
+"""Store the linked Trello member id and username on users
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Trello identity resolved when the account is linked
+    op.add_column('users', sa.Column('trello_member_id', sa.String(), nullable=True))
+    op.add_column('users', sa.Column('trello_username', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('users', 'trello_username')
+    op.drop_column('users', 'trello_member_id')
@@ -0,0 +1,24 @@
+"""Index user_boards.user_email for the per-job context lookup
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Workers join users to their board on every job context miss
+    op.create_index('ix_user_boards_user_email', 'user_boards', ['user_email'])
+
+
+def downgrade():
+    op.drop_index('ix_user_boards_user_email', table_name='user_boards')
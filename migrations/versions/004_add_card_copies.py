@@ -0,0 +1,36 @@
+"""Add the card_copies ledger
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per (user, source card): the unique constraint is what makes a copy claim atomic
+    op.create_table('card_copies',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_email', sa.String(), nullable=False),
+        sa.Column('source_card_id', sa.String(), nullable=False),
+        sa.Column('new_card_id', sa.String(), nullable=True),
+        sa.Column('claim_token', sa.String(), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=False),
+        sa.Column('copied_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_email'], ['users.email'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_email', 'source_card_id', name='_user_source_card_uc')
+    )
+
+
+def downgrade():
+    op.drop_table('card_copies')
@@ -0,0 +1,24 @@
+"""Index webhook_settings by (user_email, id) for keyset pagination
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GET /api/webhook-settings pages through one user's settings in id order
+    op.create_index('ix_webhook_settings_user_email_id', 'webhook_settings', ['user_email', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_webhook_settings_user_email_id', table_name='webhook_settings')
@@ -0,0 +1,51 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other as top-level modules (`from db import db`)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+os.environ.setdefault('SECRET_KEY', 'test')
+
+
+@pytest.fixture
+def redis_conn():
+    fakeredis = pytest.importorskip('fakeredis')
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The backend's app.py, on a throwaway SQLite file and an in-memory Redis"""
+    fakeredis = pytest.importorskip('fakeredis')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('db') / 'app.db'}"
+    import app_factory
+    # Every Redis.from_url() for the same URL shares one fake server
+    app_factory.Redis = fakeredis.FakeRedis
+    import app
+    return app
+
+
+@pytest.fixture
+def app_env(app_module):
+    """app.py with empty tables and an empty Redis"""
+    from db import db
+    app_module.q.connection.flushall()
+    with app_module.app.app_context():
+        db.drop_all()
+        db.create_all()
+    app_module.subscription_index.invalidate()
+    return app_module
+
+
+@pytest.fixture
+def client(app_env):
+    return app_env.app.test_client()
+
+
+def login(client, email):
+    with client.session_transaction() as session:
+        session['_user_id'] = email
+        session['_fresh'] = True
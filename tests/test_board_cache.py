@@ -0,0 +1,73 @@
+# tests/test_board_cache.py
+
+import tasks
+from board_cache import BoardMetadataCache
+from conftest import login
+from db import User, db
+from test_coalesce import CONTEXT, EVENT, setting, trello  # noqa: F401 (fixture)
+
+
+class LabelsResponse:
+    status_code = 200
+
+    def __init__(self, labels):
+        self.labels = labels
+
+    def json(self):
+        return list(self.labels)
+
+
+class FakeTrello:
+    def __init__(self, labels):
+        self.labels = labels
+        self.calls = 0
+
+    def get_board_labels(self, auth, board_id):
+        self.calls += 1
+        return LabelsResponse(self.labels)
+
+    get_board_lists = get_board_labels
+
+
+def test_list_moves_invalidate_cached_lists(redis_conn):
+    cache = BoardMetadataCache(redis_conn, check_interval=0)
+    fake = FakeTrello([{'id': 'L1', 'name': 'Inbox'}])
+    cache.lists(fake, None, 'B1')
+
+    for action in ('moveListToBoard', 'moveListFromBoard'):
+        assert cache.invalidate_for_action(action, 'B1')
+        cache.lists(fake, None, 'B1')
+
+    assert fake.calls == 3
+
+
+def test_new_label_is_accepted_despite_stale_cache(app_env, client, monkeypatch):
+    with app_env.app.app_context():
+        db.session.add(User(email='a@example.com', apiKey='k', token='t', linked_board_id='B1'))
+        db.session.commit()
+    fake = FakeTrello([{'id': 'L1', 'name': 'Urgent'}])
+    monkeypatch.setattr(app_env, 'get_trello_client', lambda: fake)
+    login(client, 'a@example.com')
+    assert client.get('/api/trello/labels').status_code == 200
+
+    # Created on Trello after the labels were cached
+    fake.labels.append({'id': 'L2', 'name': 'Later'})
+    resp = client.post('/api/webhook-settings', json={'webhook_id': 'W1', 'board_id': 'B0', 'label_id': 'L2'})
+    assert resp.status_code == 201
+
+    resp = client.post('/api/webhook-settings', json={'webhook_id': 'W1', 'board_id': 'B0', 'label_id': 'L9'})
+    assert resp.status_code == 400
+    assert fake.calls == 3
+
+
+def test_rejected_label_invalidates_target_board_labels(trello, app_env, monkeypatch):  # noqa: F811
+    cache = BoardMetadataCache(app_env.q.connection, check_interval=0)
+    cache.put_many('labels', {'UB1': [{'id': 'GONE', 'name': 'Urgent'}]})
+    monkeypatch.setattr(tasks, 'get_board_cache', lambda: cache)
+    # Deleted on the target board, which has no webhook of ours
+    trello.deleted_labels.add('GONE')
+
+    tasks._process_event(EVENT, setting(1, 'GONE'), {}, CONTEXT)
+
+    assert [call[0] for call in trello.calls] == ['copy', 'copy', 'attach', 'label']
+    assert cache.get('labels', 'UB1', lambda: None) is None
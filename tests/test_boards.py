@@ -0,0 +1,57 @@
+# tests/test_boards.py
+
+import threading
+
+from boards import fetch_boards_with_lists
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeTrello:
+    def __init__(self, count):
+        self.boards = [f'B{i}' for i in range(count)]
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _lists(self, board_id):
+        return [{'id': f'{board_id}-L', 'name': 'Inbox'}]
+
+    def get_member_boards(self, auth, params=None):
+        self.calls.append(('boards', params.get('lists')))
+        return Response([
+            {'id': board_id, 'name': board_id, **({'lists': self._lists(board_id)} if params.get('lists') else {})}
+            for board_id in self.boards
+        ])
+
+    def get_board_lists(self, auth, board_id):
+        with self.lock:
+            self.calls.append(('lists', board_id))
+        return Response(self._lists(board_id))
+
+
+def test_page_fetches_lists_only_for_its_boards():
+    trello = FakeTrello(5)
+
+    boards, total, error = fetch_boards_with_lists(trello, None, offset=2, limit=2)
+
+    assert (total, error) == (5, None)
+    assert boards == [{'id': 'B2', 'name': 'B2', 'lists': ['Inbox']}, {'id': 'B3', 'name': 'B3', 'lists': ['Inbox']}]
+    assert trello.calls[0] == ('boards', None)
+    assert sorted(trello.calls[1:]) == [('lists', 'B2'), ('lists', 'B3')]
+
+
+def test_all_boards_come_with_nested_lists_in_one_request():
+    trello = FakeTrello(5)
+
+    boards, total, _ = fetch_boards_with_lists(trello, None)
+
+    assert total == 5 and len(boards) == 5
+    assert trello.calls == [('boards', 'open')]
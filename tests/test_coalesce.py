@@ -0,0 +1,112 @@
+# tests/test_coalesce.py
+
+import pytest
+
+import tasks
+from coalesce import CardCoalescer, CopyInProgress
+from events import TrelloEvent
+from job_context import JobContext
+from ledger import CardCopyLedger
+from rate_limit import TrelloThrottled
+
+
+class Response:
+    def __init__(self, body=None, status_code=200):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+
+class FakeTrello:
+    def __init__(self):
+        self.calls = []
+        self.throttle_copies = 0
+        self.deleted_labels = set()
+
+    def is_deferring(self):
+        return False
+
+    def copy_card(self, auth, source_card_id, list_id, label_ids=None):
+        if self.throttle_copies:
+            self.throttle_copies -= 1
+            raise TrelloThrottled(30)
+        self.calls.append(('copy', source_card_id, label_ids))
+        if label_ids and self.deleted_labels.intersection(label_ids):
+            return Response(status_code=400)
+        return Response({'id': 'NEW1'})
+
+    def add_attachment(self, auth, card_id, url, name):
+        self.calls.append(('attach', card_id))
+        return Response()
+
+    def add_label(self, auth, card_id, label_id):
+        self.calls.append(('label', card_id, label_id))
+        return Response(status_code=400 if label_id in self.deleted_labels else 200)
+
+
+CONTEXT = JobContext('bob@example.com', 'key', 'token', 'M1', 'bob', 'UB1', 'L-enquiry')
+EVENT = TrelloEvent(action_type='commentCard', webhook_id='W1', board_id='B1',
+                    card_id='C1', card_name='Card', comment_text='hi @bob')
+
+
+def setting(setting_id, label_id=None):
+    return {'id': setting_id, 'user_email': 'bob@example.com', 'board_name': 'Board',
+            'event_type': 'Mentioned in a card', 'label_id': label_id}
+
+
+@pytest.fixture
+def trello(app_env, monkeypatch):
+    client = FakeTrello()
+    coalescer = CardCoalescer(app_env.q.connection, window=5)
+    monkeypatch.setattr(tasks, 'get_app', lambda: (app_env.app, app_env.q))
+    monkeypatch.setattr(tasks, 'get_trello_client', lambda: client)
+    monkeypatch.setattr(tasks, 'get_coalescer', lambda: coalescer)
+    monkeypatch.setattr(tasks, 'get_card_ledger', lambda: CardCopyLedger())
+    monkeypatch.setattr(tasks, 'get_board_cache', lambda: None)
+    monkeypatch.setattr(tasks, 'get_username_directory', lambda: None)
+    monkeypatch.setattr(tasks, 'get_trello_username', lambda user: 'bob')
+    with app_env.app.app_context():
+        yield client
+
+
+def test_second_setting_label_is_merged_into_the_copy(trello, app_env):
+    tasks._process_event(EVENT, setting(1, 'LBL-A'), {}, CONTEXT)
+    progress = {}
+
+    # Same card inside the coalescing window, for a setting with another label
+    with pytest.raises(CopyInProgress):
+        tasks._process_event(EVENT, setting(2, 'LBL-B'), progress, CONTEXT)
+    # The deferred job runs again once the window has passed
+    app_env.q.connection.delete('trello:coalesce:bob@example.com:C1')
+    tasks._process_event(EVENT, setting(2, 'LBL-B'), progress, CONTEXT)
+
+    assert trello.calls == [
+        ('copy', 'C1', ['LBL-A']),
+        ('attach', 'NEW1'),
+        ('label', 'NEW1', 'LBL-B'),
+    ]
+
+
+def test_setting_without_label_is_collapsed(trello):
+    tasks._process_event(EVENT, setting(1, 'LBL-A'), {}, CONTEXT)
+
+    tasks._process_event(EVENT, setting(2), {}, CONTEXT)
+
+    assert [call[0] for call in trello.calls] == ['copy', 'attach']
+
+
+def test_owner_deferred_past_the_window_still_copies(trello, app_env):
+    trello.throttle_copies = 1
+    progress = {}
+    with pytest.raises(TrelloThrottled):
+        tasks._process_event(EVENT, setting(1), progress, CONTEXT)
+
+    # The owner's retry comes after its window; another event opens a new one meanwhile
+    app_env.q.connection.delete('trello:coalesce:bob@example.com:C1')
+    tasks._process_event(EVENT, setting(2), {}, CONTEXT)
+    assert trello.calls == []
+    tasks._process_event(EVENT, setting(1), progress, CONTEXT)
+
+    assert [call[0] for call in trello.calls] == ['copy', 'attach']
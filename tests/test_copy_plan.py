@@ -0,0 +1,63 @@
+# tests/test_copy_plan.py
+
+from copy_plan import CardCopyPlan
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+
+class FakeTrello:
+    def __init__(self, known_labels=(), attach_status=200):
+        self.known_labels = set(known_labels)
+        self.attach_status = attach_status
+        self.calls = []
+
+    def is_deferring(self):
+        return False
+
+    def copy_card(self, auth, source_card_id, list_id, label_ids=None):
+        self.calls.append(('copy', label_ids))
+        if label_ids and not self.known_labels.issuperset(label_ids):
+            return Response(400, {'message': 'invalid value for idLabels'})
+        return Response(200, {'id': 'NEW1'})
+
+    def add_attachment(self, auth, card_id, url, name):
+        self.calls.append(('attach', card_id))
+        return Response(self.attach_status)
+
+    def add_label(self, auth, card_id, label_id):
+        self.calls.append(('label', label_id))
+        return Response(200 if label_id in self.known_labels else 400)
+
+
+def test_stale_label_id_does_not_fail_the_copy():
+    trello = FakeTrello()
+    progress = {}
+    plan = CardCopyPlan(trello, None, progress)
+
+    resp = plan.create_card('C1', 'L-enquiry', 'GONE')
+    results = plan.finish(progress['new_card_id'], 'https://trello.com/c/C1', 'Original', 'GONE')
+
+    assert resp.status_code == 200
+    assert trello.calls == [('copy', ['GONE']), ('copy', None), ('attach', 'NEW1'), ('label', 'GONE')]
+    assert results['labelled'].status_code == 400
+    assert progress['attached'] and not progress['labelled']
+
+
+def test_failed_step_is_retried_by_a_resumed_job():
+    trello = FakeTrello(attach_status=503)
+    progress = {'new_card_id': 'NEW1', 'labelled': True}
+
+    CardCopyPlan(trello, None, progress).finish('NEW1', 'https://trello.com/c/C1', 'Original')
+    assert 'attached' not in progress
+    trello.attach_status = 200
+    CardCopyPlan(trello, None, progress).finish('NEW1', 'https://trello.com/c/C1', 'Original')
+
+    assert progress['attached'] is True
+    assert trello.calls == [('attach', 'NEW1'), ('attach', 'NEW1')]
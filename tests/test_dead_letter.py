@@ -0,0 +1,53 @@
+# tests/test_dead_letter.py
+
+from types import SimpleNamespace
+
+import tasks
+from db import User, WebhookSetting, db
+from dead_letter import DeadLetterQueue
+from job_context import JobContextLoader
+
+
+def test_entry_without_event_is_kept_after_replay(app_env, redis_conn, monkeypatch):
+    dead_letters = DeadLetterQueue(redis_conn, max_entries=10)
+    monkeypatch.setattr(tasks, 'get_dead_letters', lambda: dead_letters)
+    dead_letters.record(None, 'expired', setting_id=7, setting={'id': 7, 'user_email': 'a@example.com'})
+    [entry] = dead_letters.entries()
+
+    assert dead_letters.remove(entry['id'])
+    assert tasks.replay_dead_letter(entry) is False
+
+    assert [kept['id'] for kept in dead_letters.entries()] == [entry['id']]
+
+
+def test_exception_handler_records_live_progress(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(tasks, 'dead_letter_job', lambda name, args, reason: recorded.append(args))
+    job = SimpleNamespace(id='job-1', func_name='tasks.process_trello_event_ref', args=('ev', 7, None, 0))
+
+    tasks._running.job = ('job-1', ('ev', 7, {'new_card_id': 'C1', 'attached': True}, 2))
+    tasks.dead_letter_exception(job, RuntimeError, RuntimeError('boom'), None)
+    # A handler for another job falls back to that job's own args
+    tasks._running.job = ('job-0', ('ev', 7, {'new_card_id': 'C0'}, 1))
+    tasks.dead_letter_exception(job, RuntimeError, RuntimeError('boom'), None)
+
+    assert recorded == [('ev', 7, {'new_card_id': 'C1', 'attached': True}, 2), ('ev', 7, None, 0)]
+
+
+def test_expired_event_is_dead_lettered(app_env, redis_conn, monkeypatch):
+    with app_env.app.app_context():
+        db.session.add(User(email='a@example.com', apiKey='k', token='t'))
+        setting = WebhookSetting(user_email='a@example.com', webhook_id='W1', event_type='Mentioned in a card')
+        db.session.add(setting)
+        db.session.commit()
+        setting_id = setting.id
+    dead_letters = DeadLetterQueue(redis_conn, max_entries=10)
+    monkeypatch.setattr(tasks, 'get_app', lambda: (app_env.app, app_env.q))
+    monkeypatch.setattr(tasks, 'get_dead_letters', lambda: dead_letters)
+    monkeypatch.setattr(tasks, 'get_job_context_loader', lambda: JobContextLoader())
+
+    tasks.process_trello_event_ref('trello:event:gone', setting_id, {'attempts': 1}, 2)
+
+    [entry] = dead_letters.entries(user_email='a@example.com')
+    assert (entry['reason'], entry['setting_id'], entry['event']) == ('event expired', setting_id, None)
+    assert entry['progress']['event_key'] == 'trello:event:gone'
@@ -0,0 +1,43 @@
+# tests/test_dedupe.py
+
+from dedupe import ActionDeduplicator, BloomFilter
+
+
+def test_redelivery_is_suppressed_across_processes(redis_conn):
+    here, elsewhere = ActionDeduplicator(redis_conn), ActionDeduplicator(redis_conn)
+
+    assert here.claim('A1') is True
+    assert elsewhere.claim('A1') is False
+    assert redis_conn.ttl('trello:seen-action:A1') > 0
+
+    # A routing failure gives the action back for Trello's retry
+    here.release('A1')
+    assert elsewhere.claim('A1') is True
+
+
+def test_known_duplicates_skip_redis(redis_conn):
+    deduper = ActionDeduplicator(redis_conn, use_bloom=True)
+    deduper.claim('A1')
+    deduper.claim('A1')
+    # Only ids already seen as duplicates are answered locally
+    redis_conn.flushall()
+
+    assert deduper.claim('A1') is False
+    assert deduper.claim('A2') is True
+    assert deduper.stats()['process'] == {'suppressed_local': 1, 'suppressed_redis': 1}
+
+
+def test_bloom_keeps_two_generations():
+    bloom = BloomFilter(capacity=2)
+    bloom.add('A1')
+    bloom.add('A2')
+
+    # Full: A3 starts a new generation, A1 and A2 are still remembered
+    bloom.add('A3')
+    assert all(item in bloom for item in ('A1', 'A2', 'A3'))
+
+    bloom.add('A4')
+    bloom.add('A5')
+    # The generation holding A1 and A2 has aged out
+    assert 'A1' not in bloom and 'A2' not in bloom
+    assert all(item in bloom for item in ('A3', 'A4', 'A5'))
@@ -0,0 +1,41 @@
+# tests/test_fair_queue.py
+
+import time
+
+from rq import Queue, get_current_job
+from rq.registry import ScheduledJobRegistry
+
+import tasks
+from fair_queue import DeficitRoundRobin, FairQueues
+from rate_limit import TrelloThrottled
+from workers import WarmWorker
+
+
+def throttled_once(runs_key, progress=None, deferrals=0):
+    """Deferred the first time it runs, like a job Trello throttled"""
+    job = get_current_job()
+    if job.connection.incr(runs_key) == 1:
+        base = Queue('trello-events', connection=job.connection)
+        tasks.defer_job(base, TrelloThrottled(0), throttled_once, runs_key, progress or {}, deferrals)
+
+
+def work(base, fair_queues):
+    worker = WarmWorker([base], connection=base.connection, fair=DeficitRoundRobin(fair_queues, refresh_interval=0))
+    worker.work(burst=True, with_scheduler=True)
+
+
+def test_deferred_tenant_job_is_promoted_and_run(redis_conn):
+    base = Queue('trello-events', connection=redis_conn)
+    fair_queues = FairQueues(base, tenant_by='board')
+    fair_queues.queue_for('B1').enqueue(throttled_once, 'runs')
+
+    work(base, fair_queues)
+    assert int(redis_conn.get('runs')) == 1
+    # The scheduler of a worker started on the base queue has to see the deferred job
+    assert ScheduledJobRegistry(queue=base).count == 1
+
+    time.sleep(0.6)
+    work(base, fair_queues)
+
+    assert int(redis_conn.get('runs')) == 2
+    assert ScheduledJobRegistry(queue=base).count == 0
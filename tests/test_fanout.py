@@ -0,0 +1,68 @@
+# tests/test_fanout.py
+
+import pytest
+from rq import Queue
+
+import tasks
+from db import TrelloWebhook, TrelloWebhookSetting, User, WebhookSetting, db
+from events import EventStore
+from fair_queue import FairQueues
+from routing import SubscriptionIndex, WebhookRouter
+
+MENTIONED = 'Mentioned in a card'
+PAYLOAD = {'action': {
+    'id': 'A1', 'type': 'commentCard',
+    'data': {'board': {'id': 'B1'}, 'card': {'id': 'C1', 'name': 'Card'}, 'text': 'hi all'},
+}}
+
+
+@pytest.fixture
+def setting_ids(app_env):
+    with app_env.app.app_context():
+        db.session.add(TrelloWebhook(board_id='B1', webhook_id='W1', callback_url='https://example.com/hook'))
+        db.session.add(TrelloWebhookSetting(webhook_id='W1', event_type=MENTIONED))
+        settings = []
+        for name in ('ann', 'bob', 'cat'):
+            db.session.add(User(email=f'{name}@example.com', apiKey='k', token=name))
+            settings.append(WebhookSetting(user_email=f'{name}@example.com', webhook_id='W1', event_type=MENTIONED))
+        db.session.add_all(settings)
+        db.session.commit()
+        yield [setting.id for setting in settings]
+
+
+def route(app_env, queue, fair_queues=None):
+    index = SubscriptionIndex(queue.connection)
+    router = WebhookRouter(index, queue, EventStore(queue.connection), fanout=True, fair_queues=fair_queues)
+    with app_env.app.app_context():
+        return router.route(PAYLOAD)
+
+
+def test_one_dispatch_job_fans_out_to_every_user(app_env, setting_ids, monkeypatch):
+    queue = Queue('events', connection=app_env.q.connection)
+    monkeypatch.setattr(tasks, 'get_app', lambda: (app_env.app, queue))
+    monkeypatch.setattr(tasks, 'get_fair_queues', lambda: FairQueues(queue, tenant_by='off'))
+
+    assert route(app_env, queue)[0]['users_processed'] == 3
+    [dispatch] = queue.get_jobs()
+    assert dispatch.func_name == 'tasks.dispatch_trello_event_ref'
+    queue.empty()
+
+    assert tasks.dispatch_trello_event_ref(*dispatch.args) == 3
+    jobs = queue.get_jobs()
+    assert {job.func_name for job in jobs} == {'tasks.process_trello_event_ref'}
+    assert sorted(job.args for job in jobs) == [('trello:event:A1', sid) for sid in setting_ids]
+
+
+def test_fan_out_puts_each_job_on_its_tenant_queue(app_env, setting_ids, monkeypatch):
+    queue = Queue('events', connection=app_env.q.connection)
+    fair_queues = FairQueues(queue, tenant_by='user')
+    monkeypatch.setattr(tasks, 'get_app', lambda: (app_env.app, queue))
+    monkeypatch.setattr(tasks, 'get_fair_queues', lambda: fair_queues)
+
+    route(app_env, queue, fair_queues)
+    [dispatch] = queue.get_jobs()
+
+    assert tasks.dispatch_trello_event_ref(*dispatch.args) == 3
+    for name, setting_id in zip(('ann', 'bob', 'cat'), setting_ids, strict=True):
+        [job] = fair_queues.queue_for(f'{name}@example.com').get_jobs()
+        assert job.args == ('trello:event:A1', setting_id)
@@ -0,0 +1,34 @@
+# tests/test_identity.py
+
+from db import User, db
+from identity import IdentityCache, TrelloIdentity
+from job_context import JOB_CONTEXT_VERSION_KEY
+
+
+class MemberResponse:
+    status_code = 200
+
+    def __init__(self, username):
+        self.username = username
+
+    def json(self):
+        return {'id': 'M1', 'username': self.username}
+
+
+def test_background_refresh_stores_renamed_identity_on_user(app_env):
+    redis_conn = app_env.q.connection
+    with app_env.app.app_context():
+        db.session.add(User(email='bob@example.com', apiKey='k', token='t',
+                            trello_member_id='M1', trello_username='bob'))
+        db.session.commit()
+    cache = IdentityCache(redis_conn, lambda key, token: MemberResponse('robert'))
+
+    cache._refresh(app_env.app, 'bob@example.com', 'k', 't', TrelloIdentity('M1', 'bob'))
+
+    with app_env.app.app_context():
+        assert db.session.get(User, 'bob@example.com').trello_username == 'robert'
+    assert int(redis_conn.get(JOB_CONTEXT_VERSION_KEY)) == 1
+    # Once the cache entry expires it is seeded from the updated row
+    redis_conn.delete('trello:identity:bob@example.com')
+    with app_env.app.app_context():
+        assert cache.get(db.session.get(User, 'bob@example.com')).username == 'robert'
@@ -0,0 +1,40 @@
+# tests/test_inbox.py
+
+from inbox import WebhookInbox
+from router import process_entries
+
+
+class FailingRouter:
+    def route(self, payload):
+        raise AssertionError(f'routed {payload!r}')
+
+
+def test_reclaim_takes_over_pending_entries(redis_conn):
+    inbox = WebhookInbox(redis_conn)
+    inbox.ensure_group()
+    entry_id = inbox.append(b'{"action": {}}')
+    assert [e for e, _ in inbox.read('router-1', block_ms=None)] == [entry_id]
+
+    reclaimed = inbox.reclaim('router-2', min_idle_ms=0)
+
+    assert [e for e, _ in reclaimed] == [entry_id]
+
+
+def test_reclaim_accepts_two_element_xautoclaim_reply(redis_conn, monkeypatch):
+    # Redis 6.2 replies without the trailing list of deleted ids
+    inbox = WebhookInbox(redis_conn)
+    inbox.ensure_group()
+    monkeypatch.setattr(redis_conn, 'xautoclaim', lambda *a, **k: [b'0-0', [(b'1-0', {b'body': b'x'})]])
+
+    assert inbox.reclaim('router-2', min_idle_ms=0) == [(b'1-0', {b'body': b'x'})]
+
+
+def test_malformed_payloads_are_acked_on_first_read(redis_conn):
+    inbox = WebhookInbox(redis_conn)
+    inbox.ensure_group()
+    for body in (b'[1, 2]', b'"action"', b'{"action": "x"}', b'not json'):
+        inbox.append(body)
+    entries = inbox.read('router-1', block_ms=None)
+
+    assert process_entries(entries, inbox, FailingRouter()) == 4
+    assert redis_conn.xpending(inbox.stream_key, inbox.group)['pending'] == 0
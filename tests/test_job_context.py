@@ -0,0 +1,55 @@
+# tests/test_job_context.py
+
+import pytest
+
+from db import User, UserBoard, WebhookSetting, db
+from job_context import SETTINGS_VERSION_KEY, JobContextLoader, invalidate_job_contexts
+
+
+@pytest.fixture
+def setting_id(app_env):
+    with app_env.app.app_context():
+        db.session.add(User(email='bob@example.com', apiKey='k', token='t1', trello_username='bob'))
+        db.session.add(UserBoard(user_email='bob@example.com', board_id='UB1', board_name='bob',
+                                 lists={'Enquiry In': 'L-enquiry'}))
+        setting = WebhookSetting(user_email='bob@example.com', webhook_id='W1', event_type='Mentioned in a card')
+        db.session.add(setting)
+        db.session.commit()
+        yield setting.id
+
+
+def test_setting_and_context_load_together_and_are_cached(app_env, setting_id):
+    loader = JobContextLoader(app_env.q.connection, check_interval=0)
+
+    setting, context = loader.load_setting(setting_id)
+    User.query.update({'token': 't2'})
+    db.session.commit()
+
+    assert setting['webhook_id'] == 'W1'
+    assert (context.token, context.board_id, context.enquiry_in_list_id) == ('t1', 'UB1', 'L-enquiry')
+    # No version moved, so the cached copy is still served
+    assert loader.load_setting(setting_id)[1].token == 't1'
+
+
+def test_user_change_elsewhere_drops_the_cache(app_env, setting_id):
+    loader = JobContextLoader(app_env.q.connection, check_interval=0)
+    loader.load_setting(setting_id)
+    loader.load_user('bob@example.com')
+
+    User.query.update({'token': 't2'})
+    db.session.commit()
+    invalidate_job_contexts(app_env.q.connection, 'bob@example.com')
+
+    assert loader.load_setting(setting_id)[1].token == 't2'
+    assert loader.load_user('bob@example.com').token == 't2'
+
+
+def test_settings_change_elsewhere_drops_the_cache(app_env, setting_id):
+    loader = JobContextLoader(app_env.q.connection, check_interval=0)
+    loader.load_setting(setting_id)
+
+    WebhookSetting.query.update({'label_id': 'LBL-A'})
+    db.session.commit()
+    app_env.q.connection.incr(SETTINGS_VERSION_KEY)
+
+    assert loader.load_setting(setting_id)[0]['label_id'] == 'LBL-A'
@@ -0,0 +1,90 @@
+# tests/test_ledger.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from db import CardCopy, User, db
+from ledger import BUSY, CLAIMED, COPIED, CardCopyLedger
+
+
+@pytest.fixture
+def ledger(app_env):
+    with app_env.app.app_context():
+        db.session.add(User(email='bob@example.com', apiKey='k', token='t'))
+        db.session.commit()
+        yield CardCopyLedger(stale_after=600)
+
+
+def row():
+    return CardCopy.query.filter_by(user_email='bob@example.com', source_card_id='C1').one()
+
+
+def age_claim(seconds):
+    CardCopy.query.update({'claimed_at': datetime.utcnow() - timedelta(seconds=seconds)})
+    db.session.commit()
+
+
+def test_second_claim_loses_the_insert_race(ledger):
+    assert ledger.claim('bob@example.com', 'C1', 'job-a') == (CLAIMED, None)
+
+    assert ledger.claim('bob@example.com', 'C1', 'job-b') == (BUSY, None)
+    assert row().claim_token == 'job-a'
+
+
+def test_same_token_resumes_its_claim(ledger):
+    ledger.claim('bob@example.com', 'C1', 'job-a')
+
+    assert ledger.claim('bob@example.com', 'C1', 'job-a') == (CLAIMED, None)
+
+
+def test_finished_copy_short_circuits(ledger):
+    ledger.claim('bob@example.com', 'C1', 'job-a')
+    ledger.complete('bob@example.com', 'C1', 'job-a', 'NEW1')
+    age_claim(3600)
+
+    assert ledger.claim('bob@example.com', 'C1', 'job-b') == (COPIED, 'NEW1')
+    assert ledger.lookup('bob@example.com', 'C1') == 'NEW1'
+
+
+def test_stale_claim_is_taken_over(ledger):
+    ledger.claim('bob@example.com', 'C1', 'job-a')
+    age_claim(601)
+
+    assert ledger.claim('bob@example.com', 'C1', 'job-b') == (CLAIMED, None)
+    assert row().claim_token == 'job-b'
+    # The dead job's token no longer owns the claim
+    assert ledger.claim('bob@example.com', 'C1', 'job-a') == (BUSY, None)
+
+
+def test_takeover_that_loses_the_race_backs_off(ledger):
+    ledger.claim('bob@example.com', 'C1', 'job-a')
+    age_claim(601)
+
+    raced = []
+
+    def taken_first(update_context):
+        # Another worker takes the stale claim between our read and our update
+        if update_context.is_update and not raced:
+            raced.append(True)
+            CardCopy.query.update({'claim_token': 'job-c'})
+
+    event.listen(db.session, 'do_orm_execute', taken_first)
+    try:
+        assert ledger.claim('bob@example.com', 'C1', 'job-b') == (BUSY, None)
+    finally:
+        event.remove(db.session, 'do_orm_execute', taken_first)
+    assert row().claim_token == 'job-c'
+
+
+def test_release_lets_the_next_event_claim(ledger):
+    ledger.claim('bob@example.com', 'C1', 'job-a')
+    # Only the owner's release counts
+    ledger.release('bob@example.com', 'C1', 'job-b')
+    assert row().claim_token == 'job-a'
+
+    ledger.release('bob@example.com', 'C1', 'job-a')
+
+    assert CardCopy.query.count() == 0
+    assert ledger.claim('bob@example.com', 'C1', 'job-b') == (CLAIMED, None)
@@ -0,0 +1,56 @@
+# tests/test_mentions.py
+
+import time
+
+from events import TrelloEvent
+from identity import IdentityCache
+from mentions import USERNAMES_LEARNED_KEY, MentionFilter, UsernameDirectory
+from routing import Subscriber
+
+
+class MemberResponse:
+    status_code = 200
+
+    def __init__(self, username):
+        self.username = username
+
+    def json(self):
+        return {'id': 'M1', 'username': self.username}
+
+
+def subscriber(email):
+    return Subscriber(1, email, 'B1', 'Board', 'Mentioned in a card', None, None, None, None)
+
+
+def comment(text):
+    return TrelloEvent(action_type='commentCard', board_id='B1', comment_text=text)
+
+
+def test_mention_reaches_user_after_trello_rename(redis_conn):
+    directory = UsernameDirectory(redis_conn, check_interval=0, max_age=3600)
+    cache = IdentityCache(redis_conn, lambda key, token: MemberResponse('robert'), directory=directory)
+    mention_filter = MentionFilter(directory)
+    subscribers = (subscriber('bob@example.com'),)
+    directory.set('bob@example.com', 'bob')
+    assert mention_filter.filter('B1', subscribers, comment('hi @robert')) == ()
+
+    # The identity refresh learns the new username
+    cache.fetch_identity('bob@example.com', 'key', 'token')
+
+    assert mention_filter.filter('B1', subscribers, comment('hi @robert')) == subscribers
+    assert mention_filter.filter('B1', subscribers, comment('hi @bob')) == ()
+
+
+def test_unconfirmed_username_keeps_subscriber(redis_conn):
+    directory = UsernameDirectory(redis_conn, check_interval=0, max_age=3600)
+    mention_filter = MentionFilter(directory)
+    subscribers = (subscriber('bob@example.com'),)
+    directory.set('bob@example.com', 'bob')
+    assert mention_filter.filter('B1', subscribers, comment('hi @robert')) == ()
+
+    # Learned longer ago than max_age: let the worker decide
+    redis_conn.hset(USERNAMES_LEARNED_KEY, 'bob@example.com', time.time() - 7200)
+    redis_conn.incr('trello:usernames:version')
+
+    assert mention_filter.filter('B1', subscribers, comment('hi @robert')) == subscribers
+    assert directory.get('bob@example.com') is None
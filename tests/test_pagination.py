@@ -0,0 +1,57 @@
+# tests/test_pagination.py
+
+import json
+
+from conftest import login
+from db import User, WebhookSetting, db
+
+
+def add_users(app_env, count):
+    with app_env.app.app_context():
+        for i in range(count):
+            db.session.add(User(email=f'user{i}@example.com', apiKey='k', token='t'))
+        db.session.commit()
+
+
+def test_user_pages_chain_through_next_after(app_env, client):
+    add_users(app_env, 5)
+    emails, after = [], None
+    for _ in range(3):
+        query = f'?limit=2&after={after}' if after else '?limit=2'
+        page = client.get(f'/api/users{query}').json
+        emails += [user['email'] for user in page['items']]
+        after = page['next_after']
+        if after is None:
+            break
+
+    assert emails == [f'user{i}@example.com' for i in range(5)]
+    assert after is None
+
+
+def test_stream_resumes_after_the_cursor(app_env, client):
+    add_users(app_env, 4)
+
+    resp = client.get('/api/users?stream=ndjson&after=user1@example.com')
+
+    assert resp.mimetype == 'application/x-ndjson'
+    lines = resp.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['email'] for line in lines] == ['user2@example.com', 'user3@example.com']
+
+
+def test_integer_cursor_is_validated(app_env, client):
+    add_users(app_env, 1)
+    with app_env.app.app_context():
+        for _ in range(3):
+            db.session.add(WebhookSetting(user_email='user0@example.com', webhook_id='W1'))
+        db.session.commit()
+    login(client, 'user0@example.com')
+
+    page = client.get('/api/webhook-settings?limit=2').json
+    assert len(page['items']) == 2
+    rest = client.get(f"/api/webhook-settings?after={page['next_after']}").json
+    assert [s['id'] for s in rest['items']] == [3]
+    assert rest['next_after'] is None
+
+    resp = client.get('/api/webhook-settings?after=abc')
+    assert resp.status_code == 400
+    assert resp.json == {'error': 'after must be an integer id'}
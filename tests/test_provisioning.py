@@ -0,0 +1,32 @@
+# tests/test_provisioning.py
+
+from conftest import login
+from db import User, UserBoard, db
+from job_context import JOB_CONTEXT_VERSION_KEY
+
+
+def test_bulk_relink_invalidates_cached_identity(app_env, client, monkeypatch):
+    with app_env.app.app_context():
+        db.session.add(User(email='admin@example.com', apiKey='k', token='t'))
+        db.session.add(User(email='bob@example.com', apiKey='k', token='old',
+                            trello_member_id='M1', trello_username='bob'))
+        db.session.add(UserBoard(user_email='bob@example.com', board_id='B1', board_name='bob', lists={}))
+        db.session.commit()
+    app_env.username_directory.set('bob@example.com', 'bob')
+    monkeypatch.setattr(app_env, 'get_trello_client', lambda: None)
+    body = {'users': [{'email': 'bob@example.com', 'apiKey': 'k', 'token': 'new'}, 'oops']}
+
+    assert client.post('/api/users/bulk', json=body).status_code == 401
+
+    login(client, 'admin@example.com')
+    resp = client.post('/api/users/bulk', json=body)
+
+    assert resp.status_code == 200
+    assert resp.json['users'] == {
+        'bob@example.com': {'status': 'exists', 'board_id': 'B1'},
+        '#1': {'status': 'invalid', 'error': 'Each user must be an object'},
+    }
+    with app_env.app.app_context():
+        assert db.session.get(User, 'bob@example.com').trello_username is None
+    assert app_env.username_directory.get('bob@example.com') is None
+    assert int(app_env.q.connection.get(JOB_CONTEXT_VERSION_KEY)) == 1
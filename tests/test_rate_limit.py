@@ -0,0 +1,88 @@
+# tests/test_rate_limit.py
+
+from rate_limit import (
+    BUCKET_KEY_PREFIX,
+    RedisTokenBucketLimiter,
+    TrelloRateLimiter,
+    _fingerprint,
+    parse_retry_after,
+)
+from trello_client import TrelloAuth
+
+
+def test_key_and_token_buckets_are_both_paid(redis_conn):
+    limiter = RedisTokenBucketLimiter(redis_conn, key_limit=3, token_limit=2, per_seconds=10)
+    first, second = TrelloAuth('key', 'token-1'), TrelloAuth('key', 'token-2')
+
+    assert [limiter.acquire(first) for _ in range(2)] == [0, 0]
+    # Token bucket empty: one token refills every 5s, and a refused call costs nothing
+    assert 4.9 < limiter.acquire(first) <= 5.0
+    assert limiter.acquire(second) == 0
+    # The shared key bucket is now empty too
+    assert 3.2 < limiter.acquire(second) <= 3.34
+
+
+def test_refill_is_clamped_at_capacity(redis_conn):
+    limiter = RedisTokenBucketLimiter(redis_conn, key_limit=10, token_limit=2, per_seconds=10)
+    auth = TrelloAuth(None, 'token')
+    key = f"{BUCKET_KEY_PREFIX}token:{_fingerprint('token')}"
+    limiter.acquire(auth)
+    limiter.acquire(auth)
+
+    # Idle long enough to refill many times over
+    redis_conn.hset(key, 'ts', int(redis_conn.hget(key, 'ts')) - 100_000)
+
+    assert [limiter.acquire(auth) == 0 for _ in range(3)] == [True, True, False]
+
+
+def test_falls_back_to_local_limiter_while_redis_is_down(redis_conn):
+    calls = []
+
+    def unavailable(keys, args):
+        calls.append(keys)
+        raise ConnectionError('redis is down')
+
+    limiter = RedisTokenBucketLimiter(redis_conn, fallback=TrelloRateLimiter(max_requests=1, per_seconds=10))
+    limiter.script = unavailable
+    auth = TrelloAuth('key', 'token')
+
+    assert limiter.acquire(auth) == 0
+    assert limiter.acquire(auth) > 9
+    # Redis is only tried again after a pause
+    assert len(calls) == 1
+
+
+def test_retry_after_holds_callers_for_exactly_that_long(redis_conn):
+    limiter = RedisTokenBucketLimiter(redis_conn, key_limit=300, token_limit=100, per_seconds=10)
+    auth = TrelloAuth('key', 'token')
+    assert limiter.acquire(auth) == 0
+
+    # A 429 that doesn't say which budget ran out holds the token bucket
+    limiter.observe(auth, {}, retry_after=2)
+
+    assert 1.9 < limiter.acquire(auth) <= 2.0
+    assert limiter.acquire(TrelloAuth('key', 'other-token')) == 0
+
+
+def test_reported_budget_replaces_the_configured_one(redis_conn):
+    limiter = RedisTokenBucketLimiter(redis_conn, key_limit=300, token_limit=100, per_seconds=10)
+    auth = TrelloAuth('key', 'token')
+    limiter.observe(auth, {
+        'x-rate-limit-api-token-max': '50',
+        'x-rate-limit-api-token-interval-ms': '10000',
+        'x-rate-limit-api-token-remaining': '2',
+    })
+
+    assert [limiter.acquire(auth) for _ in range(2)] == [0, 0]
+    # One call refills every 200ms at the reported 50 per 10s
+    assert 0.19 < limiter.acquire(auth) <= 0.2
+
+
+def test_parse_retry_after_seconds_and_http_date():
+    assert parse_retry_after({'Retry-After': '3'}) == 3.0
+    assert parse_retry_after({'Retry-After': '1.5'}) == 1.5
+    # Wed, 21 Oct 2015 07:28:00 GMT is 1445412480
+    assert parse_retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, now=1445412470) == 10.0
+    assert parse_retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, now=1445412490) == 0.0
+    assert parse_retry_after({'Retry-After': 'soon'}) is None
+    assert parse_retry_after({}) is None
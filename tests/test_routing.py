@@ -0,0 +1,96 @@
+# tests/test_routing.py
+
+from sqlalchemy import event
+
+from conftest import login
+from db import TrelloWebhook, User, WebhookSetting, db
+from routing import ROUTING_VERSION_KEY, SubscriptionIndex
+
+MENTIONED = 'Mentioned in a card'
+
+
+def add_board(app_env):
+    with app_env.app.app_context():
+        db.session.add(User(email='bob@example.com', apiKey='k', token='t'))
+        db.session.add(TrelloWebhook(board_id='B1', webhook_id='W1', callback_url='https://example.com/hook'))
+        db.session.commit()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self)
+        return self.statements
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self)
+
+
+def subscribers(route):
+    return [sub.user_email for sub in route.subscribers.get(MENTIONED, ())]
+
+
+def test_unknown_board_is_a_negative_entry(app_env):
+    add_board(app_env)
+    index = SubscriptionIndex(app_env.q.connection, check_interval=60)
+    with app_env.app.app_context():
+        index.build()
+        with QueryCounter() as statements:
+            assert index.lookup('B-unknown') is None
+            assert index.lookup('B1').webhook_id == 'W1'
+
+        assert statements == []
+
+
+class FakeTrello:
+    def delete_webhook(self, auth, webhook_id):
+        return None
+
+
+def test_save_delete_and_upsert_patch_the_board(app_env, client, monkeypatch):
+    add_board(app_env)
+    monkeypatch.setattr(app_env, 'get_trello_client', FakeTrello)
+    index = app_env.subscription_index
+    login(client, 'bob@example.com')
+    with app_env.app.app_context():
+        assert subscribers(index.lookup('B1')) == []
+        version = index.version
+
+        setting_id = client.post('/api/webhook-settings', json={
+            'webhook_id': 'W1', 'board_id': 'B1', 'event_type': MENTIONED
+        }).json['setting']['id']
+        assert subscribers(index.lookup('B1')) == ['bob@example.com']
+        # Patched in place: this process made the only change, so no rebuild is pending
+        assert not index.stale and index.version == version + 1
+
+        app_env.upsert_trello_webhook_setting('W1', MENTIONED, enabled=False)
+        assert MENTIONED not in index.lookup('B1').enabled_events
+        app_env.upsert_trello_webhook_setting('W1', MENTIONED, enabled=True)
+        assert MENTIONED in index.lookup('B1').enabled_events
+
+        client.delete(f'/api/webhook-settings/{setting_id}')
+        assert subscribers(index.lookup('B1')) == []
+
+
+def test_change_in_another_process_is_picked_up(app_env):
+    add_board(app_env)
+    redis_conn = app_env.q.connection
+    here = SubscriptionIndex(redis_conn, check_interval=0)
+    elsewhere = SubscriptionIndex(redis_conn, check_interval=0)
+    with app_env.app.app_context():
+        assert subscribers(here.lookup('B1')) == []
+        assert subscribers(elsewhere.lookup('B1')) == []
+        version = here.version
+
+        db.session.add(WebhookSetting(user_email='bob@example.com', webhook_id='W1', event_type=MENTIONED))
+        db.session.commit()
+        elsewhere.invalidate('W1')
+
+        assert int(redis_conn.get(ROUTING_VERSION_KEY)) == version + 1
+        assert subscribers(here.lookup('B1')) == ['bob@example.com']
+        assert here.version == version + 1
@@ -0,0 +1,52 @@
+# tests/test_serializers.py
+
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from rq import Queue, get_current_job
+
+from serializers import MSGPACK_MARKER, CompatSerializer
+from workers import WarmWorker
+
+
+def remember(key, value):
+    job = get_current_job()
+    job.connection.rpush(key, repr(value))
+
+
+def stored_format(redis_conn, job):
+    # RQ compresses the serialized (func, args, kwargs)
+    return zlib.decompress(redis_conn.hget(job.key, 'data'))[:1]
+
+
+def run(queue_name, redis_conn, **kwargs):
+    serializer = CompatSerializer(write_format='msgpack')
+    queue = Queue(queue_name, connection=redis_conn, serializer=serializer)
+    WarmWorker([queue], connection=redis_conn, serializer=serializer).work(burst=True, **kwargs)
+
+
+def test_pickled_job_drains_on_msgpack_worker(redis_conn):
+    # Queued by a process still on RQ's default pickle serializer
+    old = Queue('events', connection=redis_conn)
+    job = old.enqueue(remember, 'seen', {'event_key': 'E1', 'progress': {'calls': 2}})
+    assert stored_format(redis_conn, job) != MSGPACK_MARKER
+
+    run('events', redis_conn)
+
+    assert redis_conn.lrange('seen', 0, -1) == [b"{'event_key': 'E1', 'progress': {'calls': 2}}"]
+
+
+def test_deferred_job_round_trips_through_enqueue_in(redis_conn):
+    serializer = CompatSerializer(write_format='msgpack')
+    queue = Queue('events', connection=redis_conn, serializer=serializer)
+    job = queue.enqueue_in(timedelta(seconds=0.2), remember, 'seen', ['E1', 3])
+    # Values msgpack can't carry fall back to pickle
+    fallback = queue.enqueue_in(timedelta(seconds=0.2), remember, 'seen', datetime(2026, 1, 2))
+    assert stored_format(redis_conn, job) == MSGPACK_MARKER
+    assert stored_format(redis_conn, fallback) != MSGPACK_MARKER
+
+    time.sleep(0.6)
+    run('events', redis_conn, with_scheduler=True)
+
+    assert sorted(redis_conn.lrange('seen', 0, -1)) == [b"['E1', 3]", b'datetime.datetime(2026, 1, 2, 0, 0)']
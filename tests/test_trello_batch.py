@@ -0,0 +1,98 @@
+# tests/test_trello_batch.py
+
+import threading
+
+import requests
+
+from trello_batch import BatchResponse, TrelloBatcher, _PendingBatch, split_batch_item
+from trello_client import TrelloAuth
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeClient:
+    def __init__(self, batch_items=None):
+        self.batch_items = batch_items
+        self.requests = []
+        self.release = threading.Event()
+
+    def is_deferring(self):
+        return False
+
+    def request(self, method, path, auth, params=None):
+        self.requests.append(path)
+        if path.startswith('/batch'):
+            return Response(self.batch_items)
+        # The first GET is still in flight while the others arrive
+        self.release.wait(1)
+        return Response({'path': path})
+
+
+def test_split_batch_item_reads_error_status():
+    assert split_batch_item({'200': {'id': 'L1'}}) == (200, {'id': 'L1'})
+    error = {'name': 'NotFound', 'message': 'The requested resource was not found.', 'statusCode': 404}
+    assert split_batch_item(error) == (404, error)
+    assert split_batch_item({'message': 'invalid token', 'status': '401'})[0] == 401
+    assert split_batch_item('unexpected') == (500, 'unexpected')
+
+
+def test_lone_get_is_not_delayed():
+    client = FakeClient()
+    client.release.set()
+    batcher = TrelloBatcher(client, window=10)
+
+    resp = batcher.get(TrelloAuth('k', 't'), '/boards/B1/labels')
+
+    assert resp.json() == {'path': '/boards/B1/labels'}
+    assert client.requests == ['/boards/B1/labels']
+
+
+def test_concurrent_gets_share_a_batch_and_keep_their_errors():
+    client = FakeClient([{'200': [{'id': 'L1'}]}, {'name': 'Unauthorized', 'statusCode': 401}])
+    batcher = TrelloBatcher(client, window=0.2)
+    auth = TrelloAuth('k', 't')
+    results = {}
+
+    def get(path):
+        results[path] = batcher.get(auth, path)
+
+    first = threading.Thread(target=get, args=('/members/me',))
+    first.start()
+    while not client.requests:
+        pass
+    joined = [threading.Thread(target=get, args=(path,)) for path in ('/boards/B1/labels', '/boards/B2/lists')]
+    for thread in joined:
+        thread.start()
+    for thread in joined:
+        thread.join()
+    client.release.set()
+    first.join()
+
+    first_get, batch = client.requests
+    assert first_get == '/members/me'
+    assert sorted(batch.removeprefix('/batch?urls=').split(',')) == ['/boards/B1/labels', '/boards/B2/lists']
+    assert isinstance(results['/boards/B2/lists'], BatchResponse)
+    statuses = {results[path].status_code for path in ('/boards/B1/labels', '/boards/B2/lists')}
+    assert statuses == {200, 401}
+
+
+def test_batched_query_values_are_encoded_once():
+    client = FakeClient([{'200': []}, {'200': []}])
+    batch = _PendingBatch()
+    batch.calls = [('/boards/B1/cards', {'filter': 'open,closed', 'q': '50% & more'}), ('/boards/B2/labels', None)]
+
+    TrelloBatcher(client)._send(TrelloAuth('k', 't'), batch)
+
+    [path] = client.requests
+    assert path == '/batch?urls=/boards/B1/cards?filter=open%2Cclosed%26q=50%25%20%26%20more,/boards/B2/labels'
+    # requests keeps a prepared query string as it is
+    prepared = requests.Request('GET', f'https://api.trello.com/1{path}', params={'key': 'k'}).prepare()
+    assert prepared.url == f'https://api.trello.com/1{path}&key=k'